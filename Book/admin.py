@@ -1,6 +1,15 @@
 from django.contrib import admin
 
-from .models import Book, Leaf, LeafImage
+from .models import (
+    Book,
+    EditorUpload,
+    ImageDerivative,
+    Leaf,
+    LeafImage,
+    PendingDerivative,
+    StoredBlob,
+    UploadSession,
+)
 
 
 @admin.register(Book)
@@ -8,6 +17,17 @@ class BookAdmin(admin.ModelAdmin):
     list_display = ("title", "owner", "category", "is_public", "updated_at")
     list_filter = ("category", "is_public", "updated_at")
     search_fields = ("title", "description", "content", "owner__username")
+    readonly_fields = (
+        "rating_sum",
+        "rating_count",
+        "rating_avg",
+        "rating_1_count",
+        "rating_2_count",
+        "rating_3_count",
+        "rating_4_count",
+        "rating_5_count",
+        "leaf_count",
+    )
 
 
 @admin.register(Leaf)
@@ -20,3 +40,37 @@ class LeafAdmin(admin.ModelAdmin):
 class LeafImageAdmin(admin.ModelAdmin):
     list_display = ("leaf", "created_at")
     list_filter = ("created_at",)
+
+
+@admin.register(EditorUpload)
+class EditorUploadAdmin(admin.ModelAdmin):
+    list_display = ("file", "owner", "size", "created_at")
+    list_filter = ("created_at",)
+    search_fields = ("file", "owner__username")
+
+
+@admin.register(ImageDerivative)
+class ImageDerivativeAdmin(admin.ModelAdmin):
+    list_display = ("source_name", "format", "width", "height", "created_at")
+    list_filter = ("format", "width")
+    search_fields = ("source_name",)
+
+
+@admin.register(PendingDerivative)
+class PendingDerivativeAdmin(admin.ModelAdmin):
+    list_display = ("source_name", "created_at")
+    search_fields = ("source_name",)
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "ref_count", "created_at")
+    search_fields = ("name", "digest")
+    readonly_fields = ("name", "digest", "size", "ref_count", "created_at")
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("filename", "owner", "purpose", "received", "size", "completed", "updated_at")
+    list_filter = ("purpose", "completed")
+    search_fields = ("filename", "owner__username")
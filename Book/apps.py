@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BookConfig(AppConfig):
     name = 'Book'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,378 @@
+"""Whole-book ZIP archives for export and import.
+
+Layout of an archive::
+
+    manifest.json           format, version, book metadata, leaf count, cover path
+    cover/<name>            the original cover image, if any
+    leaves/000001.json      {"text": ..., "content_json": ..., "images": [paths]}
+    images/000001/<name>    original LeafImage files of leaf 1
+
+Export is a generator of byte chunks for StreamingHttpResponse: leaves are
+read from the database and image files from storage in batches and
+written straight through the ZIP encoder, so memory use does not grow
+with the size of the book. Import reads entries one at a time and creates
+leaves and images with bulk_create in batches inside one transaction.
+Imported images are stored under the extension of the format Pillow
+verified, never the one the archive names, so nothing can be served as
+HTML or SVG.
+"""
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from itertools import islice
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import get_valid_filename
+from PIL import Image, UnidentifiedImageError
+
+from categories import registry as category_registry
+from search import index as search_index
+
+from . import caching
+from .chunked import IMAGE_TYPES
+from .images import schedule_derivatives
+from .models import POSITION_GAP, READER_ORDERING, Book, Leaf, LeafImage
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "notebook-book"
+VERSION = 1
+MANIFEST_NAME = "manifest.json"
+BATCH_SIZE = 200
+MAX_MANIFEST_BYTES = 64 * 1024
+MAX_LEAF_BYTES = 2 * 1024 * 1024
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_ARCHIVE_BYTES = 4 * 1024 ** 3
+MAX_LEAVES = 50_000
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+FORMAT_EXTENSIONS = {
+    image_format: extension for extension, image_format in IMAGE_TYPES.values()
+}
+
+
+class ArchiveError(ValueError):
+    """The archive is not a valid book export."""
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable file that hands out whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_filename(book) -> str:
+    return f"book-{book.pk}.zip"
+
+
+def export_book(book, storage=default_storage):
+    """Yield the archive of ``book`` as byte chunks."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        cover_path = None
+        if book.cover_image:
+            cover_path = f"cover/{os.path.basename(book.cover_image.name)}"
+        leaf_count = Leaf.objects.filter(book=book).count()
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "book": {
+                "title": book.title,
+                "description": book.description,
+                "category": book.category.name,
+                "is_public": book.is_public,
+                "created_at": book.created_at.isoformat(),
+            },
+            "cover": None,
+            "leaf_count": leaf_count,
+        }
+        if cover_path:
+            written = yield from _write_file(
+                archive, sink, cover_path, book.cover_image.name, storage
+            )
+            manifest["cover"] = cover_path if written else None
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2))
+        yield sink.drain()
+
+        number = 0
+        leaves = (
+            Leaf.objects.filter(book=book)
+            .order_by(*READER_ORDERING)
+            .only("pk", "text", "content_json")
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        for batch in _batched(leaves, BATCH_SIZE):
+            images = {}
+            for image in LeafImage.objects.filter(
+                leaf_id__in=[leaf.pk for leaf in batch]
+            ).order_by("created_at", "pk"):
+                images.setdefault(image.leaf_id, []).append(image)
+            for leaf in batch:
+                number += 1
+                image_paths = []
+                for image in images.get(leaf.pk, []):
+                    path = (
+                        f"images/{number:06d}/{image.pk}-"
+                        f"{os.path.basename(image.image.name)}"
+                    )
+                    written = yield from _write_file(
+                        archive, sink, path, image.image.name, storage
+                    )
+                    if written:
+                        image_paths.append(path)
+                archive.writestr(
+                    f"leaves/{number:06d}.json",
+                    json.dumps(
+                        {
+                            "text": leaf.text,
+                            "content_json": leaf.content_json,
+                            "images": image_paths,
+                        }
+                    ),
+                )
+                yield sink.drain()
+    # Closing the archive wrote the central directory.
+    yield sink.drain()
+
+
+def _write_file(archive, sink, arcname, name, storage):
+    """Copy one stored file into the archive chunk by chunk; return whether it existed."""
+    try:
+        source = storage.open(name, "rb")
+    except FileNotFoundError:
+        logger.warning("Skipping missing file %s in export", name)
+        return False
+    with source:
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        # Images are compressed already.
+        info.compress_type = zipfile.ZIP_STORED
+        force_zip64 = source.size > zipfile.ZIP64_LIMIT
+        with archive.open(info, "w", force_zip64=force_zip64) as target:
+            for chunk in source.chunks():
+                target.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+    data = sink.drain()
+    if data:
+        yield data
+    return True
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_book(archive_file, owner, category=None, storage=default_storage) -> Book:
+    """Create a new book owned by ``owner`` from an exported archive.
+
+    ``category`` overrides the category named in the manifest. Raises
+    ArchiveError for anything that is not a valid export; nothing is
+    created in that case.
+    """
+    try:
+        archive = zipfile.ZipFile(archive_file)
+    except (zipfile.BadZipFile, OSError):
+        raise ArchiveError("The file is not a ZIP archive.")
+    with archive:
+        manifest = _read_manifest(archive)
+        leaf_names, image_names = _validate_entries(archive, manifest)
+        book_data = manifest["book"]
+        if category is None:
+            category = next(
+                (
+                    item
+                    for item in category_registry.all_categories()
+                    if item.name == book_data.get("category")
+                ),
+                None,
+            )
+            if category is None:
+                raise ArchiveError(
+                    f"Unknown category {book_data.get('category')!r}; choose one."
+                )
+
+        saved_files = []
+        try:
+            with transaction.atomic():
+                book = Book(
+                    owner=owner,
+                    category=category,
+                    title=book_data["title"],
+                    description=book_data.get("description", ""),
+                    is_public=bool(book_data.get("is_public", False)),
+                )
+                if manifest.get("cover"):
+                    with archive.open(manifest["cover"]) as source:
+                        book.cover_image.save(
+                            image_names[manifest["cover"]], File(source), save=False
+                        )
+                    saved_files.append(book.cover_image.name)
+                book.save()
+                for start in range(0, len(leaf_names), BATCH_SIZE):
+                    _import_leaves(
+                        archive,
+                        book,
+                        leaf_names[start:start + BATCH_SIZE],
+                        start,
+                        image_names,
+                        saved_files,
+                    )
+                Book.objects.filter(pk=book.pk).update(leaf_count=len(leaf_names))
+                book.leaf_count = len(leaf_names)
+                # Cards show the leaf count, set after the book's own save.
+                caching.bump_on_commit(caching.CATALOGUE)
+                schedule_derivatives(*saved_files)
+        except Exception:
+            discard = getattr(storage, "discard", storage.delete)
+            for name in saved_files:
+                discard(name)
+            raise
+    return book
+
+
+def _import_leaves(archive, book, names, offset, image_names, saved_files) -> None:
+    leaves = []
+    image_paths = []
+    for number, name in enumerate(names, start=offset + 1):
+        data = _read_json(archive, name, MAX_LEAF_BYTES)
+        content = data.get("content_json")
+        text = data.get("text", "")
+        paths = data.get("images", [])
+        if not isinstance(content, dict) or not isinstance(text, str):
+            raise ArchiveError(f"{name} is not a valid leaf.")
+        if not isinstance(paths, list) or not all(
+            isinstance(path, str) and path.startswith("images/") for path in paths
+        ):
+            raise ArchiveError(f"{name} lists invalid images.")
+        leaf = Leaf(
+            book=book,
+            text=text[:500],
+            content_json=content,
+            position=number * POSITION_GAP,
+        )
+        leaf.render_fields()
+        leaves.append(leaf)
+        image_paths.append(paths)
+    Leaf.objects.bulk_create(leaves)
+
+    images = []
+    for leaf, paths in zip(leaves, image_paths):
+        for path in paths:
+            if path not in image_names:
+                raise ArchiveError(f"{path} is missing from the archive.")
+            with archive.open(path) as source:
+                image = LeafImage(leaf=leaf)
+                image.image.save(image_names[path], File(source), save=False)
+            saved_files.append(image.image.name)
+            images.append(image)
+    LeafImage.objects.bulk_create(images)
+    if search_index.is_available():
+        search_index.index_leaves(leaves)
+
+
+def _read_json(archive, name, limit):
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        raise ArchiveError(f"{name} is missing from the archive.")
+    if info.file_size > limit:
+        raise ArchiveError(f"{name} is too large.")
+    try:
+        data = json.loads(archive.read(info))
+    except (ValueError, zipfile.BadZipFile):
+        raise ArchiveError(f"{name} is not valid JSON.")
+    if not isinstance(data, dict):
+        raise ArchiveError(f"{name} is not a JSON object.")
+    return data
+
+
+def _read_manifest(archive) -> dict:
+    manifest = _read_json(archive, MANIFEST_NAME, MAX_MANIFEST_BYTES)
+    if manifest.get("format") != FORMAT:
+        raise ArchiveError("The archive is not a book export.")
+    if manifest.get("version") != VERSION:
+        raise ArchiveError(f"Unsupported export version {manifest.get('version')!r}.")
+    book = manifest.get("book")
+    if not isinstance(book, dict):
+        raise ArchiveError("The manifest has no book.")
+    title = book.get("title")
+    if not isinstance(title, str) or not title.strip() or len(title) > 50:
+        raise ArchiveError("The book title is missing or longer than 50 characters.")
+    description = book.get("description", "")
+    if not isinstance(description, str) or len(description) > 200:
+        raise ArchiveError("The book description is longer than 200 characters.")
+    return manifest
+
+
+def _validate_entries(archive, manifest) -> tuple:
+    """Check sizes and images up front.
+
+    Return the leaf entry names in order, and the storage name of every
+    image entry.
+    """
+    infos = archive.infolist()
+    if sum(info.file_size for info in infos) > MAX_ARCHIVE_BYTES:
+        raise ArchiveError("The archive is too large.")
+    leaf_names = sorted(
+        info.filename
+        for info in infos
+        if info.filename.startswith("leaves/") and info.filename.endswith(".json")
+    )
+    if len(leaf_names) > MAX_LEAVES:
+        raise ArchiveError(f"Books are limited to {MAX_LEAVES} leaves.")
+    if manifest.get("leaf_count") not in (None, len(leaf_names)):
+        raise ArchiveError("The archive does not contain every leaf.")
+    cover = manifest.get("cover")
+    if cover is not None and (not isinstance(cover, str) or not cover.startswith("cover/")):
+        raise ArchiveError("The manifest names an invalid cover.")
+    image_names = {}
+    for info in infos:
+        if info.filename.startswith(("images/", "cover/")) and not info.is_dir():
+            if info.file_size > MAX_IMAGE_BYTES:
+                raise ArchiveError(f"{info.filename} is too large.")
+            image_names[info.filename] = _image_name(archive, info)
+    if cover and cover not in image_names:
+        raise ArchiveError(f"{cover} is missing from the archive.")
+    return leaf_names, image_names
+
+
+def _image_name(archive, info) -> str:
+    """A storage name for a verified image entry, with its format's extension."""
+    stem, extension = os.path.splitext(os.path.basename(info.filename))
+    if extension.lower() not in IMAGE_EXTENSIONS:
+        raise ArchiveError(f"{info.filename} is not a supported image type.")
+    try:
+        with archive.open(info) as source:
+            with Image.open(source) as image:
+                image_format = image.format
+                image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, zipfile.BadZipFile):
+        raise ArchiveError(f"{info.filename} is not a valid image.")
+    if image_format not in FORMAT_EXTENSIONS:
+        raise ArchiveError(f"{info.filename} is not a supported image type.")
+    try:
+        stem = get_valid_filename(stem)
+    except SuspiciousFileOperation:
+        stem = "image"
+    return f"{stem}{FORMAT_EXTENSIONS[image_format]}"
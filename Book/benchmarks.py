@@ -0,0 +1,265 @@
+"""Query budgets and latency for every named Book and User URL.
+
+Each case requests one URL as a synthetic user (see ``synthetic``) and
+records how many queries the first request makes on an empty cache, how
+many a repeated request makes, and latency percentiles. A case fails when
+the cold query count exceeds its budget or the status is unexpected, which
+is how a new N+1 shows up: budgets do not grow with the amount of data,
+except where a case says so.
+
+Everything runs inside a transaction that is rolled back, each request in
+its own savepoint, so POST cases leave nothing behind; the one file the
+fixtures write, a small leaf image, is discarded after the rollback. A
+private in-memory cache replaces the configured one for the run.
+"""
+import io
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from User import urls as user_urls
+
+from . import synthetic
+from . import urls as book_urls
+from .models import READER_ORDERING, Book, Leaf, LeafImage, UploadSession
+
+
+def case(name, budget, user=None, method="get", args=(), data=None, json=False, status=200):
+    """``budget``, ``args`` and ``data`` may be callables taking the fixtures dict."""
+    return {
+        "name": name,
+        "budget": budget,
+        "user": user,
+        "method": method,
+        "args": args,
+        "data": data,
+        "json": json,
+        "status": status,
+    }
+
+
+def _book(fixtures):
+    return [fixtures["book"].pk]
+
+
+def _leaf(fixtures):
+    return [fixtures["leaf"].pk]
+
+
+CASES = [
+    case("Book:public_list", 2),
+    case("Book:public_list_page", 2),
+    case("Book:my_list", 7, user="owner"),
+    case("Book:my_list_page", 5, user="owner"),
+    case("Book:saved_list", 6, user="reader"),
+    case("Book:saved_list_page", 5, user="reader"),
+    case("Book:search", 4, data={"q": "river"}),
+    case(
+        "Book:saved_books",
+        4,
+        user="reader",
+        method="post",
+        data=lambda fixtures: {"book_ids": _book(fixtures), "saved": True},
+        json=True,
+    ),
+    case("Book:create", 4, user="owner"),
+    case("Book:import", 4, user="owner"),
+    case("Book:detail", 9, user="reader", args=_book),
+    case(
+        "Book:toggle_saved", 5, user="reader", method="post", args=_book, data={"saved": "1"},
+        status=302,
+    ),
+    case("Book:edit", 5, user="owner", args=_book),
+    case("Book:delete", 13, user="owner", method="post", args=_book, status=302),
+    case("Book:export", 6, user="owner", args=_book),
+    case("Book:reader", 9, user="reader", args=_book),
+    case("Book:reader_leaves", 5, user="reader", args=_book, data={"offset": 0}),
+    case(
+        "Book:reorder_leaves",
+        11,
+        user="owner",
+        method="post",
+        args=_book,
+        data=lambda fixtures: {"leaf_ids": [fixtures["leaf"].pk], "after": None},
+        json=True,
+    ),
+    case("Book:add_leaf", 5, user="owner", args=_book),
+    case("Book:leaf_image_upload", 2, user="owner", method="post", status=400),
+    case(
+        "Book:create_upload",
+        4,
+        user="owner",
+        method="post",
+        data={"purpose": "editor", "filename": "a.png", "content_type": "image/png", "size": 10},
+        json=True,
+        status=201,
+    ),
+    case("Book:upload_chunk", 3, user="owner", args=lambda fixtures: [fixtures["upload"].pk]),
+    # Nothing was sent, so finalizing is refused.
+    case(
+        "Book:finalize_upload",
+        3,
+        user="owner",
+        method="post",
+        args=lambda fixtures: [fixtures["upload"].pk],
+        status=409,
+    ),
+    case("Book:edit_leaf", 6, user="owner", args=_leaf),
+    case("Book:delete_leaf", 10, user="owner", method="post", args=_leaf, status=302),
+    case(
+        "Book:delete_leaf_image",
+        6,
+        user="owner",
+        method="post",
+        args=lambda fixtures: [fixtures["leaf_image"].pk],
+        status=302,
+    ),
+    case("User:signup", 3),
+    case("User:verify_otp", 0, status=302),
+    case("User:password_reset", 1),
+]
+
+
+class MissingData(Exception):
+    """There is no synthetic data to benchmark against."""
+
+
+def uncovered() -> list:
+    """Named Book and User URLs without a case."""
+    covered = {item["name"] for item in CASES}
+    names = [
+        f"{module.app_name}:{pattern.name}"
+        for module in (book_urls, user_urls)
+        for pattern in module.urlpatterns
+    ]
+    return [name for name in names if name not in covered]
+
+
+def _fixtures() -> dict:
+    books = Book.objects.filter(
+        owner__in=synthetic.synthetic_users(), is_public=True, leaf_count__gt=1
+    )
+    book = books.select_related("owner").order_by("-leaf_count", "pk").first()
+    reader = synthetic.synthetic_users().exclude(pk=getattr(book, "owner_id", None)).first()
+    if book is None or reader is None:
+        raise MissingData("Run generate_synthetic_data first.")
+    leaf = Leaf.objects.filter(book=book).order_by(*READER_ORDERING).first()
+    # A real file, so the export case packs it rather than skipping it.
+    data = io.BytesIO()
+    Image.new("RGB", (4, 4), "white").save(data, "PNG")
+    leaf_image = LeafImage(leaf=leaf)
+    leaf_image.image.save("benchmark.png", ContentFile(data.getvalue()), save=False)
+    leaf_image.save()
+    upload = UploadSession.objects.create(
+        owner=book.owner,
+        purpose=UploadSession.PURPOSE_EDITOR,
+        filename="benchmark.png",
+        content_type="image/png",
+        size=10,
+    )
+    return {
+        "book": book,
+        "leaf": leaf,
+        "leaf_image": leaf_image,
+        "upload": upload,
+        "owner": book.owner,
+        "reader": reader,
+    }
+
+
+def run(repeat=20, cases=None) -> list:
+    """Run every case ``repeat`` times and return one result dict per case."""
+    results = []
+    image = None
+    with override_settings(
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "url-benchmarks",
+            }
+        },
+        ALLOWED_HOSTS=["testserver"],
+    ):
+        try:
+            with transaction.atomic():
+                fixtures = _fixtures()
+                image = fixtures["leaf_image"].image
+                for item in cases or CASES:
+                    results.append(_run_case(item, fixtures, repeat))
+                transaction.set_rollback(True)
+        finally:
+            if image is not None:
+                discard = getattr(image.storage, "discard", image.storage.delete)
+                discard(image.name)
+    return results
+
+
+def _resolve(value, fixtures):
+    return value(fixtures) if callable(value) else value
+
+
+def _run_case(item, fixtures, repeat) -> dict:
+    client = Client()
+    if item["user"]:
+        client.force_login(fixtures[item["user"]])
+    url = reverse(item["name"], args=_resolve(item["args"], fixtures))
+    data = _resolve(item["data"], fixtures)
+    budget = _resolve(item["budget"], fixtures)
+    kwargs = {"content_type": "application/json"} if item["json"] else {}
+    request = getattr(client, item["method"])
+
+    cache.clear()
+    queries = []
+    timings = []
+    statuses = set()
+    for _ in range(max(repeat, 1)):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(url, data, **kwargs) if data else request(url, **kwargs)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    timings.sort()
+    return {
+        "name": item["name"],
+        "method": item["method"].upper(),
+        "status": sorted(statuses),
+        "queries_cold": queries[0],
+        "queries_warm": queries[-1],
+        "budget": budget,
+        "ok": queries[0] <= budget and statuses == {item["status"]},
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        "max_ms": round(timings[-1], 2),
+    }
+
+
+def compare(previous, current) -> list:
+    """Lines describing how query counts and median latency moved per case."""
+    before = {result["name"]: result for result in previous}
+    lines = []
+    for result in current:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        queries = result["queries_cold"] - old["queries_cold"]
+        p50 = result["p50_ms"] - old["p50_ms"]
+        change = (p50 / old["p50_ms"] * 100) if old["p50_ms"] else 0
+        lines.append(
+            f"{result['name']}: queries {old['queries_cold']} -> {result['queries_cold']}"
+            f" ({queries:+d}), p50 {old['p50_ms']:.1f} -> {result['p50_ms']:.1f} ms"
+            f" ({change:+.0f}%)"
+        )
+    return lines
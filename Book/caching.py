@@ -0,0 +1,211 @@
+"""Version-keyed caching for rendered book fragments.
+
+Every fragment key embeds the current version of its scope, so stale
+entries are simply never read again and expire on their own; nothing is
+deleted key by key. A book's fragments (detail fragments, reader windows)
+are keyed on its ``content_version``, which is read from the database
+with the book: every process agrees on it, and a page's fragments match
+the ETag computed from the same row. The catalogue (public card grids)
+has no such row; its generation lives in the cache and is bumped once
+the transaction that changed a book, review or image commits. Every
+worker must therefore share a file or Redis cache (see settings.CACHES).
+
+Fragments must not contain anything that depends on the viewer.
+
+Hit and miss counts are kept per process and added to the shared
+counters at most every STATS_FLUSH_INTERVAL seconds, so a lookup costs
+one cache read and no writes.
+
+The ``a``-prefixed functions are the same lookups through the cache's
+async API, for async views.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOGUE = "catalogue"
+FRAGMENTS = (
+    "public-cards",
+    "detail-header",
+    "detail-stats",
+    "detail-reviews",
+    "reader-leaf-ids",
+    "reader-window",
+)
+STATS_FLUSH_INTERVAL = 30
+
+
+BOOK_PREFIX = "book:"
+
+
+def book_scope(book) -> str:
+    """The scope of ``book``'s fragments at the version it was loaded with."""
+    return f"{BOOK_PREFIX}{book.pk}:v{book.content_version}"
+
+
+def _generation_key(scope) -> str:
+    return f"generation:{scope}"
+
+
+def generation(scope) -> int:
+    key = _generation_key(scope)
+    value = cache.get(key)
+    if value is None:
+        # Start from the clock rather than 1, so a counter that was evicted
+        # never comes back with a value older fragments were stored under.
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        value = cache.get(key)
+    return value
+
+
+async def ageneration(scope) -> int:
+    key = _generation_key(scope)
+    value = await cache.aget(key)
+    if value is None:
+        await cache.aadd(key, time.time_ns() // 1000, timeout=None)
+        value = await cache.aget(key)
+    return value
+
+
+def bump(*scopes) -> None:
+    """Invalidate every fragment of the given scopes, now."""
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+
+
+def bump_on_commit(*scopes) -> None:
+    """Bump after the surrounding transaction commits, so readers never
+    cache pre-commit data under the new generation."""
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def fragment_key(name, scope, *parts) -> str:
+    # Book scopes carry their version already.
+    current = 0 if scope.startswith(BOOK_PREFIX) else generation(scope)
+    return _fragment_key(name, scope, current, parts)
+
+
+async def afragment_key(name, scope, *parts) -> str:
+    current = 0 if scope.startswith(BOOK_PREFIX) else await ageneration(scope)
+    return _fragment_key(name, scope, current, parts)
+
+
+def _fragment_key(name, scope, current, parts) -> str:
+    digest = hashlib.md5(
+        "\x1f".join(str(part) for part in parts).encode("utf-8"), usedforsecurity=False
+    ).hexdigest()
+    return f"fragment:{name}:{scope}:{current}:{digest}"
+
+
+def get_or_build(name, scope, build, *parts):
+    """Return the cached fragment, calling ``build()`` and storing it on a miss."""
+    key = fragment_key(name, scope, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _count(name, "hits")
+        return value
+    _count(name, "misses")
+    value = build()
+    cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
+
+
+async def aget_or_build(name, scope, build, *parts):
+    """``get_or_build`` for async code; ``build`` is a coroutine function."""
+    key = await afragment_key(name, scope, *parts)
+    value = await cache.aget(key)
+    if value is not None:
+        await _acount(name, "hits")
+        return value
+    await _acount(name, "misses")
+    value = await build()
+    await cache.aset(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
+
+
+def _stats_key(name, outcome) -> str:
+    return f"fragment-stats:{name}:{outcome}"
+
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def _count(name, outcome) -> None:
+    if _record(name, outcome):
+        flush_stats()
+
+
+async def _acount(name, outcome) -> None:
+    if _record(name, outcome):
+        await aflush_stats()
+
+
+def _record(name, outcome) -> bool:
+    """Count one lookup in this process; whether the counts are due a flush."""
+    with _pending_lock:
+        _pending[name, outcome] += 1
+        return time.monotonic() - _flushed_at >= STATS_FLUSH_INTERVAL
+
+
+def _take_pending() -> dict:
+    global _flushed_at
+    with _pending_lock:
+        counts = dict(_pending)
+        _pending.clear()
+        _flushed_at = time.monotonic()
+    return {_stats_key(name, outcome): count for (name, outcome), count in counts.items()}
+
+
+def flush_stats() -> None:
+    """Add this process's counts to the shared counters."""
+    for key, count in _take_pending().items():
+        if not cache.add(key, count, timeout=None):
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                pass
+
+
+async def aflush_stats() -> None:
+    for key, count in _take_pending().items():
+        if not await cache.aadd(key, count, timeout=None):
+            try:
+                await cache.aincr(key, count)
+            except ValueError:
+                pass
+
+
+def stats() -> dict:
+    """Hit and miss counts per fragment, shared by every process on the cache.
+
+    Other processes' counts arrive with their next flush.
+    """
+    flush_stats()
+    keys = {
+        (name, outcome): _stats_key(name, outcome)
+        for name in FRAGMENTS
+        for outcome in ("hits", "misses")
+    }
+    values = cache.get_many(list(keys.values()))
+    return {
+        name: {outcome: values.get(keys[name, outcome], 0) for outcome in ("hits", "misses")}
+        for name in FRAGMENTS
+    }
+
+
+def reset_stats() -> None:
+    _take_pending()
+    cache.delete_many(
+        [_stats_key(name, outcome) for name in FRAGMENTS for outcome in ("hits", "misses")]
+    )
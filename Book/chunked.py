@@ -0,0 +1,235 @@
+"""Chunked, resumable image uploads.
+
+A client creates an UploadSession with the file's name, type and size, then
+PUTs the bytes in order, each request carrying an ``Upload-Offset`` header,
+and finally finalizes the session. Chunks are streamed straight into a
+partial file under CHUNKED_UPLOAD_DIR. The partial file's length is the
+offset, so after a dropped connection the client asks for the offset and
+carries on from there.
+
+Finalizing checks that the file is complete and is an image of the declared
+type. Editor images are stored right away; covers and leaf images stay in
+the session until the form that names them is saved. ``clear_stale``
+removes sessions nobody has touched for a while.
+"""
+import fcntl
+import os
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import transaction
+from django.http import UnreadablePostError
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+from PIL import Image
+
+from .models import UploadSession
+
+# Accepted content types, their file extension and Pillow format.
+IMAGE_TYPES = {
+    "image/jpeg": (".jpg", "JPEG"),
+    "image/png": (".png", "PNG"),
+    "image/gif": (".gif", "GIF"),
+    "image/webp": (".webp", "WEBP"),
+}
+MAX_OPEN_SESSIONS = 20
+READ_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+
+
+class UploadError(Exception):
+    """A request the upload protocol cannot accept, with its HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def partial_path(session_id) -> Path:
+    return Path(settings.CHUNKED_UPLOAD_DIR) / f"{session_id}{PARTIAL_SUFFIX}"
+
+
+def offset(session) -> int:
+    """Bytes received so far, read from the partial file itself."""
+    try:
+        return partial_path(session.pk).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def create_session(owner, purpose, filename, content_type, size) -> UploadSession:
+    if purpose not in dict(UploadSession.PURPOSE_CHOICES):
+        raise UploadError(f"Unknown purpose {purpose!r}.")
+    if content_type not in IMAGE_TYPES:
+        raise UploadError(f"Unsupported type {content_type!r}.", status=415)
+    if not isinstance(size, int) or size < 1:
+        raise UploadError("Size must be a positive number of bytes.")
+    if size > settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError(
+            f"Images are limited to {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.", status=413
+        )
+    if UploadSession.objects.filter(owner=owner, completed=False).count() >= MAX_OPEN_SESSIONS:
+        raise UploadError("Too many uploads in progress.", status=429)
+    return UploadSession.objects.create(
+        owner=owner,
+        purpose=purpose,
+        filename=os.path.basename(str(filename))[:255] or "image",
+        content_type=content_type,
+        size=size,
+    )
+
+
+def _signature_matches(data, content_type) -> bool:
+    if content_type == "image/jpeg":
+        return data.startswith(b"\xff\xd8\xff")
+    if content_type == "image/png":
+        return data.startswith(b"\x89PNG\r\n\x1a\n")
+    if content_type == "image/gif":
+        return data.startswith((b"GIF87a", b"GIF89a"))
+    return data[:4] == b"RIFF" and data[8:12] == b"WEBP"
+
+
+def append_chunk(session, stream, start, length) -> int:
+    """Stream ``length`` bytes at offset ``start``; return the new offset.
+
+    Whatever arrived before the connection dropped is kept, so the client
+    can resume from the offset it gets back.
+    """
+    if session.completed:
+        raise UploadError("The upload is already finalized.", status=409)
+    if length is None:
+        raise UploadError("Content-Length is required.", status=411)
+    if length < 1 or length > settings.CHUNKED_UPLOAD_CHUNK_SIZE:
+        raise UploadError(
+            f"Chunks must be 1 to {settings.CHUNKED_UPLOAD_CHUNK_SIZE} bytes.", status=413
+        )
+    path = partial_path(session.pk)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as target:
+        try:
+            fcntl.flock(target, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another chunk of this upload is being written.", status=409)
+        current = target.seek(0, os.SEEK_END)
+        if start != current:
+            raise UploadError(f"Expected offset {current}.", status=409)
+        if current + length > session.size:
+            raise UploadError("The chunk runs past the declared size.", status=413)
+        remaining = length
+        try:
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                if current == 0 and remaining == length and not _signature_matches(
+                    data, session.content_type
+                ):
+                    raise UploadError(f"The file is not {session.content_type}.", status=415)
+                target.write(data)
+                remaining -= len(data)
+        except (UnreadablePostError, ConnectionError):
+            pass
+        target.flush()
+        received = target.tell()
+    UploadSession.objects.filter(pk=session.pk).update(
+        received=received, updated_at=timezone.now()
+    )
+    session.received = received
+    if remaining:
+        raise UploadError(f"The chunk was cut short at offset {received}.")
+    return received
+
+
+def finalize(session) -> UploadSession:
+    """Mark a fully received upload complete after checking the image."""
+    if session.completed:
+        return session
+    received = offset(session)
+    if received != session.size:
+        raise UploadError(f"Received {received} of {session.size} bytes.", status=409)
+    _, expected_format = IMAGE_TYPES[session.content_type]
+    try:
+        with Image.open(partial_path(session.pk)) as image:
+            image_format = image.format
+            image.verify()
+    except Exception:
+        image_format = None
+    if image_format != expected_format:
+        discard(session)
+        raise UploadError(f"The file is not a valid {session.content_type} image.", status=415)
+    session.completed = True
+    session.received = received
+    session.save(update_fields=["completed", "received", "updated_at"])
+    return session
+
+
+def completed_sessions(owner, ids, purpose) -> list:
+    """The owner's finalized sessions among ``ids``, in the given order."""
+    ids = [_uuid(value) for value in ids]
+    ids = [value for value in ids if value is not None]
+    sessions = UploadSession.objects.filter(
+        owner=owner, purpose=purpose, completed=True, pk__in=ids
+    ).in_bulk()
+    return [sessions[pk] for pk in ids if pk in sessions]
+
+
+def _uuid(value):
+    try:
+        return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def upload_name(session) -> str:
+    """A file name for storage with the extension of the verified type."""
+    stem, _ = os.path.splitext(session.filename)
+    extension, _ = IMAGE_TYPES[session.content_type]
+    try:
+        stem = get_valid_filename(stem)
+    except SuspiciousFileOperation:
+        stem = "image"
+    return f"{stem}{extension}"
+
+
+def save_to(session, field_file) -> None:
+    """Move a finalized upload into an ImageField and drop the session."""
+    with open(partial_path(session.pk), "rb") as source:
+        field_file.save(upload_name(session), File(source), save=False)
+    discard(session)
+
+
+def store(session, storage, directory) -> str:
+    """Move a finalized upload into ``directory`` of ``storage``; return its name."""
+    with open(partial_path(session.pk), "rb") as source:
+        name = storage.save(f"{directory}/{upload_name(session)}", File(source))
+    discard(session)
+    return name
+
+
+def discard(session) -> None:
+    path = partial_path(session.pk)
+    UploadSession.objects.filter(pk=session.pk).delete()
+    transaction.on_commit(lambda: path.unlink(missing_ok=True))
+
+
+def clear_stale(max_age=timedelta(hours=24)) -> int:
+    """Delete sessions idle for ``max_age`` and partial files without a session."""
+    cutoff = timezone.now() - max_age
+    stale = list(UploadSession.objects.filter(updated_at__lt=cutoff).values_list("pk", flat=True))
+    UploadSession.objects.filter(pk__in=stale).delete()
+    for pk in stale:
+        partial_path(pk).unlink(missing_ok=True)
+    removed = len(stale)
+
+    directory = Path(settings.CHUNKED_UPLOAD_DIR)
+    if directory.is_dir():
+        live = {str(pk) for pk in UploadSession.objects.values_list("pk", flat=True)}
+        for path in directory.glob(f"*{PARTIAL_SUFFIX}"):
+            if path.stem not in live and path.stat().st_mtime < cutoff.timestamp():
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
@@ -1,5 +1,8 @@
 from django import forms
 
+from categories.forms import CategoryChoiceField
+from categories.models import Category
+
 from .models import Book, Leaf
 
 
@@ -9,6 +12,9 @@ class CoverFileInput(forms.ClearableFileInput):
 
 class BookForm(forms.ModelForm):
     cover_image = forms.ImageField(required=False, widget=CoverFileInput)
+    # Id of a finalized chunked upload to use instead of cover_image.
+    cover_upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+    category = CategoryChoiceField(queryset=Category.objects.all())
 
     class Meta:
         model = Book
@@ -48,3 +54,12 @@ class LeafImageUploadForm(forms.Form):
         required=False,
         widget=MultipleFileInput(attrs={"multiple": True}),
     )
+
+
+class BookImportForm(forms.Form):
+    archive = forms.FileField(help_text="A .zip file exported from a book.")
+    category = CategoryChoiceField(
+        queryset=Category.objects.all(),
+        required=False,
+        empty_label="Use the category in the archive",
+    )
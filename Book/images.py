@@ -0,0 +1,247 @@
+"""Responsive derivatives for uploaded images.
+
+Covers, leaf images and editor uploads get resized WebP and JPEG copies at
+a few fixed widths. They are generated in a small thread pool after the
+upload's transaction commits, never inside the request, and looked up in
+bulk when pages are rendered so templates can emit ``srcset``.
+
+The pool lives in the web worker, so a restart drops whatever it had
+queued. Each scheduled image therefore also gets a PendingDerivative row,
+written with the upload and deleted when its derivatives exist;
+``generate_image_derivatives --pending`` finishes the ones left behind.
+"""
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils.html import escape
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import caching
+from .models import Book, ImageDerivative, LeafImage, PendingDerivative, touch_books
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+SAVE_OPTIONS = {
+    ImageDerivative.FORMAT_WEBP: {"format": "WEBP", "quality": 80, "method": 4},
+    ImageDerivative.FORMAT_JPEG: {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+EXTENSIONS = {ImageDerivative.FORMAT_WEBP: "webp", ImageDerivative.FORMAT_JPEG: "jpg"}
+ORIENTATION_TAG = 0x0112
+IMG_TAG_RE = re.compile(r'<img src="([^"]+)"[^>]*>')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+def schedule_derivatives(*names) -> None:
+    """Generate derivatives for the given storage names once the transaction commits."""
+    names = [name for name in names if name]
+    if not names:
+        return
+    PendingDerivative.objects.bulk_create(
+        [PendingDerivative(source_name=name) for name in names], ignore_conflicts=True
+    )
+
+    def submit():
+        for name in names:
+            if settings.IMAGE_DERIVATIVES_ASYNC:
+                _get_executor().submit(_generate_in_worker, name)
+            else:
+                generate_pending(name)
+
+    transaction.on_commit(submit)
+
+
+def generate_pending(name) -> int:
+    """Generate the derivatives of a scheduled image and drop its pending row.
+
+    The row stays if generation fails unexpectedly, so it is retried.
+    """
+    created = generate_derivatives(name)
+    PendingDerivative.objects.filter(source_name=name).delete()
+    return created
+
+
+def _generate_in_worker(name) -> None:
+    close_old_connections()
+    try:
+        generate_pending(name)
+    except Exception:
+        logger.exception("Could not generate derivatives for %s", name)
+    finally:
+        close_old_connections()
+
+
+def generate_derivatives(name, storage=default_storage) -> int:
+    """Create the missing derivatives of one stored image; return how many."""
+    existing = set(
+        ImageDerivative.objects.filter(source_name=name).values_list("format", "width")
+    )
+    try:
+        with storage.open(name, "rb") as source:
+            original = Image.open(source)
+            widths = derivative_widths(_oriented_width(original))
+            if all((fmt, width) in existing for fmt in SAVE_OPTIONS for width in widths):
+                return 0
+            original.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        logger.warning("Skipping derivatives for unreadable image %s", name)
+        return 0
+    original = ImageOps.exif_transpose(original)
+    widths = derivative_widths(original.width)
+
+    stem, _ = os.path.splitext(name)
+    created = []
+    for width in widths:
+        height = max(1, round(original.height * width / original.width))
+        resized = original.resize((width, height), Image.LANCZOS) if width != original.width else original
+        for fmt, options in SAVE_OPTIONS.items():
+            if (fmt, width) in existing:
+                continue
+            image = resized
+            if fmt == ImageDerivative.FORMAT_JPEG and image.mode not in ("RGB", "L"):
+                image = _flatten(image)
+            elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+                image = image.convert("RGBA")
+            buffer = BytesIO()
+            image.save(buffer, **options)
+            derivative = ImageDerivative(
+                source_name=name, width=width, height=height, format=fmt
+            )
+            derivative.file.save(
+                f"{os.path.basename(stem)}-{width}.{EXTENSIONS[fmt]}",
+                ContentFile(buffer.getvalue()),
+                save=False,
+            )
+            created.append(derivative)
+    ImageDerivative.objects.bulk_create(created, ignore_conflicts=True)
+    if created:
+        _invalidate_pages_showing(name)
+    return len(created)
+
+
+def _invalidate_pages_showing(name) -> None:
+    # Cached fragments rendered before the derivatives existed lack srcsets.
+    # Images embedded in leaf text are not tracked; they pick up their
+    # srcsets when the fragments expire.
+    cover_book_ids = list(Book.objects.filter(cover_image=name).values_list("pk", flat=True))
+    leaf_book_ids = list(
+        LeafImage.objects.filter(image=name).values_list("leaf__book_id", flat=True)
+    )
+    touch_books(cover_book_ids + leaf_book_ids)
+    if cover_book_ids:
+        caching.bump(caching.CATALOGUE)
+
+
+def derivative_widths(original_width) -> list:
+    """Fixed widths below the original, plus the original if it is smaller than the largest."""
+    widths = [width for width in DERIVATIVE_WIDTHS if width < original_width]
+    if original_width < DERIVATIVE_WIDTHS[-1]:
+        widths.append(original_width)
+    return widths
+
+
+def _oriented_width(image) -> int:
+    # EXIF orientations 5-8 are rotated by 90 degrees.
+    if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+        return image.height
+    return image.width
+
+
+def _flatten(image):
+    rgba = image.convert("RGBA")
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def srcsets_for(names) -> dict:
+    """Map storage names to ``{"webp": srcset, "jpeg": srcset}`` in one query."""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    entries = defaultdict(lambda: defaultdict(list))
+    for derivative in ImageDerivative.objects.filter(source_name__in=names).order_by(
+        "width"
+    ):
+        entries[derivative.source_name][derivative.format].append(
+            f"{derivative.file.url} {derivative.width}w"
+        )
+    return {
+        name: {fmt: ", ".join(items) for fmt, items in formats.items()}
+        for name, formats in entries.items()
+    }
+
+
+def attach_srcsets(objects, field_name) -> None:
+    """Set ``<field_name>_srcset`` on each object from the derivatives of its image."""
+    objects = list(objects)
+    srcsets = srcsets_for(getattr(obj, field_name).name for obj in objects)
+    for obj in objects:
+        setattr(obj, f"{field_name}_srcset", srcsets.get(getattr(obj, field_name).name, {}))
+
+
+def storage_name_from_url(url) -> str:
+    """Return the storage name for a media URL, or "" for foreign URLs."""
+    media_url = default_storage.url("")
+    if media_url and url.startswith(media_url):
+        return url[len(media_url):]
+    return ""
+
+
+def add_srcsets_to_html(html_fragments, sizes) -> list:
+    """Wrap every <img> rendered by Book.tiptap in a <picture> with srcsets.
+
+    Derivatives for all fragments are looked up in one query; images
+    without derivatives are left untouched.
+    """
+    names = {
+        storage_name_from_url(src)
+        for html in html_fragments
+        for src in IMG_TAG_RE.findall(html)
+    }
+    srcsets = srcsets_for(names)
+    if not srcsets:
+        return list(html_fragments)
+    sizes = escape(sizes)
+
+    def replace(match):
+        srcset = srcsets.get(storage_name_from_url(match.group(1)), {})
+        if not srcset:
+            return match.group(0)
+        picture = ["<picture>"]
+        webp = srcset.get(ImageDerivative.FORMAT_WEBP)
+        if webp:
+            picture.append(
+                f'<source type="image/webp" srcset="{escape(webp)}" sizes="{sizes}">'
+            )
+        img = match.group(0)
+        jpeg = srcset.get(ImageDerivative.FORMAT_JPEG)
+        if jpeg:
+            img = img.replace("<img ", f'<img srcset="{escape(jpeg)}" sizes="{sizes}" ', 1)
+        picture.append(img)
+        picture.append("</picture>")
+        return "".join(picture)
+
+    return [IMG_TAG_RE.sub(replace, html) for html in html_fragments]
@@ -0,0 +1,141 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from Book import synthetic
+from Book.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the same concurrent load of catalogue, detail and reader requests, as a "
+        "signed-in synthetic reader, through the WSGI handler with a fixed number of "
+        "sync workers (gunicorn --workers) and through the ASGI handler, and report "
+        "requests per second and latency for each. Nothing is written apart "
+        "from the reader's session, which is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300, help="Requests per page.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Clients sending requests at the same time.",
+        )
+        parser.add_argument(
+            "--wsgi-workers",
+            type=int,
+            default=3,
+            help="Sync workers available to the WSGI run (gunicorn --workers).",
+        )
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        concurrency = options["concurrency"]
+        workers = options["wsgi_workers"]
+        if min(requests, concurrency, workers) < 1:
+            raise CommandError("--requests, --concurrency and --wsgi-workers must be positive.")
+        users = synthetic.synthetic_users()
+        book = (
+            Book.objects.filter(owner__in=users, is_public=True, leaf_count__gt=1)
+            .order_by("-leaf_count", "pk")
+            .first()
+        )
+        reader = users.exclude(pk=getattr(book, "owner_id", None)).first()
+        if book is None or reader is None:
+            raise CommandError("Run generate_synthetic_data first.")
+
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            session = Client()
+            session.force_login(reader)
+            try:
+                detail = reverse("Book:detail", args=[book.pk])
+                # Also warms the fragment caches and sets the CSRF cookie.
+                etag = session.get(detail)["ETag"]
+                self.cookies = session.cookies
+                pages = [
+                    ("catalogue", reverse("Book:public_list"), {}),
+                    ("catalogue page", reverse("Book:public_list_page"), {}),
+                    ("detail", detail, {}),
+                    ("detail 304", detail, {"If-None-Match": etag}),
+                    ("reader", reverse("Book:reader", args=[book.pk]), {}),
+                ]
+                for label, url, headers in pages:
+                    session.get(url)
+                    for handler, run in (
+                        (
+                            f"WSGI ({workers} workers)",
+                            lambda: self._run_wsgi(url, headers, requests, workers, concurrency),
+                        ),
+                        (
+                            "ASGI",
+                            lambda: asyncio.run(self._run_asgi(url, headers, requests, concurrency)),
+                        ),
+                    ):
+                        started = time.perf_counter()
+                        results = run()
+                        elapsed = time.perf_counter() - started
+                        self._report(f"{label:<15} {handler}", elapsed, results)
+            finally:
+                session.logout()
+
+    def _run_wsgi(self, url, headers, requests, workers, concurrency):
+        # The same number of clients as the ASGI run, queueing for the
+        # workers the way requests queue in gunicorn's backlog, so latency
+        # includes the wait for a free worker.
+        slots = threading.Semaphore(workers)
+
+        def fetch():
+            client = Client(headers=headers)
+            client.cookies = self.cookies
+            started = time.perf_counter()
+            with slots:
+                try:
+                    response = client.get(url)
+                finally:
+                    connection.close()
+            return time.perf_counter() - started, response.status_code
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(lambda _: fetch(), range(requests)))
+
+    async def _run_asgi(self, url, headers, requests, concurrency):
+        gate = asyncio.Semaphore(concurrency)
+
+        async def fetch():
+            async with gate:
+                # One context per request, as ASGIHandler does, so the sync
+                # parts of different requests run in different threads.
+                async with ThreadSensitiveContext():
+                    client = AsyncClient(headers=headers)
+                    client.cookies = self.cookies
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    return time.perf_counter() - started, response.status_code
+
+        return await asyncio.gather(*(fetch() for _ in range(requests)))
+
+    def _report(self, label, elapsed, results) -> None:
+        latencies = sorted(seconds for seconds, status in results if status in (200, 304))
+        failures = len(results) - len(latencies)
+        line = f"{label}: {len(results)} requests in {elapsed:.2f}s ({len(results) / elapsed:.1f}/s)"
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            line += (
+                f", latency p50 {statistics.median(latencies) * 1000:.0f}ms"
+                f" p95 {p95 * 1000:.0f}ms"
+            )
+        if failures:
+            line += f", {failures} failed"
+        self.stdout.write(line)
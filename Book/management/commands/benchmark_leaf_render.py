@@ -0,0 +1,31 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from Book.synthetic import document
+from Book.tiptap import render_html
+
+
+class Command(BaseCommand):
+    help = "Measure TipTap JSON to HTML render throughput on synthetic leaves."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--docs", type=int, default=2000)
+        parser.add_argument("--blocks", type=int, default=40, help="Blocks per document.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        docs = [document(rng, options["blocks"]) for _ in range(options["docs"])]
+        started = time.perf_counter()
+        size = 0
+        for doc in docs:
+            size += len(render_html(doc))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Rendered {len(docs)} docs ({options['blocks']} blocks each, "
+            f"{size / len(docs) / 1024:.1f} KiB of HTML on average) in {elapsed:.2f}s: "
+            f"{len(docs) / elapsed:,.0f} docs/s"
+        )
+
@@ -0,0 +1,228 @@
+import json
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+LEAVES_PER_BOOK = 20
+LEAF_TEXT = "lorem ipsum dolor sit amet " * 80
+
+
+class Command(BaseCommand):
+    help = (
+        "Run parallel writer and reader processes against a scratch SQLite database, "
+        "once with SQLite's defaults and once with settings.SQLITE_PRAGMAS and "
+        "BEGIN IMMEDIATE, and report throughput, latency and lock errors. The "
+        "project database is not touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4, help="Writer processes.")
+        parser.add_argument("--readers", type=int, default=8, help="Reader processes.")
+        parser.add_argument("--seconds", type=float, default=5, help="Run time per profile.")
+        parser.add_argument("--books", type=int, default=50)
+        parser.add_argument(
+            "--output",
+            help="Result file; defaults to benchmark-results/sqlite-<timestamp>.json.",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["writers"], options["readers"], options["books"]) < 1:
+            raise CommandError("--writers, --readers and --books must be positive.")
+        tuned = [f"PRAGMA {name}={value}" for name, value in settings.SQLITE_PRAGMAS.items()]
+        profiles = {
+            # Python's sqlite3 defaults: rollback journal, 5 s busy timeout,
+            # deferred transactions.
+            "default": ([], "BEGIN"),
+            "tuned": (tuned, "BEGIN IMMEDIATE"),
+        }
+        results = {}
+        for name, (pragmas, begin) in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = str(Path(directory) / "benchmark.sqlite3")
+                _create(path, pragmas, options["books"])
+                results[name] = _run(path, pragmas, begin, options)
+            self.stdout.write(_describe(name, results[name]))
+
+        output = Path(
+            options["output"]
+            or settings.BASE_DIR
+            / "benchmark-results"
+            / f"sqlite-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "sqlite_version": sqlite3.sqlite_version,
+            "writers": options["writers"],
+            "readers": options["readers"],
+            "seconds": options["seconds"],
+            "books": options["books"],
+            "pragmas": settings.SQLITE_PRAGMAS,
+            "results": results,
+        }
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Wrote {output}")
+
+
+def _create(path, pragmas, books) -> None:
+    connection = sqlite3.connect(path, isolation_level=None)
+    for pragma in pragmas:
+        connection.execute(pragma)
+    connection.executescript(
+        """
+        CREATE TABLE book (
+            id INTEGER PRIMARY KEY, rating_sum INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL, content_version INTEGER NOT NULL
+        );
+        CREATE TABLE leaf (
+            id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL REFERENCES book (id),
+            position INTEGER NOT NULL, content_html TEXT NOT NULL
+        );
+        CREATE INDEX leaf_book_position ON leaf (book_id, position);
+        CREATE TABLE review (
+            id INTEGER PRIMARY KEY, book_id INTEGER NOT NULL REFERENCES book (id),
+            rating INTEGER NOT NULL, comment TEXT NOT NULL
+        );
+        CREATE INDEX review_book_rating ON review (book_id, rating);
+        """
+    )
+    connection.execute("BEGIN")
+    connection.executemany(
+        "INSERT INTO book VALUES (?, 0, 0, 1)", [(pk,) for pk in range(1, books + 1)]
+    )
+    connection.executemany(
+        "INSERT INTO leaf (book_id, position, content_html) VALUES (?, ?, ?)",
+        [
+            (book, position, LEAF_TEXT)
+            for book in range(1, books + 1)
+            for position in range(LEAVES_PER_BOOK)
+        ],
+    )
+    connection.execute("COMMIT")
+    connection.close()
+
+
+def _run(path, pragmas, begin, options) -> dict:
+    roles = ["write"] * options["writers"] + ["read"] * options["readers"]
+    # Spawned rather than forked: the parent holds Django's connections.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(roles), mp_context=context) as pool:
+        start_at = time.time() + 1  # let every process start before the clock runs
+        futures = [
+            pool.submit(
+                _work, path, pragmas, begin, role, start_at, options["seconds"],
+                options["books"], seed,
+            )
+            for seed, role in enumerate(roles)
+        ]
+        outcomes = [future.result() for future in futures]
+
+    summary = {}
+    for role in ("write", "read"):
+        latencies = sorted(
+            latency for outcome in outcomes if outcome["role"] == role
+            for latency in outcome["latencies"]
+        )
+        errors = sum(outcome["errors"] for outcome in outcomes if outcome["role"] == role)
+        attempts = len(latencies) + errors
+        summary[role] = {
+            "ops": len(latencies),
+            "ops_per_second": round(len(latencies) / options["seconds"], 1),
+            "lock_errors": errors,
+            "lock_error_rate": round(errors / attempts, 4) if attempts else 0.0,
+            "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        }
+    return summary
+
+
+def _work(path, pragmas, begin, role, start_at, seconds, books, seed) -> dict:
+    """One worker process: run ``role`` operations until the time is up."""
+    connection = sqlite3.connect(path, isolation_level=None)
+    for pragma in pragmas:
+        connection.execute(pragma)
+    rng = random.Random(seed)
+    operation = _write if role == "write" else _read
+    latencies = []
+    errors = 0
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            operation(connection, begin, rng, books)
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error) and "busy" not in str(error):
+                raise
+            errors += 1
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+    return {"role": role, "latencies": latencies, "errors": errors}
+
+
+def _write(connection, begin, rng, books) -> None:
+    """A review post or a leaf save: read, then write, in one transaction."""
+    book = rng.randint(1, books)
+    connection.execute(begin)
+    connection.execute(
+        "SELECT rating_sum, rating_count FROM book WHERE id = ?", (book,)
+    ).fetchone()
+    if rng.random() < 0.5:
+        rating = rng.randint(1, 5)
+        connection.execute(
+            "INSERT INTO review (book_id, rating, comment) VALUES (?, ?, ?)",
+            (book, rating, "A fine notebook."),
+        )
+        connection.execute(
+            "UPDATE book SET rating_sum = rating_sum + ?, rating_count = rating_count + 1, "
+            "content_version = content_version + 1 WHERE id = ?",
+            (rating, book),
+        )
+    else:
+        html = LEAF_TEXT[::-1] if rng.random() < 0.5 else LEAF_TEXT
+        connection.execute(
+            "UPDATE leaf SET content_html = ? WHERE book_id = ? AND position = ?",
+            (html, book, rng.randrange(LEAVES_PER_BOOK)),
+        )
+        connection.execute(
+            "UPDATE book SET content_version = content_version + 1 WHERE id = ?", (book,)
+        )
+    connection.execute("COMMIT")
+
+
+def _read(connection, begin, rng, books) -> None:
+    """The detail page's reads: the book, its leaves and its top reviews."""
+    book = rng.randint(1, books)
+    connection.execute("SELECT * FROM book WHERE id = ?", (book,)).fetchone()
+    connection.execute(
+        "SELECT id, content_html FROM leaf WHERE book_id = ? ORDER BY position", (book,)
+    ).fetchall()
+    connection.execute(
+        "SELECT rating, comment FROM review WHERE book_id = ? ORDER BY rating DESC LIMIT 3",
+        (book,),
+    ).fetchall()
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _describe(name, summary) -> str:
+    return "\n".join(
+        f"{name:<8} {role:<5} {stats['ops_per_second']:>8.1f} ops/s  "
+        f"p50 {stats['p50_ms'] or 0:7.2f} ms  p95 {stats['p95_ms'] or 0:7.2f} ms  "
+        f"lock errors {stats['lock_errors']} ({stats['lock_error_rate']:.2%})"
+        for role, stats in summary.items()
+    )
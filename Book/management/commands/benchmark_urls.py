@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from Book import benchmarks
+from Book.synthetic import SYNTHETIC_DOMAIN
+from Book.models import Book, Leaf
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every named Book and User URL against the synthetic data, check "
+        "the query budgets and write counts and latency percentiles to JSON. "
+        "Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per URL.")
+        parser.add_argument(
+            "--output",
+            help="Result file; defaults to benchmark-results/urls-<timestamp>.json.",
+        )
+        parser.add_argument("--compare", help="Earlier result file to compare against.")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+        missing = benchmarks.uncovered()
+        if missing:
+            raise CommandError(f"No benchmark case for: {', '.join(missing)}")
+        try:
+            results = benchmarks.run(repeat=options["repeat"])
+        except benchmarks.MissingData as error:
+            raise CommandError(str(error))
+
+        for result in results:
+            line = (
+                f"{result['method']:>4} {result['name']:<26} "
+                f"queries {result['queries_cold']:>3}/{result['budget']:<3} "
+                f"warm {result['queries_warm']:>3}  "
+                f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms"
+            )
+            if result["ok"]:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f"{line}  status {result['status']}"))
+
+        output = Path(
+            options["output"]
+            or settings.BASE_DIR
+            / "benchmark-results"
+            / f"urls-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        synthetic_books = Book.objects.filter(owner__username__endswith=f"@{SYNTHETIC_DOMAIN}")
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "repeat": options["repeat"],
+            "data": {
+                "books": synthetic_books.count(),
+                "leaves": Leaf.objects.filter(book__in=synthetic_books).count(),
+            },
+            "results": results,
+        }
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Wrote {output}")
+
+        if options["compare"]:
+            previous = json.loads(Path(options["compare"]).read_text())
+            for line in benchmarks.compare(previous["results"], results):
+                self.stdout.write(line)
+
+        failed = [result["name"] for result in results if not result["ok"]]
+        if failed:
+            raise CommandError(f"Over budget or unexpected status: {', '.join(failed)}")
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Book import chunked
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads nobody has touched for a while, with their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age-hours",
+            type=float,
+            default=24,
+            help="Delete sessions idle for longer than this.",
+        )
+
+    def handle(self, *args, **options):
+        if options["max_age_hours"] < 0:
+            raise CommandError("--max-age-hours must not be negative.")
+        removed = chunked.clear_stale(timedelta(hours=options["max_age_hours"]))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {removed} stale uploads."))
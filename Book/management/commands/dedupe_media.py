@@ -0,0 +1,232 @@
+from urllib.parse import urlsplit, urlunsplit
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Book import caching, uploads
+from Book.models import (
+    Book,
+    EditorUpload,
+    ImageDerivative,
+    Leaf,
+    LeafImage,
+    StoredBlob,
+    touch_books,
+)
+from Book.storage import TEMP_PREFIX
+
+
+class Command(BaseCommand):
+    help = (
+        "Move media written before content-addressed storage into shared blobs, "
+        "repoint covers, leaf images, editor uploads and derivatives at them and "
+        "delete the duplicate copies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows and leaves read and updated per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only hash the files and report what would be reclaimed.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if not hasattr(default_storage, "adopt"):
+            raise CommandError("The default storage is not Book.storage.DedupStorage.")
+        self.storage = default_storage
+        self.batch_size = options["batch_size"]
+        self.blobs = set(StoredBlob.objects.values_list("name", flat=True))
+        if options["dry_run"]:
+            self.report()
+            return
+
+        # old name -> blob name, for every legacy file adopted
+        self.renamed = {}
+        self.books = set()
+        with transaction.atomic():
+            self.editor_uploads()
+            self.field(Book, "cover_image", "pk")
+            self.field(LeafImage, "image", "leaf__book_id")
+            self.move_derivatives()
+            self.field(ImageDerivative, "file", None)
+            touch_books(self.books)
+            caching.bump_on_commit(caching.CATALOGUE)
+
+        reclaimed = 0
+        targets = {new for old, new in self.renamed.items() if old != new}
+        for target in targets - self.blobs:
+            reclaimed -= self.storage.size(target)
+        for old, new in self.renamed.items():
+            if old != new:
+                reclaimed += self.storage.size(old)
+                self.storage.remove_file(old)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Adopted {len(self.renamed)} files into {len(set(self.renamed.values()))} "
+                f"blobs, reclaimed {reclaimed} bytes."
+            )
+        )
+
+    def legacy_names(self):
+        for name in _editor_files(self.storage):
+            yield name
+        for model, field in ((Book, "cover_image"), (LeafImage, "image"), (ImageDerivative, "file")):
+            names = (
+                model.objects.exclude(**{field: ""})
+                .exclude(**{f"{field}__isnull": True})
+                .values_list(field, flat=True)
+                .iterator(chunk_size=self.batch_size)
+            )
+            yield from names
+
+    def report(self):
+        sizes = {}
+        targets = {}
+        for name in self.legacy_names():
+            if name in self.blobs or name in sizes:
+                continue
+            try:
+                digest, sizes[name] = self.storage.digest(name)
+            except FileNotFoundError:
+                self.stderr.write(f"Missing {name}")
+                continue
+            directory = name.rsplit("/", 1)[0] if "/" in name else ""
+            targets.setdefault((directory, digest), sizes[name])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(sizes)} files, {len(targets)} unique; would reclaim "
+                f"{sum(sizes.values()) - sum(targets.values())} bytes."
+            )
+        )
+
+    def adopt(self, name) -> str:
+        """The blob for ``name``, counting one more reference to it."""
+        if name in self.blobs:
+            return name
+        new = self.renamed.get(name)
+        if new is not None:
+            self.storage.reference(new)
+            return new
+        try:
+            new = self.storage.adopt(name)
+        except FileNotFoundError:
+            self.stderr.write(f"Missing {name}")
+            return name
+        self.renamed[name] = new
+        return new
+
+    def editor_uploads(self):
+        for name in _editor_files(self.storage):
+            if name not in self.blobs:
+                self.adopt(name)
+
+        # Newest first, so when several uploads collapse into one blob the
+        # row kept is the one the sweep would spare longest.
+        kept = set(EditorUpload.objects.filter(file__in=self.blobs).values_list("file", flat=True))
+        duplicates = []
+        changed = []
+        for upload in EditorUpload.objects.order_by("-created_at").iterator(
+            chunk_size=self.batch_size
+        ):
+            new = self.renamed.get(upload.file.name)
+            if new is None or new == upload.file.name:
+                kept.add(upload.file.name)
+            elif new in kept:
+                duplicates.append(upload.pk)
+            else:
+                kept.add(new)
+                upload.file = new
+                changed.append(upload)
+        EditorUpload.objects.filter(pk__in=duplicates).delete()
+        EditorUpload.objects.bulk_update(changed, ["file"], batch_size=self.batch_size)
+
+        leaves = []
+        for leaf in Leaf.objects.only("pk", "book_id", "text", "content_json").iterator(
+            chunk_size=self.batch_size
+        ):
+            if self.rewrite_sources(leaf.content_json):
+                leaf.render_fields()
+                leaves.append(leaf)
+                self.books.add(leaf.book_id)
+            if len(leaves) == self.batch_size:
+                self.save_leaves(leaves)
+                leaves = []
+        self.save_leaves(leaves)
+
+    def rewrite_sources(self, node) -> bool:
+        """Point editor image srcs in a TipTap document at their blobs."""
+        changed = False
+        if isinstance(node, dict):
+            attrs = node.get("attrs")
+            if isinstance(attrs, dict) and isinstance(attrs.get("src"), str):
+                old = uploads.upload_name(attrs["src"])
+                new = self.renamed.get(old, old)
+                if new != old:
+                    parts = urlsplit(attrs["src"])
+                    attrs["src"] = urlunsplit(parts._replace(path=self.storage.url(new)))
+                    changed = True
+            for child in node.get("content") or ():
+                changed = self.rewrite_sources(child) or changed
+        elif isinstance(node, list):
+            for child in node:
+                changed = self.rewrite_sources(child) or changed
+        return changed
+
+    def save_leaves(self, leaves):
+        # bulk_update skips the receivers; the text is unchanged, so only
+        # the cached fragments need invalidating, which handle() does.
+        Leaf.objects.bulk_update(
+            leaves, ["content_json", "plain_text", "content_html"], batch_size=self.batch_size
+        )
+
+    def field(self, model, field, book_path):
+        columns = ["pk", field] + ([book_path] if book_path else [])
+        rows = (
+            model.objects.exclude(**{field: ""})
+            .exclude(**{f"{field}__isnull": True})
+            .values_list(*columns)
+            .iterator(chunk_size=self.batch_size)
+        )
+        changed = []
+        for pk, name, *book in rows:
+            new = self.adopt(name)
+            if new == name:
+                continue
+            changed.append(model(pk=pk, **{field: new}))
+            self.books.update(book)
+            if len(changed) == self.batch_size:
+                model.objects.bulk_update(changed, [field])
+                changed = []
+        model.objects.bulk_update(changed, [field])
+
+    def move_derivatives(self):
+        """Give derivatives of renamed images the blob's name, dropping repeats."""
+        for old, new in self.renamed.items():
+            if old == new:
+                continue
+            derivatives = ImageDerivative.objects.filter(source_name=old)
+            if ImageDerivative.objects.filter(source_name=new).exists():
+                for derivative in derivatives:
+                    self.storage.delete(derivative.file.name)
+                derivatives.delete()
+            else:
+                derivatives.update(source_name=new)
+
+
+def _editor_files(storage):
+    try:
+        _, files = storage.listdir(uploads.EDITOR_UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        if not filename.startswith(TEMP_PREFIX):
+            yield f"{uploads.EDITOR_UPLOAD_DIR}/{filename}"
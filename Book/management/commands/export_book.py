@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Book import archive
+from Book.models import Book
+
+
+class Command(BaseCommand):
+    help = "Write a book, its leaves and images to a ZIP archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("book_id", type=int)
+        parser.add_argument(
+            "--output",
+            help="Archive path; defaults to book-<id>.zip. Use - for stdout.",
+        )
+
+    def handle(self, *args, **options):
+        book = Book.objects.select_related("category").filter(pk=options["book_id"]).first()
+        if book is None:
+            raise CommandError(f"Book {options['book_id']} does not exist.")
+        output = options["output"] or archive.export_filename(book)
+        if output == "-":
+            for chunk in archive.export_book(book):
+                sys.stdout.buffer.write(chunk)
+            return
+        with open(output, "wb") as target:
+            for chunk in archive.export_book(book):
+                target.write(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Exported {book.leaf_count} leaves to {output}."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from Book import caching
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the book fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Zero the counters after printing them.",
+        )
+
+    def handle(self, *args, **options):
+        total_hits = total_misses = 0
+        for name, counts in caching.stats().items():
+            hits, misses = counts["hits"], counts["misses"]
+            total_hits += hits
+            total_misses += misses
+            self.stdout.write(
+                f"{name:<16} {hits:>8} hits {misses:>8} misses{self._ratio(hits, misses)}"
+            )
+        self.stdout.write(
+            f"{'total':<16} {total_hits:>8} hits {total_misses:>8} misses"
+            f"{self._ratio(total_hits, total_misses)}"
+        )
+        if options["reset"]:
+            caching.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
+
+    def _ratio(self, hits, misses) -> str:
+        if not hits + misses:
+            return ""
+        return f" ({hits / (hits + misses):.0%} hit rate)"
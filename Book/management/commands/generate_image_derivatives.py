@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from Book.images import generate_derivatives, generate_pending
+from Book.models import Book, LeafImage, PendingDerivative
+from Book.uploads import EDITOR_UPLOAD_DIR
+
+
+class Command(BaseCommand):
+    help = "Create responsive derivatives for existing covers, leaf images and editor uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Number of images handed to the worker pool at a time.",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Only finish images scheduled by the web workers but never processed, "
+            "for example because a worker restarted.",
+        )
+        parser.add_argument(
+            "--older-than-minutes",
+            type=int,
+            default=5,
+            help="With --pending, skip images scheduled more recently; the web "
+            "workers are probably still on them.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be positive.")
+        if options["pending"]:
+            cutoff = timezone.now() - timedelta(minutes=options["older_than_minutes"])
+            names = PendingDerivative.objects.filter(created_at__lte=cutoff).values_list(
+                "source_name", flat=True
+            )
+            names, generate = list(names), generate_pending
+        else:
+            names, generate = _source_names(), generate_derivatives
+        created = 0
+        images = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for chunk in _chunks(names, options["chunk_size"]):
+                created += sum(pool.map(lambda name: _generate(generate, name), chunk))
+                images += len(chunk)
+                self.stdout.write(f"{images} images processed, {created} derivatives created")
+        self.stdout.write(self.style.SUCCESS(f"Created {created} derivatives for {images} images."))
+
+
+def _generate(generate, name):
+    close_old_connections()
+    try:
+        return generate(name)
+    finally:
+        close_old_connections()
+
+
+def _source_names():
+    covers = (
+        Book.objects.exclude(cover_image="")
+        .exclude(cover_image__isnull=True)
+        .values_list("cover_image", flat=True)
+        .iterator()
+    )
+    yield from covers
+    yield from LeafImage.objects.values_list("image", flat=True).iterator()
+    try:
+        _, files = default_storage.listdir(EDITOR_UPLOAD_DIR)
+    except FileNotFoundError:
+        files = []
+    for filename in files:
+        yield f"{EDITOR_UPLOAD_DIR}/{filename}"
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Book import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        "Create synthetic users, books, leaves, reviews and saves with bulk_create. "
+        f"Synthetic users have @{synthetic.SYNTHETIC_DOMAIN} emails and the password "
+        f"{synthetic.PASSWORD!r}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--books-per-user", type=int, default=4)
+        parser.add_argument(
+            "--max-leaves",
+            type=int,
+            default=40,
+            help="Leaves in the longest book; most books have far fewer.",
+        )
+        parser.add_argument(
+            "--max-blocks", type=int, default=40, help="Blocks in the longest leaf."
+        )
+        parser.add_argument("--reviews-per-book", type=int, default=5)
+        parser.add_argument("--saves-per-user", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete the existing synthetic users and their data first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["max_blocks"] < 1:
+            raise CommandError("--users and --max-blocks must be positive.")
+        if options["clear"]:
+            deleted = synthetic.clear()
+            self.stdout.write(f"Deleted {deleted} synthetic rows.")
+        started = time.perf_counter()
+        counts = synthetic.generate(
+            users=options["users"],
+            books_per_user=options["books_per_user"],
+            max_leaves=options["max_leaves"],
+            max_blocks=options["max_blocks"],
+            reviews_per_book=options["reviews_per_book"],
+            saves_per_user=options["saves_per_user"],
+            seed=options["seed"],
+        )
+        summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {summary} in {time.perf_counter() - started:.1f}s.")
+        )
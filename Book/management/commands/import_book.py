@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from Book import archive
+from categories import registry as category_registry
+
+
+class Command(BaseCommand):
+    help = "Create a book from a ZIP archive written by export_book."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--owner", required=True, help="Username of the new book's owner.")
+        parser.add_argument(
+            "--category",
+            type=int,
+            help="Category id; defaults to the category named in the archive.",
+        )
+
+    def handle(self, *args, **options):
+        owner = get_user_model().objects.filter(username=options["owner"]).first()
+        if owner is None:
+            raise CommandError(f"User {options['owner']!r} does not exist.")
+        category = None
+        if options["category"] is not None:
+            category = category_registry.get(options["category"])
+            if category is None:
+                raise CommandError(f"Category {options['category']} does not exist.")
+        try:
+            with open(options["path"], "rb") as source:
+                book = archive.import_book(source, owner=owner, category=category)
+        except (OSError, archive.ArchiveError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported book {book.pk} with {book.leaf_count} leaves.")
+        )
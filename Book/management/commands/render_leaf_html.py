@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Book.models import Leaf, touch_books
+
+
+class Command(BaseCommand):
+    help = "Render content_html for leaves from their TipTap content_json, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of leaves rendered per transaction.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-render every leaf, not only those without stored HTML.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        queryset = Leaf.objects.only("pk", "book_id", "text", "content_json", "content_html")
+        if not options["all"]:
+            queryset = queryset.filter(content_html="")
+
+        rendered = 0
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_id).order_by("pk")[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1].pk
+            changed = []
+            for leaf in chunk:
+                html = leaf.render_content_html()
+                if html != leaf.content_html:
+                    leaf.content_html = html
+                    changed.append(leaf)
+            with transaction.atomic():
+                Leaf.objects.bulk_update(changed, ["content_html"])
+                touch_books(leaf.book_id for leaf in changed)
+            rendered += len(changed)
+        self.stdout.write(self.style.SUCCESS(f"Rendered HTML for {rendered} leaves."))
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from Book import uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete leaf-editor uploads that no leaf references any more and that are "
+        "older than the grace period, with their resized derivatives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-days",
+            type=float,
+            default=7,
+            help="Keep uploads younger than this; they may sit in an unsaved editor.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Leaves read and uploads deleted per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be deleted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1 or options["grace_days"] < 0:
+            raise CommandError("--batch-size must be positive and --grace-days not negative.")
+        cutoff = timezone.now() - timedelta(days=options["grace_days"])
+        orphans = uploads.find_orphans(cutoff, batch_size=batch_size)
+        names = sorted(orphans)
+        if options["dry_run"]:
+            for name in names:
+                self.stdout.write(f"Would delete {name} ({orphans[name]} bytes)")
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{len(names)} unreferenced uploads, {_format(sum(orphans.values()))} "
+                    "(derivatives not counted)."
+                )
+            )
+            return
+
+        deleted = freed = 0
+        for start in range(0, len(names), batch_size):
+            count, size = uploads.delete_uploads(names[start:start + batch_size], cutoff)
+            deleted += count
+            freed += size
+            self.stdout.write(f"{min(start + batch_size, len(names))}/{len(names)} checked")
+        # Uploads pasted again since they were listed are kept.
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} uploads, reclaimed {_format(freed)}.")
+        )
+
+
+def _format(size) -> str:
+    for unit in ("bytes", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Book", "0012_book_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaf",
+            name="plain_text",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
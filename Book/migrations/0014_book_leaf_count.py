@@ -0,0 +1,32 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_leaf_count(apps, schema_editor):
+    Book = apps.get_model("Book", "Book")
+    Leaf = apps.get_model("Book", "Leaf")
+    counts = (
+        Leaf.objects.filter(book=OuterRef("pk"))
+        .order_by()
+        .values("book")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Book.objects.update(leaf_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Book", "0013_leaf_plain_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="leaf_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_leaf_count, migrations.RunPython.noop),
+    ]
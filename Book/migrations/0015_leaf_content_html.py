@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Book", "0014_book_leaf_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaf",
+            name="content_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
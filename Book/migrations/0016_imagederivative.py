@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Book", "0015_leaf_content_html"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageDerivative",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("source_name", models.CharField(db_index=True, max_length=255)),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("format", models.CharField(choices=[("webp", "WebP"), ("jpeg", "JPEG")], max_length=4)),
+                ("file", models.ImageField(max_length=255, upload_to="books/derivatives/")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["source_name", "format", "width"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("source_name", "format", "width"), name="unique_image_derivative"),
+                ],
+            },
+        ),
+    ]
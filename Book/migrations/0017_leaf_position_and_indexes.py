@@ -0,0 +1,64 @@
+from django.db import migrations, models
+
+POSITION_GAP = 1024
+BATCH_SIZE = 1000
+
+
+def backfill_positions(apps, schema_editor):
+    """Number each book's leaves in created_at order, POSITION_GAP apart."""
+    Leaf = apps.get_model("Book", "Leaf")
+    batch = []
+    book_id = None
+    position = 0
+    rows = (
+        Leaf.objects.order_by("book_id", "created_at", "pk")
+        .values_list("pk", "book_id")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for pk, leaf_book_id in rows:
+        if leaf_book_id != book_id:
+            book_id = leaf_book_id
+            position = 0
+        position += POSITION_GAP
+        batch.append(Leaf(pk=pk, position=position))
+        if len(batch) >= BATCH_SIZE:
+            Leaf.objects.bulk_update(batch, ["position"])
+            batch = []
+    if batch:
+        Leaf.objects.bulk_update(batch, ["position"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("Book", "0016_imagederivative"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leaf",
+            name="position",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name="leaf",
+            options={"ordering": ["position", "pk"]},
+        ),
+        migrations.AddIndex(
+            model_name="leaf",
+            index=models.Index(fields=["book", "position"], name="leaf_book_position_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["is_public", "updated_at"], name="book_public_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["owner", "updated_at"], name="book_owner_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["category", "is_public"], name="book_category_public_idx"),
+        ),
+    ]
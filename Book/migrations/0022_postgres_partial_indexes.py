@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# Partial indexes only PostgreSQL gets; SQLite keeps the full indexes from
+# 0001-0021. Built CONCURRENTLY so a live database keeps taking writes.
+INDEXES = {
+    # The public catalogue and its category filter, in keyset order.
+    "book_public_updated_partial_idx": (
+        '"Book_book" ("updated_at" DESC, "id" DESC) WHERE "is_public"'
+    ),
+    "book_public_category_updated_partial_idx": (
+        '"Book_book" ("category_id", "updated_at" DESC, "id" DESC) WHERE "is_public"'
+    ),
+    # create_session counts a user's unfinished chunked uploads.
+    "uploadsession_open_owner_partial_idx": (
+        '"Book_uploadsession" ("owner_id") WHERE NOT "completed"'
+    ),
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, definition in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON {definition}')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("Book", "0021_book_content_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
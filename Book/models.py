@@ -1,5 +1,19 @@
+import uuid
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, QuerySet
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from .tiptap import plain_text, render_html
+
+LEAF_PREVIEW_LENGTH = 140
+# Order in which a book's leaves are read, exported and paged.
+READER_ORDERING = ("position", "pk")
+# Distance between consecutive leaf positions, so a leaf can be moved
+# between two others by rewriting only its own position.
+POSITION_GAP = 1024
 
 
 class Book(models.Model):
@@ -19,13 +33,71 @@ class Book(models.Model):
     is_public = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_avg = models.FloatField(blank=True, null=True)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    leaf_count = models.PositiveIntegerField(default=0)
+    # Advanced by every change to what the detail and reader pages show
+    # (the book, its leaves and images, reviews); see content_changes().
+    content_version = models.PositiveBigIntegerField(default=1, editable=False)
+    content_updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-updated_at"]
+        indexes = [
+            models.Index(fields=["is_public", "updated_at"], name="book_public_updated_idx"),
+            models.Index(fields=["owner", "updated_at"], name="book_owner_updated_idx"),
+            models.Index(fields=["category", "is_public"], name="book_category_public_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
 
+    @property
+    def rating_histogram(self) -> dict[int, int]:
+        return {
+            stars: getattr(self, f"rating_{stars}_count") for stars in range(1, 6)
+        }
+
+
+def content_changes() -> dict:
+    """UPDATE values that advance a book's content version."""
+    return {
+        "content_version": F("content_version") + 1,
+        "content_updated_at": timezone.now(),
+    }
+
+
+def deleted_with_book(origin) -> bool:
+    """Whether a delete signal is part of deleting whole books.
+
+    ``origin`` is the signal's ``origin`` argument. Receivers of rows that
+    cascade from a book skip their per-row bookkeeping then; the Book
+    receivers clean up after the whole book at once.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is Book
+    return isinstance(origin, Book)
+
+
+def touch_books(book_ids) -> None:
+    """Advance the content version of the given books."""
+    book_ids = set(book_ids)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(**content_changes())
+
+
+def touch_books_showing(user_id) -> None:
+    """Advance the books whose pages show this user: owned or reviewed."""
+    Book.objects.filter(Q(owner_id=user_id) | Q(reviews__user_id=user_id)).update(
+        **content_changes()
+    )
+
 
 class SavedBook(models.Model):
     user = models.ForeignKey(
@@ -49,18 +121,83 @@ class SavedBook(models.Model):
         return f"{self.user_id} saved {self.book_id}"
 
 
+class LeafQuerySet(models.QuerySet):
+    def summaries(self):
+        """Leaves without their content, with a short ``preview`` of the text."""
+        return self.only("pk", "book_id", "created_at").annotate(
+            preview=Substr("plain_text", 1, LEAF_PREVIEW_LENGTH)
+        )
+
+
 class Leaf(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="leaves")
     text = models.CharField(max_length=500, blank=True)
     content_json = models.JSONField(default=dict, blank=True)
+    plain_text = models.TextField(blank=True, editable=False)
+    content_html = models.TextField(blank=True, editable=False)
+    position = models.BigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = LeafQuerySet.as_manager()
+
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["position", "pk"]
+        indexes = [
+            models.Index(fields=["book", "position"], name="leaf_book_position_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Leaf for {self.book.title}"
 
+    def save(self, *args, **kwargs):
+        self.render_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content_json" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "plain_text", "content_html"}
+        # Book.leaf_count is updated by the post_save receiver; keep both
+        # writes in one transaction.
+        with transaction.atomic():
+            if self._state.adding and not self.position:
+                self.position = Leaf.next_position(self.book_id)
+            super().save(*args, **kwargs)
+
+    @staticmethod
+    def next_position(book_id) -> int:
+        """Position for a leaf appended to the end of the book."""
+        last = (
+            Leaf.objects.filter(book_id=book_id)
+            .order_by("-position")
+            .values_list("position", flat=True)
+            .first()
+        )
+        return (last or 0) + POSITION_GAP
+
+    def render_fields(self) -> None:
+        """Fill plain_text and content_html from the content, as save() does.
+
+        Call it before bulk_create(), which bypasses save().
+        """
+        self.plain_text = plain_text(self.content_json) or self.text
+        self.content_html = self.render_content_html()
+
+    def render_content_html(self) -> str:
+        html = render_html(self.content_json)
+        if not html and self.text:
+            html = render_html(
+                {
+                    "type": "doc",
+                    "content": [
+                        {"type": "paragraph", "content": [{"type": "text", "text": self.text}]}
+                    ],
+                }
+            )
+        return html
+
+    @property
+    def html(self) -> str:
+        """Stored HTML, rendered on the fly for leaves not backfilled yet."""
+        return self.content_html or self.render_content_html()
+
 
 class LeafImage(models.Model):
     leaf = models.ForeignKey(Leaf, on_delete=models.CASCADE, related_name="images")
@@ -72,3 +209,127 @@ class LeafImage(models.Model):
 
     def __str__(self) -> str:
         return f"Leaf image {self.leaf_id}"
+
+
+class EditorUpload(models.Model):
+    """An image pasted or dropped into the leaf editor.
+
+    The leaf only references it by URL inside content_json; sweep_editor_uploads
+    deletes uploads that no leaf references any more.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="editor_uploads",
+    )
+    file = models.ImageField(upload_to="books/leaf_editor/", max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self) -> str:
+        return self.file.name
+
+
+class UploadSession(models.Model):
+    """A chunked upload in progress or finalized; see Book/chunked.py."""
+
+    PURPOSE_EDITOR = "editor"
+    PURPOSE_LEAF_IMAGE = "leaf_image"
+    PURPOSE_COVER = "cover"
+    PURPOSE_CHOICES = [
+        (PURPOSE_EDITOR, "Editor image"),
+        (PURPOSE_LEAF_IMAGE, "Leaf image"),
+        (PURPOSE_COVER, "Cover"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="upload_sessions",
+    )
+    purpose = models.CharField(max_length=12, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class StoredBlob(models.Model):
+    """One unique file kept by Book.storage.DedupStorage, named by its digest.
+
+    ref_count is the number of saves that produced this blob minus the
+    deletes; the file is removed when it reaches zero.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.ref_count})"
+
+
+class ImageDerivative(models.Model):
+    """A resized copy of an uploaded image, keyed by the original's storage name."""
+
+    FORMAT_WEBP = "webp"
+    FORMAT_JPEG = "jpeg"
+    FORMAT_CHOICES = [(FORMAT_WEBP, "WebP"), (FORMAT_JPEG, "JPEG")]
+
+    source_name = models.CharField(max_length=255, db_index=True)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=4, choices=FORMAT_CHOICES)
+    file = models.ImageField(upload_to="books/derivatives/", max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["source_name", "format", "width"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_name", "format", "width"],
+                name="unique_image_derivative",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.source_name} {self.width}w {self.format}"
+
+
+class PendingDerivative(models.Model):
+    """An image whose derivatives are queued but not generated yet.
+
+    Written with the upload and deleted once the thread pool has generated
+    the derivatives, so jobs lost to a worker restart are still on record
+    for ``generate_image_derivatives --pending``.
+    """
+
+    source_name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self) -> str:
+        return self.source_name
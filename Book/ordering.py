@@ -0,0 +1,100 @@
+"""Moving leaves within a book.
+
+Positions are spaced POSITION_GAP apart, so moving leaves between two
+neighbours only rewrites the moved rows with positions taken from the gap.
+The whole book is renumbered only when that gap has run out.
+"""
+from django.db import transaction
+
+from .models import POSITION_GAP, READER_ORDERING, Book, Leaf, touch_books
+
+
+class ReorderError(ValueError):
+    """The requested move does not fit the book."""
+
+
+def move_leaves(book: Book, leaf_ids, after_id=None) -> bool:
+    """Place ``leaf_ids``, in that order, directly after leaf ``after_id``.
+
+    ``after_id`` of None moves them to the start of the book. Returns
+    whether the whole book had to be renumbered.
+    """
+    leaf_ids = list(dict.fromkeys(leaf_ids))
+    if not leaf_ids:
+        raise ReorderError("No leaves to move.")
+    if after_id in leaf_ids:
+        raise ReorderError("A leaf cannot be moved after itself.")
+    with transaction.atomic():
+        # Serialize reorders of one book.
+        Book.objects.select_for_update().filter(pk=book.pk).values_list("pk").first()
+        leaves = Leaf.objects.filter(book=book)
+        moving = {leaf.pk: leaf for leaf in leaves.filter(pk__in=leaf_ids).only("pk", "position")}
+        if len(moving) != len(leaf_ids):
+            raise ReorderError("Some leaves are not in this book.")
+        others = leaves.exclude(pk__in=leaf_ids)
+
+        if after_id is None:
+            before = 0
+            following = others.order_by(*READER_ORDERING)
+        else:
+            before = others.filter(pk=after_id).values_list("position", flat=True).first()
+            if before is None:
+                raise ReorderError("The target leaf is not in this book.")
+            following = others.filter(position__gt=before).order_by(*READER_ORDERING)
+        after = following.values_list("position", flat=True).first()
+        if after is None:
+            after = before + POSITION_GAP * (len(leaf_ids) + 1)
+
+        step = (after - before) // (len(leaf_ids) + 1)
+        if step < 1 or _has_ties(others, before, after_id):
+            renumber(book, _reordered_ids(book, leaf_ids, after_id))
+            touch_books([book.pk])
+            return True
+        changed = []
+        for index, leaf_id in enumerate(leaf_ids, start=1):
+            leaf = moving[leaf_id]
+            leaf.position = before + step * index
+            changed.append(leaf)
+        Leaf.objects.bulk_update(changed, ["position"])
+        # bulk_update sends no post_save signal; touch like the receivers would.
+        touch_books([book.pk])
+    return False
+
+
+def _has_ties(others, before, after_id) -> bool:
+    """Whether another leaf shares the target's position, making "after" ambiguous."""
+    if after_id is None:
+        return False
+    return others.filter(position=before).exclude(pk=after_id).exists()
+
+
+def _reordered_ids(book, leaf_ids, after_id) -> list:
+    moving = set(leaf_ids)
+    order = [
+        leaf_id
+        for leaf_id in Leaf.objects.filter(book=book)
+        .order_by(*READER_ORDERING)
+        .values_list("pk", flat=True)
+        if leaf_id not in moving
+    ]
+    index = 0 if after_id is None else order.index(after_id) + 1
+    return order[:index] + leaf_ids + order[index:]
+
+
+def renumber(book, leaf_ids=None, batch_size=500) -> None:
+    """Give the book's leaves evenly spaced positions in ``leaf_ids`` order
+    (reading order by default)."""
+    if leaf_ids is None:
+        leaf_ids = list(
+            Leaf.objects.filter(book=book)
+            .order_by(*READER_ORDERING)
+            .values_list("pk", flat=True)
+        )
+    Leaf.objects.bulk_update(
+        [
+            Leaf(pk=leaf_id, position=POSITION_GAP * index)
+            for index, leaf_id in enumerate(leaf_ids, start=1)
+        ],
+        ["position"],
+        batch_size=batch_size,
+    )
@@ -0,0 +1,55 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(book) -> str:
+    raw = f"{book.updated_at.isoformat()}|{book.pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        updated_at, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise Http404("Invalid cursor.")
+
+
+def keyset_page(queryset, cursor: str, page_size: int):
+    """Return one page of books ordered by (-updated_at, -id) and the next cursor.
+
+    The cursor is the position of the last book already shown, so every page
+    is a range scan on (updated_at, id) no matter how deep it is.
+    """
+    books = list(_after(queryset, cursor)[: page_size + 1])
+    return _split(books, page_size)
+
+
+async def akeyset_page(queryset, cursor: str, page_size: int):
+    """``keyset_page`` through the async ORM."""
+    books = [book async for book in _after(queryset, cursor)[: page_size + 1]]
+    return _split(books, page_size)
+
+
+def _after(queryset, cursor: str):
+    queryset = queryset.order_by("-updated_at", "-id")
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, pk__lt=pk)
+        )
+    return queryset
+
+
+def _split(books, page_size: int):
+    next_cursor = ""
+    if len(books) > page_size:
+        books = books[:page_size]
+        next_cursor = encode_cursor(books[-1])
+    return books, next_cursor
@@ -0,0 +1,58 @@
+"""Saved-book state for a user, read and written in bulk.
+
+Writes set an explicit state instead of toggling, so a repeated or
+concurrent request leaves the same result. Saving is an insert that
+skips rows already covered by the ``unique_saved_book`` constraint.
+"""
+from django.db.models import Q
+
+from .models import Book, SavedBook
+
+
+def saved_ids(user, book_ids) -> set:
+    """Ids among ``book_ids`` the user has saved, in one query."""
+    book_ids = {book_id for book_id in book_ids if book_id is not None}
+    if not book_ids or not user.is_authenticated:
+        return set()
+    return set(
+        SavedBook.objects.filter(user=user, book_id__in=book_ids).values_list(
+            "book_id", flat=True
+        )
+    )
+
+
+async def asaved_ids(user, book_ids) -> set:
+    """``saved_ids`` through the async ORM."""
+    book_ids = {book_id for book_id in book_ids if book_id is not None}
+    if not book_ids or not user.is_authenticated:
+        return set()
+    return {
+        book_id
+        async for book_id in SavedBook.objects.filter(
+            user=user, book_id__in=book_ids
+        ).values_list("book_id", flat=True)
+    }
+
+
+def visible_ids(user, book_ids) -> set:
+    """Ids among ``book_ids`` the user may save: public books and their own."""
+    return set(
+        Book.objects.filter(pk__in=set(book_ids))
+        .filter(Q(is_public=True) | Q(owner=user))
+        .values_list("pk", flat=True)
+    )
+
+
+def set_saved(user, book_ids, saved: bool) -> set:
+    """Save or unsave the visible books among ``book_ids``; return their ids."""
+    book_ids = visible_ids(user, book_ids)
+    if not book_ids:
+        return set()
+    if saved:
+        SavedBook.objects.bulk_create(
+            [SavedBook(user=user, book_id=book_id) for book_id in book_ids],
+            ignore_conflicts=True,
+        )
+    else:
+        SavedBook.objects.filter(user=user, book_id__in=book_ids).delete()
+    return book_ids
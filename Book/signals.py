@@ -0,0 +1,83 @@
+from allauth.socialaccount.models import SocialAccount
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching
+from .models import (
+    Book,
+    Leaf,
+    LeafImage,
+    content_changes,
+    deleted_with_book,
+    touch_books,
+    touch_books_showing,
+)
+
+# What book pages show of their owner and reviewers.
+DISPLAYED_USER_FIELDS = {"first_name", "last_name", "username"}
+
+
+@receiver(post_save, sender=Leaf)
+def count_saved_leaf(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    changes = content_changes()
+    if created:
+        changes["leaf_count"] = F("leaf_count") + 1
+    Book.objects.filter(pk=instance.book_id).update(**changes)
+
+
+@receiver(post_delete, sender=Leaf)
+def count_deleted_leaf(sender, instance, origin=None, **kwargs):
+    if deleted_with_book(origin):
+        return
+    Book.objects.filter(pk=instance.book_id).update(
+        leaf_count=Greatest(F("leaf_count") - 1, 0), **content_changes()
+    )
+
+
+@receiver(post_save, sender=Book)
+def touch_saved_book(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        touch_books([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_catalogue(sender, instance, **kwargs):
+    caching.bump_on_commit(caching.CATALOGUE)
+
+
+@receiver(post_save, sender=LeafImage)
+@receiver(post_delete, sender=LeafImage)
+def invalidate_leaf_image_book(sender, instance, origin=None, **kwargs):
+    if deleted_with_book(origin):
+        return
+    book_id = (
+        Leaf.objects.filter(pk=instance.leaf_id).values_list("book_id", flat=True).first()
+    )
+    if book_id is not None:
+        touch_books([book_id])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_books_showing_user(
+    sender, instance, created, raw=False, update_fields=None, **kwargs
+):
+    # A login saves only last_login, which no page shows.
+    if created or raw:
+        return
+    if update_fields and not DISPLAYED_USER_FIELDS & set(update_fields):
+        return
+    touch_books_showing(instance.pk)
+
+
+@receiver(post_save, sender=SocialAccount)
+@receiver(post_delete, sender=SocialAccount)
+def touch_books_showing_avatar(sender, instance, raw=False, **kwargs):
+    # Reviewer avatars come from the first social account.
+    if not raw:
+        touch_books_showing(instance.user_id)
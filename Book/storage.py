@@ -0,0 +1,145 @@
+"""Content-addressed file storage.
+
+``DedupStorage`` hashes every upload while streaming it to a temporary file
+and keeps it as ``<upload directory>/<sha256><ext>``. An identical upload to
+the same directory finds the blob already there and gets the same name, so
+covers, leaf images and editor uploads are stored once however many times
+they are uploaded. StoredBlob counts the saves of each blob; ``delete``
+removes the file only when the last reference goes.
+
+Files written before this storage was configured have no StoredBlob row and
+are deleted as before; ``dedupe_media`` converts them.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = ".upload-"
+
+
+def blob_name(directory, digest, ext) -> str:
+    filename = f"{digest}{ext.lower()}"
+    return f"{directory}/{filename}" if directory else filename
+
+
+class DedupStorage(FileSystemStorage):
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, prefix=TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    hasher.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            name = blob_name(directory, hasher.hexdigest(), os.path.splitext(filename)[1])
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._add_reference(name, hasher.hexdigest(), size)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save, so the uploaded
+        # name never has to be made unique.
+        return name
+
+    def _add_reference(self, name, digest, size) -> None:
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            if StoredBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1):
+                return
+            try:
+                with transaction.atomic():
+                    StoredBlob.objects.create(name=name, digest=digest, size=size, ref_count=1)
+            except IntegrityError:
+                StoredBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+    def reference(self, name) -> None:
+        """Count one more use of an existing blob."""
+        from .models import StoredBlob
+
+        StoredBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+    def delete(self, name):
+        """Drop one reference; the file goes with the last one."""
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            transaction.on_commit(lambda: super(DedupStorage, self).delete(name))
+
+    def purge(self, name) -> None:
+        """Delete a blob whatever its reference count."""
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            StoredBlob.objects.filter(name=name).delete()
+            transaction.on_commit(lambda: super(DedupStorage, self).delete(name))
+
+    def discard(self, name) -> None:
+        """Delete a file saved in a transaction that was rolled back.
+
+        The rollback already undid the reference, so a blob that still has a
+        StoredBlob row was there before and is left alone.
+        """
+        from .models import StoredBlob
+
+        if not StoredBlob.objects.filter(name=name).exists():
+            super().delete(name)
+
+    def digest(self, name):
+        """The sha256 hex digest and size of a stored file."""
+        hasher = hashlib.sha256()
+        size = 0
+        with self.open(name, "rb") as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                hasher.update(chunk)
+                size += len(chunk)
+        return hasher.hexdigest(), size
+
+    def adopt(self, name) -> str:
+        """Register an existing file as a blob and return the blob's name.
+
+        The original file is left in place; the caller deletes it once no
+        row points at it.
+        """
+        digest, size = self.digest(name)
+        directory, filename = os.path.split(name)
+        target = blob_name(directory, digest, os.path.splitext(filename)[1])
+        if target != name and not self.exists(target):
+            try:
+                os.link(self.path(name), self.path(target))
+            except OSError:
+                shutil.copyfile(self.path(name), self.path(target))
+        self._add_reference(target, digest, size)
+        return target
+
+    def remove_file(self, name) -> None:
+        """Delete a file without touching reference counts."""
+        super().delete(name)
@@ -0,0 +1,209 @@
+"""Synthetic users, books, leaves, reviews and saves for benchmarks.
+
+Everything is written with bulk_create in batches, so the receivers that
+normally keep leaf counts, rating aggregates and the search index current
+do not run; ``generate`` fills those in itself. Synthetic users share the
+SYNTHETIC_DOMAIN email domain and ``clear`` deletes them with everything
+they own.
+"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from categories.models import Category
+from reviews.models import Review
+from reviews.ratings import RATING_FIELDS, compute_ratings
+from search import index as search_index
+
+from . import caching
+from .models import POSITION_GAP, Book, Leaf, SavedBook
+
+SYNTHETIC_DOMAIN = "synthetic.invalid"
+PASSWORD = "synthetic-password"
+CATEGORY_NAMES = ("General", "Travel", "Recipes", "Science", "Journal")
+WORDS = "the quiet river carried letters from the old harbor town".split()
+COLORS = ("#1f2a37", "#3c6ea8", "rgb(200, 40, 40)")
+
+
+def synthetic_users():
+    return get_user_model().objects.filter(username__endswith=f"@{SYNTHETIC_DOMAIN}")
+
+
+def generate(
+    users=50,
+    books_per_user=4,
+    max_leaves=40,
+    max_blocks=40,
+    reviews_per_book=5,
+    saves_per_user=10,
+    seed=1,
+    batch_size=1000,
+) -> dict:
+    """Create the data and return how many rows of each kind were added."""
+    rng = random.Random(seed)
+    counts = {}
+    with transaction.atomic():
+        categories = list(Category.objects.all())
+        if not categories:
+            categories = Category.objects.bulk_create(
+                [Category(name=name) for name in CATEGORY_NAMES]
+            )
+
+        User = get_user_model()
+        first = synthetic_users().count()
+        password = make_password(PASSWORD)
+        people = []
+        for number in range(first, first + users):
+            email = f"user-{number}@{SYNTHETIC_DOMAIN}"
+            people.append(
+                User(username=email, email=email, first_name=f"User {number}", password=password)
+            )
+        people = User.objects.bulk_create(people, batch_size=batch_size)
+        counts["users"] = len(people)
+
+        books = Book.objects.bulk_create(
+            [
+                Book(
+                    owner=owner,
+                    category=rng.choice(categories),
+                    title=_words(rng, 2, 6)[:50],
+                    description=_words(rng, 8, 30)[:200],
+                    is_public=rng.random() < 0.8,
+                )
+                for owner in people
+                for _ in range(books_per_user)
+            ],
+            batch_size=batch_size,
+        )
+        counts["books"] = len(books)
+        if search_index.is_available():
+            search_index.index_books(books)
+
+        counts["leaves"] = 0
+        batch = []
+        for book in books:
+            # Most books are short and a few are long.
+            book.leaf_count = int(max_leaves * rng.random() ** 2)
+            for number in range(1, book.leaf_count + 1):
+                leaf = Leaf(
+                    book=book,
+                    content_json=document(rng, rng.randint(1, max_blocks)),
+                    position=number * POSITION_GAP,
+                )
+                leaf.render_fields()
+                batch.append(leaf)
+            if len(batch) >= batch_size:
+                counts["leaves"] += _create_leaves(batch)
+                batch = []
+        counts["leaves"] += _create_leaves(batch)
+        Book.objects.bulk_update(books, ["leaf_count"], batch_size=batch_size)
+
+        public = [book for book in books if book.is_public]
+        reviews = []
+        for book in public:
+            wanted = rng.randint(0, reviews_per_book)
+            for reader in _sample_excluding(rng, people, wanted, {book.owner}):
+                reviews.append(
+                    Review(
+                        book=book,
+                        user=reader,
+                        rating=rng.choices(range(1, 6), weights=(1, 1, 2, 4, 4))[0],
+                        comment=_words(rng, 5, 40),
+                    )
+                )
+        Review.objects.bulk_create(reviews, batch_size=batch_size)
+        counts["reviews"] = len(reviews)
+        ratings = compute_ratings([book.pk for book in public])
+        for book in public:
+            for field, value in ratings[book.pk].items():
+                setattr(book, field, value)
+        Book.objects.bulk_update(public, RATING_FIELDS, batch_size=batch_size)
+
+        own_books = {}
+        for book in public:
+            own_books.setdefault(book.owner_id, set()).add(book)
+        saves = []
+        for person in people:
+            excluded = own_books.get(person.pk, set())
+            for book in _sample_excluding(rng, public, saves_per_user, excluded):
+                saves.append(SavedBook(user=person, book=book))
+        SavedBook.objects.bulk_create(saves, batch_size=batch_size, ignore_conflicts=True)
+        counts["saves"] = len(saves)
+        caching.bump_on_commit(caching.CATALOGUE)
+    return counts
+
+
+def _sample_excluding(rng, population, count, excluded) -> list:
+    """Up to ``count`` distinct items of ``population`` that are not in ``excluded``."""
+    # Oversample instead of filtering the whole population for every row.
+    picked = rng.sample(population, min(len(population), count + len(excluded)))
+    return [item for item in picked if item not in excluded][:count]
+
+
+def _create_leaves(leaves) -> int:
+    Leaf.objects.bulk_create(leaves)
+    if search_index.is_available():
+        search_index.index_leaves(leaves)
+    return len(leaves)
+
+
+def clear() -> int:
+    """Delete every synthetic user with their books, reviews and saves."""
+    with transaction.atomic():
+        deleted, _ = synthetic_users().delete()
+        caching.bump_on_commit(caching.CATALOGUE)
+    return deleted
+
+
+def _words(rng, low, high) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def _text(rng):
+    node = {"type": "text", "text": _words(rng, 4, 20)}
+    marks = []
+    if rng.random() < 0.2:
+        marks.append({"type": "bold"})
+    if rng.random() < 0.2:
+        marks.append({"type": "textStyle", "attrs": {"color": rng.choice(COLORS)}})
+    if marks:
+        node["marks"] = marks
+    return node
+
+
+def document(rng, blocks) -> dict:
+    """A TipTap document of ``blocks`` headings, lists, images and paragraphs."""
+    content = []
+    for _ in range(blocks):
+        roll = rng.random()
+        if roll < 0.1:
+            content.append(
+                {"type": "heading", "attrs": {"level": rng.randint(1, 2)}, "content": [_text(rng)]}
+            )
+        elif roll < 0.2:
+            content.append(
+                {
+                    "type": "bulletList",
+                    "content": [
+                        {"type": "listItem", "content": [{"type": "paragraph", "content": [_text(rng)]}]}
+                        for _ in range(3)
+                    ],
+                }
+            )
+        elif roll < 0.25:
+            content.append(
+                {
+                    "type": "imageResize",
+                    "attrs": {
+                        "src": "/media/books/leaf_editor/example.jpg",
+                        "width": 85,
+                        "containerStyle": "width: 320px; height: auto; cursor: pointer; margin: 0 auto;",
+                        "wrapperStyle": "display: flex",
+                    },
+                }
+            )
+        else:
+            content.append({"type": "paragraph", "content": [_text(rng) for _ in range(3)]})
+    return {"type": "doc", "content": content}
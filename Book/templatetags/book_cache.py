@@ -0,0 +1,39 @@
+from django import template
+
+from Book import caching
+
+register = template.Library()
+
+
+class BookFragmentNode(template.Node):
+    def __init__(self, nodelist, name, book):
+        self.nodelist = nodelist
+        self.name = name
+        self.book = book
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        book = self.book.resolve(context)
+        return caching.get_or_build(
+            name, caching.book_scope(book), lambda: self.nodelist.render(context)
+        )
+
+
+@register.tag
+def bookfragment(parser, token):
+    """Cache the enclosed block until the book's content version changes.
+
+        {% bookfragment "detail-header" book %} ... {% endbookfragment %}
+
+    Only put markup that is the same for every viewer inside.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(
+            f"{bits[0]} takes a fragment name and a book."
+        )
+    nodelist = parser.parse(("endbookfragment",))
+    parser.delete_first_token()
+    return BookFragmentNode(
+        nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2])
+    )
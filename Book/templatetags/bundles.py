@@ -0,0 +1,32 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+register = template.Library()
+
+# Bundle name -> (file written by frontend/build.mjs, scripts used until it is built).
+BUNDLES = {
+    "reader": ("Book/dist/reader.js", ("Book/leaf_reader.js",)),
+    "editor": ("Book/dist/editor.js", ("Book/chunked_upload.js", "Book/leaf_editor.js")),
+}
+
+
+@lru_cache(maxsize=None)
+def bundle_paths(name) -> tuple:
+    built, sources = BUNDLES[name]
+    return (built,) if finders.find(built) else sources
+
+
+@register.simple_tag
+def bundle(name):
+    """Module script tags for a frontend bundle, or for its sources.
+
+        {% bundle "reader" %}
+    """
+    paths = bundle_paths(name)
+    return format_html_join(
+        "", '<script type="module" src="{}"></script>', ((static(path),) for path in paths)
+    )
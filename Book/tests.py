@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from allauth.socialaccount.models import SocialAccount
+from PIL import Image
+
+from categories.models import Category
+from reviews.models import Review
+from search import index as search_index
+
+from . import (
+    archive,
+    benchmarks,
+    caching,
+    images,
+    ordering,
+    pagination,
+    saved,
+    synthetic,
+    tiptap,
+    uploads,
+    views,
+)
+from .models import (
+    POSITION_GAP,
+    Book,
+    EditorUpload,
+    ImageDerivative,
+    Leaf,
+    LeafImage,
+    PendingDerivative,
+    SavedBook,
+    StoredBlob,
+    UploadSession,
+    content_changes,
+)
+
+
+def leaf_doc(text):
+    return {
+        "type": "doc",
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+    }
+
+
+class BookDetailLeafSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=cls.owner, category=category, title="Notebook", is_public=True
+        )
+        for number in range(3):
+            Leaf.objects.create(book=cls.book, content_json=leaf_doc(f"Page {number}"))
+
+    def test_leaf_count_follows_creates_and_deletes(self):
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.leaf_count, 3)
+        Leaf.objects.filter(book=self.book).first().delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.leaf_count, 2)
+
+    def test_detail_does_not_fetch_leaf_content(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("Book:detail", args=[self.book.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<span class="detail-pages-count">3</span>', html=True)
+        for query in queries:
+            self.assertNotIn("content_json", query["sql"])
+
+    def test_deleting_a_book_costs_the_same_for_any_number_of_leaves(self):
+        reader = get_user_model().objects.create_user(username="reader@example.com")
+        counts = []
+        for leaves in (1, 6):
+            book = Book.objects.create(
+                owner=self.owner, category=self.book.category, title="Doomed"
+            )
+            for number in range(leaves):
+                leaf = Leaf.objects.create(book=book, content_json=leaf_doc(f"Doomed {number}"))
+                LeafImage.objects.create(leaf=leaf, image=f"books/leaves/{number}.png")
+                Review.objects.create(book=book, user=reader, rating=number % 5 + 1)
+            with CaptureQueriesContext(connection) as queries:
+                book.delete()
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        if search_index.is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT count(*) FROM {search_index.TABLE} WHERE {search_index.TABLE} MATCH %s",
+                    [search_index.match_expression("doomed")],
+                )
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_leaf_summaries_defer_content(self):
+        summary = Leaf.objects.filter(book=self.book).summaries().first()
+        self.assertTrue({"content_json", "plain_text"} <= summary.get_deferred_fields())
+        self.assertTrue(summary.preview.startswith("Page"))
+
+
+def doc(*blocks):
+    return {"type": "doc", "content": list(blocks)}
+
+
+def text(value, *marks):
+    node = {"type": "text", "text": value}
+    if marks:
+        node["marks"] = list(marks)
+    return node
+
+
+def paragraph(*content):
+    return {"type": "paragraph", "content": list(content)}
+
+
+class LeafHtmlSanitizerTests(SimpleTestCase):
+    def link(self, href):
+        return tiptap.render_html(doc(paragraph(text("go", {"type": "link", "attrs": {"href": href}}))))
+
+    def image(self, **attrs):
+        return tiptap.render_html(doc({"type": "image", "attrs": attrs}))
+
+    def test_only_http_and_relative_urls_are_kept(self):
+        for href in (
+            "javascript:alert(1)",
+            " JavaScript:alert(1)",
+            "data:text/html;base64,PHNjcmlwdD4=",
+            "vbscript:msgbox(1)",
+            'https://example.com/" onmouseover="x',
+            "//evil.example/a.png",
+            "/\\evil.example/a.png",
+        ):
+            self.assertEqual(self.link(href), "<p>go</p>", href)
+            self.assertEqual(self.image(src=href), "", href)
+        self.assertEqual(
+            self.link("https://example.com/a?b=1&c=2"),
+            '<p><a href="https://example.com/a?b=1&amp;c=2" rel="noopener noreferrer nofollow">'
+            "go</a></p>",
+        )
+        self.assertIn('<img src="/media/a.png"', self.image(src="/media/a.png"))
+
+    def test_text_and_attributes_are_escaped(self):
+        html = tiptap.render_html(doc(paragraph(text('<script>"x" & y</script>'))))
+        self.assertEqual(html, "<p>&lt;script&gt;&quot;x&quot; &amp; y&lt;/script&gt;</p>")
+        html = self.image(src="/a.png", alt='"><script>', title="<b>'")
+        self.assertIn('alt="&quot;&gt;&lt;script&gt;"', html)
+        self.assertIn('title="&lt;b&gt;&#x27;"', html)
+        self.assertNotIn("<script>", html)
+        self.assertNotIn("<b>", html)
+
+    def test_styles_keep_only_plain_declarations(self):
+        html = self.image(
+            src="/a.png",
+            containerStyle="width: 120px; background: url(https://x/y.png); "
+            "height: expression(alert(1)); position: fixed",
+            wrapperStyle='float: left;" onload="alert(1)',
+        )
+        self.assertIn('<span class="leaf-image" style="float: left">', html)
+        self.assertIn('<span class="leaf-image-frame" style="width: 120px">', html)
+        for unsafe in ("url(", "expression", "position", "onload"):
+            self.assertNotIn(unsafe, html)
+
+        for color in ("red;background:url(https://x/y.png)", "expression(alert(1))", 'red" x="'):
+            html = tiptap.render_html(
+                doc(paragraph(text("hi", {"type": "textStyle", "attrs": {"color": color}})))
+            )
+            self.assertEqual(html, "<p>hi</p>", color)
+        html = tiptap.render_html(
+            doc(paragraph(text("hi", {"type": "textStyle", "attrs": {"color": "#ff0000"}})))
+        )
+        self.assertEqual(html, '<p><span style="color: #ff0000">hi</span></p>')
+
+    def test_unknown_nodes_render_only_their_children(self):
+        html = tiptap.render_html(
+            doc(
+                {
+                    "type": "script",
+                    "attrs": {"onload": "alert(1)"},
+                    "content": [paragraph(text("kept")), "not a node", None],
+                },
+                {"type": "iframe", "attrs": {"src": "https://example.com"}},
+            )
+        )
+        self.assertEqual(html, "<p>kept</p>")
+        self.assertEqual(tiptap.render_html(["not", "a", "doc"]), "")
+
+    def test_heading_levels_must_be_integers(self):
+        for level, tag in ((3, "h3"), ("2", "h1"), (2.0, "h1"), (True, "h1"), (9, "h1"), (None, "h1")):
+            html = tiptap.render_html(
+                doc({"type": "heading", "attrs": {"level": level}, "content": [text("T")]})
+            )
+            self.assertEqual(html, f"<{tag}>T</{tag}>", level)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.books = [
+            Book.objects.create(
+                owner=cls.owner, category=category, title=f"Book {number}", is_public=True
+            )
+            for number in range(7)
+        ]
+        # Five books share one timestamp, so only the id orders them.
+        tied = timezone.now() - timedelta(days=1)
+        Book.objects.filter(pk__in=[book.pk for book in cls.books[1:6]]).update(
+            updated_at=tied
+        )
+        cls.expected = list(
+            Book.objects.order_by("-updated_at", "-id").values_list("pk", flat=True)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def card_ids(self, html):
+        return [int(value) for value in re.findall(r'data-book-id="(\d+)"', html)]
+
+    def test_cursor_round_trip(self):
+        book = Book.objects.get(pk=self.books[3].pk)
+        self.assertEqual(
+            pagination.decode_cursor(pagination.encode_cursor(book)),
+            (book.updated_at, book.pk),
+        )
+
+    def test_pages_list_every_book_once_with_ties_broken_by_id(self):
+        seen = []
+        cursor = ""
+        for _ in range(len(self.expected)):
+            books, cursor = pagination.keyset_page(Book.objects.all(), cursor, 2)
+            seen += [book.pk for book in books]
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_invalid_cursor_is_not_found(self):
+        not_a_cursor = base64.urlsafe_b64encode(b"not-a-cursor").decode()
+        for cursor in ("!!!", not_a_cursor, "x"):
+            for name in ("Book:public_list", "Book:public_list_page"):
+                response = self.client.get(reverse(name), {"cursor": cursor})
+                self.assertEqual(response.status_code, 404, (name, cursor))
+
+    def test_page_endpoints_continue_the_list(self):
+        self.client.force_login(self.owner)
+        for name in ("Book:public_list", "Book:my_list"):
+            with mock.patch.object(views.KeysetPaginationMixin, "page_size", 3):
+                response = self.client.get(reverse(name))
+                seen = self.card_ids(response.context["cards_html"])
+                url = response.context["next_page_url"]
+                while url:
+                    payload = self.client.get(url).json()
+                    seen += self.card_ids(payload["html"])
+                    url = payload["next_page_url"]
+            self.assertEqual(seen, self.expected, name)
+
+    def test_saved_shelf_is_capped_and_the_saved_list_pages(self):
+        saved_pks = {book.pk for book in self.books[:3]}
+        expected = [pk for pk in self.expected if pk in saved_pks]
+        for pk in saved_pks:
+            SavedBook.objects.create(user=self.reader, book_id=pk)
+        self.client.force_login(self.reader)
+        with mock.patch.object(views, "SAVED_SHELF_SIZE", 2):
+            response = self.client.get(reverse("Book:my_list"))
+        self.assertEqual([book.pk for book in response.context["saved_books"]], expected[:2])
+        self.assertContains(response, reverse("Book:saved_list"))
+
+        with mock.patch.object(views.KeysetPaginationMixin, "page_size", 2):
+            response = self.client.get(reverse("Book:saved_list"))
+            seen = self.card_ids(response.context["cards_html"])
+            payload = self.client.get(response.context["next_page_url"]).json()
+        seen += self.card_ids(payload["html"])
+        self.assertEqual(seen, expected)
+        self.assertEqual(payload["next_page_url"], "")
+        self.assertEqual(payload["saved_ids"], self.card_ids(payload["html"]))
+
+
+class ReaderWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.stranger = User.objects.create_user(username="stranger@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=cls.owner, category=category, title="Long", is_public=True
+        )
+        cls.leaf_ids = [
+            Leaf.objects.create(book=cls.book, content_json=leaf_doc(f"Page {number}")).pk
+            for number in range(views.READER_PAGE_LIMIT + 5)
+        ]
+        cls.private = Book.objects.create(
+            owner=cls.owner, category=category, title="Private", is_public=False
+        )
+        cls.private_leaf = Leaf.objects.create(book=cls.private, content_json=leaf_doc("Mine"))
+
+    def setUp(self):
+        cache.clear()
+
+    def reader(self, **params):
+        response = self.client.get(reverse("Book:reader", args=[self.book.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        pages = response.context["reader_pages"]
+        self.assertEqual([page["id"] for page in pages], self.leaf_ids)
+        rendered = [page["index"] for page in pages if page["html"] is not None]
+        return response.context["reader_index"], rendered
+
+    def leaves(self, **params):
+        response = self.client.get(
+            reverse("Book:reader_leaves", args=[self.book.pk]), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_a_window_around_the_current_page_is_rendered(self):
+        window = views.BookReaderView.window
+        self.assertEqual(self.reader(), (0, list(range(window + 1))))
+        self.assertEqual(self.reader(page="6"), (5, list(range(5 - window, 5 + window + 1))))
+        last = len(self.leaf_ids) - 1
+        self.assertEqual(
+            self.reader(leaf=str(self.leaf_ids[last])),
+            (last, list(range(last - window, last + 1))),
+        )
+
+    def test_leaf_and_page_parameters_are_clamped(self):
+        last = len(self.leaf_ids) - 1
+        self.assertEqual(self.reader(page="0")[0], 0)
+        self.assertEqual(self.reader(page="9999")[0], last)
+        self.assertEqual(self.reader(page="-3")[0], 0)
+        self.assertEqual(self.reader(page="two")[0], 0)
+        # A leaf of another book is ignored in favour of the page.
+        self.assertEqual(self.reader(leaf=str(self.private_leaf.pk), page="3")[0], 2)
+        self.assertEqual(self.reader(leaf=str(self.leaf_ids[4]), page="9")[0], 4)
+
+    def test_leaves_endpoint_bounds_offset_and_limit(self):
+        payload = self.leaves(offset="3", limit="2")
+        self.assertEqual(payload["offset"], 3)
+        self.assertEqual(
+            [(leaf["id"], leaf["index"]) for leaf in payload["leaves"]],
+            [(self.leaf_ids[3], 3), (self.leaf_ids[4], 4)],
+        )
+        self.assertIn("Page 3", payload["leaves"][0]["html"])
+
+        self.assertEqual(len(self.leaves(limit="1000")["leaves"]), views.READER_PAGE_LIMIT)
+        self.assertEqual(len(self.leaves(limit="0")["leaves"]), 1)
+        self.assertEqual(self.leaves(offset="-1")["offset"], 0)
+        tail = self.leaves(offset=str(len(self.leaf_ids) - 2), limit="5")["leaves"]
+        self.assertEqual([leaf["id"] for leaf in tail], self.leaf_ids[-2:])
+        self.assertEqual(self.leaves(offset=str(len(self.leaf_ids) + 10))["leaves"], [])
+
+    def test_leaves_without_stored_html_are_rendered_in_one_query(self):
+        book = Book.objects.create(
+            owner=self.owner, category=self.book.category, title="Old", is_public=True
+        )
+        for number in range(4):
+            Leaf.objects.create(book=book, content_json=leaf_doc(f"Old {number}"))
+            Leaf.objects.create(book=book)
+        Leaf.objects.filter(book=book).update(content_html="")
+        url = reverse("Book:reader_leaves", args=[book.pk])
+        # The book, the window and the content of the leaves without HTML.
+        with self.assertNumQueries(3):
+            leaves = self.client.get(url).json()["leaves"]
+        self.assertEqual(
+            [leaf["html"] for leaf in leaves[::2]],
+            [f"<p>Old {number}</p>" for number in range(4)],
+        )
+        self.assertEqual({leaf["html"] for leaf in leaves[1::2]}, {""})
+
+    def test_private_books_are_not_found_for_anyone_but_the_owner(self):
+        urls = [
+            reverse(name, args=[self.private.pk])
+            for name in ("Book:detail", "Book:reader", "Book:reader_leaves")
+        ]
+        for user in (None, self.stranger):
+            if user:
+                self.client.force_login(user)
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, 404, (user, url))
+        self.client.force_login(self.owner)
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=cls.owner, category=category, title="Notebook", is_public=True
+        )
+        Leaf.objects.create(book=cls.book, content_json=leaf_doc("First page"))
+
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+
+    def test_detail_fragments_are_reused_until_the_book_changes(self):
+        url = reverse("Book:detail", args=[self.book.pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertFalse(any("reviews_review" in query["sql"] for query in queries))
+        self.assertEqual(caching.stats()["detail-header"], {"hits": 1, "misses": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Leaf.objects.create(book=self.book, content_json=leaf_doc("Second page"))
+        response = self.client.get(url)
+        self.assertContains(response, '<span class="detail-pages-count">2</span>', html=True)
+
+    def test_fragments_follow_the_content_version_in_the_database(self):
+        url = reverse("Book:detail", args=[self.book.pk])
+        self.assertContains(self.client.get(url), "Notebook")
+        # What another worker sees: the row changed, no cache entry was touched.
+        Book.objects.filter(pk=self.book.pk).update(title="Renamed", **content_changes())
+        self.assertContains(self.client.get(url), "Renamed")
+
+        SavedBook.objects.create(user=self.reader, book=self.book)
+        self.assertEqual(caching.stats()["detail-header"], {"hits": 0, "misses": 2})
+        self.client.get(url)
+        self.assertEqual(caching.stats()["detail-header"], {"hits": 1, "misses": 2})
+
+    def test_hits_are_counted_without_writing_to_the_cache(self):
+        url = reverse("Book:detail", args=[self.book.pk])
+        self.client.get(url)
+        with mock.patch.object(cache, "add") as add, mock.patch.object(
+            cache, "incr"
+        ) as incr, mock.patch.object(cache, "set") as set_:
+            self.client.get(url)
+        for write in (add, incr, set_):
+            write.assert_not_called()
+        self.assertEqual(caching.stats()["detail-stats"], {"hits": 1, "misses": 1})
+
+    def test_saved_flag_is_not_shared_between_viewers(self):
+        SavedBook.objects.create(user=self.reader, book=self.book)
+        url = reverse("Book:detail", args=[self.book.pk])
+        self.client.force_login(self.reader)
+        self.assertContains(self.client.get(url), 'aria-pressed="true"')
+        self.client.force_login(self.owner)
+        response = self.client.get(url)
+        self.assertContains(response, 'aria-pressed="false"')
+        self.assertContains(response, "data-delete-book-form")
+
+    def test_public_cards_follow_the_catalogue_generation(self):
+        url = reverse("Book:public_list")
+        self.assertContains(self.client.get(url), "Notebook")
+        Book.objects.filter(pk=self.book.pk).update(title="Renamed")
+        self.assertContains(self.client.get(url), "Notebook")
+
+        self.book.title = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertContains(self.client.get(url), "Renamed")
+
+    def test_reader_window_is_invalidated_by_leaf_edits(self):
+        url = reverse("Book:reader_leaves", args=[self.book.pk])
+        self.assertIn("First page", self.client.get(url).json()["leaves"][0]["html"])
+        leaf = Leaf.objects.get(book=self.book)
+        leaf.content_json = leaf_doc("Edited page")
+        with self.captureOnCommitCallbacks(execute=True):
+            leaf.save()
+        self.assertIn("Edited page", self.client.get(url).json()["leaves"][0]["html"])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=cls.owner, category=category, title="Notebook", is_public=True
+        )
+        cls.leaf = Leaf.objects.create(book=cls.book, content_json=leaf_doc("First page"))
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("Book:detail", args=[self.book.pk])
+
+    def revalidate(self, etag, url=None):
+        return self.client.get(url or self.url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_modified_without_rendering(self):
+        for url in (self.url, reverse("Book:reader", args=[self.book.pk])):
+            response = self.client.get(url)
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+            self.assertIn("Last-Modified", response)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.revalidate(response["ETag"], url)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(queries), 1)
+
+    def test_leaf_edits_and_reviews_change_the_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.leaf.content_json = leaf_doc("Edited page")
+        self.leaf.save()
+        self.assertEqual(self.revalidate(etag).status_code, 200)
+
+        etag = self.client.get(self.url)["ETag"]
+        Review.objects.create(book=self.book, user=self.reader, rating=4, comment="Good")
+        self.assertEqual(self.revalidate(etag).status_code, 200)
+
+    def test_page_carries_the_etag_of_the_version_it_was_rendered_from(self):
+        aget_version = views.BookDetailView.aget_version
+
+        async def edited_meanwhile(view, pk):
+            version = await aget_version(view, pk)
+            await Book.objects.filter(pk=pk).aupdate(**content_changes())
+            return version
+
+        with mock.patch.object(views.BookDetailView, "aget_version", edited_meanwhile):
+            etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+
+    def test_owner_and_reviewer_changes_change_the_page(self):
+        Review.objects.create(book=self.book, user=self.reader, rating=4, comment="Good")
+        response = self.client.get(self.url)
+        self.reader.first_name = "Rita"
+        self.reader.save()
+        response = self.revalidate(response["ETag"])
+        self.assertContains(response, "Rita")
+
+        self.owner.last_name = "Owens"
+        self.owner.save(update_fields=["last_name"])
+        response = self.revalidate(response["ETag"])
+        self.assertContains(response, "Owens")
+
+        SocialAccount.objects.create(
+            user=self.reader, provider="google", uid="1",
+            extra_data={"picture": "https://example.com/rita.png"},
+        )
+        response = self.revalidate(response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+        update_last_login(None, self.reader)
+        self.assertEqual(self.revalidate(response["ETag"]).status_code, 304)
+
+    def test_viewer_profile_and_category_menu_change_the_etag(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(self.url)
+        self.reader.first_name = "Rita"
+        self.reader.save(update_fields=["first_name"])
+        response = self.revalidate(response["ETag"])
+        self.assertContains(response, '<span class="profile-name">Rita</span>', html=True)
+
+        account = SocialAccount.objects.create(user=self.reader, provider="google", uid="1")
+        response = self.revalidate(response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        account.extra_data = {"picture": "https://example.com/rita.png"}
+        account.save()
+        response = self.revalidate(response["ETag"])
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Aardvarks")
+        response = self.revalidate(response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.revalidate(response["ETag"]).status_code, 304)
+
+    def test_etag_differs_per_viewer_and_saved_state(self):
+        self.client.force_login(self.reader)
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.revalidate(etag).status_code, 304)
+        SavedBook.objects.create(user=self.reader, book=self.book)
+        response = self.revalidate(etag)
+        self.assertContains(response, 'aria-pressed="true"')
+
+        self.client.force_login(self.owner)
+        response = self.revalidate(response["ETag"])
+        self.assertContains(response, "data-delete-book-form")
+        self.assertIn("Cookie", response["Vary"])
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=cls.owner, category=category, title="Notebook", is_public=True
+        )
+        Leaf.objects.create(book=cls.book, content_json=leaf_doc("First page"))
+        SavedBook.objects.create(user=cls.reader, book=cls.book)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_catalogue_marks_the_viewers_saved_books(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get(reverse("Book:public_list_page"))
+        self.assertIn("Notebook", response.json()["html"])
+        self.assertEqual(response.json()["saved_ids"], [self.book.pk])
+
+    async def test_detail_and_reader_render_and_revalidate(self):
+        await self.async_client.aforce_login(self.reader)
+        for name in ("Book:detail", "Book:reader"):
+            url = reverse(name, args=[self.book.pk])
+            response = await self.async_client.get(url)
+            self.assertContains(response, "Notebook")
+            response = await self.async_client.get(
+                url, headers={"If-None-Match": response["ETag"]}
+            )
+            self.assertEqual(response.status_code, 304)
+
+    async def test_review_post_runs_through_the_async_handler(self):
+        await self.async_client.aforce_login(self.reader)
+        url = reverse("Book:detail", args=[self.book.pk])
+        response = await self.async_client.post(url, {"rating": "5", "comment": "Lovely"})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(await Review.objects.filter(book=self.book, rating=5).aexists())
+
+
+class LeafOrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(owner=cls.owner, category=category, title="Notebook")
+        cls.leaves = [
+            Leaf.objects.create(book=cls.book, content_json=leaf_doc(f"Page {number}"))
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def order(self):
+        return list(Leaf.objects.filter(book=self.book).values_list("pk", flat=True))
+
+    def reorder(self, leaf_ids, after):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("Book:reorder_leaves", args=[self.book.pk]),
+                {"leaf_ids": leaf_ids, "after": after},
+                content_type="application/json",
+            )
+
+    def test_new_leaves_are_appended_with_gaps(self):
+        positions = [leaf.position for leaf in self.leaves]
+        self.assertEqual(positions, [POSITION_GAP * n for n in range(1, 6)])
+
+    def test_move_rewrites_only_the_moved_leaves(self):
+        a, b, c, d, e = [leaf.pk for leaf in self.leaves]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reorder([e, d], b)
+        self.assertEqual(response.json(), {"leaf_ids": [a, b, e, d, c], "renumbered": False})
+        updates = [
+            query["sql"] for query in queries if query["sql"].startswith('UPDATE "Book_leaf"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.reorder([c], None).json()["leaf_ids"], [c, a, b, e, d])
+
+    def test_exhausted_gap_renumbers_the_book(self):
+        a, b, c, d, e = [leaf.pk for leaf in self.leaves]
+        Leaf.objects.filter(pk=b).update(position=POSITION_GAP + 1)
+        self.assertTrue(ordering.move_leaves(self.book, [d, e], a))
+        self.assertEqual(self.order(), [a, d, e, b, c])
+        positions = Leaf.objects.filter(book=self.book).values_list("position", flat=True)
+        self.assertEqual(list(positions), [POSITION_GAP * n for n in range(1, 6)])
+
+    def test_rejects_leaves_from_other_books_and_strangers(self):
+        other = Book.objects.create(
+            owner=self.owner, category=self.book.category, title="Other"
+        )
+        stray = Leaf.objects.create(book=other, content_json=leaf_doc("Stray"))
+        self.assertEqual(self.reorder([stray.pk], None).status_code, 400)
+        self.assertEqual(self.reorder([self.leaves[0].pk], self.leaves[0].pk).status_code, 400)
+        self.client.force_login(get_user_model().objects.create_user(username="x@example.com"))
+        self.assertEqual(self.reorder([self.leaves[0].pk], None).status_code, 404)
+
+
+class UrlBenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        synthetic.generate(
+            users=4, books_per_user=3, max_leaves=8, max_blocks=3, reviews_per_book=2,
+            saves_per_user=2,
+        )
+
+    def test_every_url_has_a_case(self):
+        self.assertEqual(benchmarks.uncovered(), [])
+
+    def test_every_url_stays_within_its_query_budget(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            results = benchmarks.run(repeat=2)
+        failed = [result for result in results if not result["ok"]]
+        self.maxDiff = None
+        self.assertEqual(failed, [])
+        self.assertEqual([name for _, _, names in os.walk(media_root) for name in names], [])
+
+
+class BookArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.importer = User.objects.create_user(username="importer@example.com")
+        cls.category, _ = Category.objects.get_or_create(name="General")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def png(self, name):
+        data = io.BytesIO()
+        Image.new("RGB", (4, 4), "red").save(data, "PNG")
+        return SimpleUploadedFile(name, data.getvalue(), content_type="image/png")
+
+    def test_export_streams_an_archive_that_imports_in_reading_order(self):
+        book = Book.objects.create(
+            owner=self.owner, category=self.category, title="Travels", description="Notes"
+        )
+        leaves = [
+            Leaf.objects.create(book=book, content_json=leaf_doc(f"Page {number}"))
+            for number in range(3)
+        ]
+        LeafImage.objects.create(leaf=leaves[1], image=self.png("map.png"))
+
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("Book:export", args=[book.pk]))
+        self.assertEqual(response["Content-Type"], "application/zip")
+        data = b"".join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(data)) as exported:
+            self.assertIn("leaves/000003.json", exported.namelist())
+
+        self.client.force_login(self.importer)
+        response = self.client.post(
+            reverse("Book:import"),
+            {"archive": SimpleUploadedFile("book.zip", data, content_type="application/zip")},
+        )
+        self.assertRedirects(response, reverse("Book:my_list"))
+        imported = Book.objects.get(owner=self.importer)
+        self.assertEqual((imported.title, imported.leaf_count), ("Travels", 3))
+        copies = list(Leaf.objects.filter(book=imported))
+        self.assertEqual([leaf.plain_text for leaf in copies], ["Page 0", "Page 1", "Page 2"])
+        self.assertEqual(copies[1].images.count(), 1)
+
+    def test_export_is_only_for_the_owner(self):
+        book = Book.objects.create(
+            owner=self.owner, category=self.category, title="Public", is_public=True
+        )
+        self.client.force_login(self.importer)
+        response = self.client.get(reverse("Book:export", args=[book.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def book_archive(self, images):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as book:
+            book.writestr(
+                archive.MANIFEST_NAME,
+                '{"format": "notebook-book", "version": 1, "book": {"title": "Maps"}}',
+            )
+            book.writestr(
+                "leaves/000001.json",
+                json.dumps({"text": "", "content_json": leaf_doc(""), "images": list(images)}),
+            )
+            for name, content in images.items():
+                book.writestr(name, content)
+        data.seek(0)
+        return data
+
+    def test_images_are_stored_under_their_verified_format(self):
+        png = self.png("map.png").read()
+        book = archive.import_book(
+            self.book_archive({"images/000001/map.jpg": png}),
+            owner=self.importer,
+            category=self.category,
+        )
+        image = LeafImage.objects.get(leaf__book=book)
+        self.assertTrue(image.image.name.endswith(".png"), image.image.name)
+
+        for name in ("images/000001/map.html", "images/000001/map.svg"):
+            with self.assertRaisesMessage(archive.ArchiveError, "not a supported image type"):
+                archive.import_book(
+                    self.book_archive({name: png}), owner=self.importer, category=self.category
+                )
+        self.assertEqual(Book.objects.filter(owner=self.importer).count(), 1)
+
+    def test_invalid_archives_create_nothing(self):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as bad:
+            bad.writestr(
+                archive.MANIFEST_NAME,
+                '{"format": "notebook-book", "version": 1, "book": {"title": "Bad"}}',
+            )
+            bad.writestr("leaves/000001.json", '{"text": "", "content_json": {}}')
+            bad.writestr("images/000001/fake.png", b"not an image")
+        for content in (b"not a zip", data.getvalue()):
+            with self.assertRaises(archive.ArchiveError):
+                archive.import_book(io.BytesIO(content), owner=self.importer)
+        self.assertFalse(Book.objects.filter(owner=self.importer).exists())
+
+
+class EditorUploadSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(owner=cls.owner, category=category, title="Notebook")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.owner)
+
+    def upload(self, color="red"):
+        data = io.BytesIO()
+        Image.new("RGB", (4, 4), color).save(data, "PNG")
+        response = self.client.post(
+            reverse("Book:leaf_image_upload"),
+            {"image": SimpleUploadedFile("paste.png", data.getvalue(), content_type="image/png")},
+        )
+        return response.json()["url"]
+
+    def test_sweeps_only_old_unreferenced_uploads(self):
+        kept_url, orphan_url, fresh_url = (
+            self.upload("red"), self.upload("green"), self.upload("blue")
+        )
+        Leaf.objects.create(
+            book=self.book,
+            content_json={
+                "type": "doc",
+                "content": [{"type": "imageResize", "attrs": {"src": f"http://testserver{kept_url}"}}],
+            },
+        )
+        week_ago = timezone.now() - timedelta(days=8)
+        EditorUpload.objects.exclude(file__endswith=fresh_url.rsplit("/", 1)[1]).update(
+            created_at=week_ago
+        )
+        legacy = default_storage.save("books/leaf_editor/legacy.png", io.BytesIO(b"old"))
+        os.utime(default_storage.path(legacy), (week_ago.timestamp(), week_ago.timestamp()))
+        orphan = EditorUpload.objects.get(file__endswith=orphan_url.rsplit("/", 1)[1])
+
+        out = io.StringIO()
+        call_command("sweep_editor_uploads", "--dry-run", stdout=out)
+        self.assertIn("2 unreferenced uploads", out.getvalue())
+        self.assertTrue(default_storage.exists(orphan.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("sweep_editor_uploads", stdout=out)
+        self.assertFalse(default_storage.exists(orphan.file.name))
+        self.assertFalse(default_storage.exists(legacy))
+        self.assertEqual(EditorUpload.objects.count(), 2)
+        for name in EditorUpload.objects.values_list("file", flat=True):
+            self.assertTrue(default_storage.exists(name))
+
+    def test_uploads_pasted_again_after_listing_are_kept(self):
+        orphan_url = self.upload("green")
+        week_ago = timezone.now() - timedelta(days=8)
+        EditorUpload.objects.update(created_at=week_ago)
+        cutoff = timezone.now() - timedelta(days=7)
+        orphans = uploads.find_orphans(cutoff)
+        self.assertEqual(len(orphans), 1)
+
+        # The same bytes again get the same blob and restart its clock.
+        self.assertEqual(self.upload("green"), orphan_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(uploads.delete_uploads(list(orphans), cutoff), (0, 0))
+        name = EditorUpload.objects.get().file.name
+        self.assertTrue(default_storage.exists(name))
+
+
+class ImageDerivativeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        cls.category, _ = Category.objects.get_or_create(name="General")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_image(self, size, mode="RGB"):
+        data = io.BytesIO()
+        Image.new(mode, size, "red").save(data, "PNG")
+        return default_storage.save("books/covers/photo.png", ContentFile(data.getvalue()))
+
+    def derivatives(self, name):
+        return list(
+            ImageDerivative.objects.filter(source_name=name).values_list(
+                "format", "width", "height"
+            )
+        )
+
+    def test_large_images_get_every_width_in_both_formats(self):
+        name = self.stored_image((2000, 1000), mode="RGBA")
+        self.assertEqual(images.generate_derivatives(name), 8)
+        self.assertEqual(
+            self.derivatives(name),
+            [
+                (fmt, width, width // 2)
+                for fmt in (ImageDerivative.FORMAT_JPEG, ImageDerivative.FORMAT_WEBP)
+                for width in images.DERIVATIVE_WIDTHS
+            ],
+        )
+        for derivative in ImageDerivative.objects.filter(source_name=name):
+            with Image.open(derivative.file.path) as image:
+                self.assertEqual(image.format, "JPEG" if derivative.format == "jpeg" else "WEBP")
+                self.assertEqual(image.size, (derivative.width, derivative.height))
+        self.assertEqual(images.generate_derivatives(name), 0)
+
+    def test_small_images_keep_their_own_width(self):
+        self.assertEqual(images.derivative_widths(100), [100])
+        self.assertEqual(images.derivative_widths(700), [160, 320, 640, 700])
+        self.assertEqual(images.derivative_widths(1280), [160, 320, 640])
+        name = self.stored_image((100, 40))
+        images.generate_derivatives(name)
+        self.assertEqual(
+            self.derivatives(name),
+            [(ImageDerivative.FORMAT_JPEG, 100, 40), (ImageDerivative.FORMAT_WEBP, 100, 40)],
+        )
+
+    def test_srcsets_are_attached_to_objects_and_leaf_html(self):
+        name = self.stored_image((400, 200))
+        images.generate_derivatives(name)
+        with_cover = Book(owner=self.owner, category=self.category, cover_image=name)
+        without = Book(owner=self.owner, category=self.category)
+        images.attach_srcsets([with_cover, without], "cover_image")
+        webp = with_cover.cover_image_srcset[ImageDerivative.FORMAT_WEBP]
+        self.assertRegex(webp, r"^\S+\.webp 160w, \S+\.webp 320w, \S+\.webp 400w$")
+        self.assertEqual(without.cover_image_srcset, {})
+
+        ours = f'<img src="{default_storage.url(name)}" alt="a">'
+        foreign = '<img src="https://example.com/x.png" alt="b">'
+        html, untouched = images.add_srcsets_to_html([f"<p>{ours}</p>", foreign], "100vw")
+        self.assertTrue(html.startswith('<p><picture><source type="image/webp" srcset="'))
+        self.assertIn('sizes="100vw"><img srcset="', html)
+        self.assertTrue(html.endswith('alt="a"></picture></p>'))
+        self.assertEqual(untouched, foreign)
+
+
+class PendingDerivativeTests(TransactionTestCase):
+    """The command's worker threads write, so nothing may hold the write lock."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_image(self, size):
+        data = io.BytesIO()
+        Image.new("RGB", size, "red").save(data, "PNG")
+        return default_storage.save("books/covers/photo.png", ContentFile(data.getvalue()))
+
+    def test_jobs_lost_with_the_worker_are_finished_by_the_command(self):
+        name = self.stored_image((300, 300))
+        # A pool that dies before running the job, as on a restart.
+        with mock.patch.object(images, "_get_executor"):
+            images.schedule_derivatives(name)
+        self.assertTrue(PendingDerivative.objects.filter(source_name=name).exists())
+
+        call_command("generate_image_derivatives", "--pending", stdout=io.StringIO())
+        self.assertFalse(ImageDerivative.objects.exists())
+        out = io.StringIO()
+        call_command(
+            "generate_image_derivatives", "--pending", "--older-than-minutes", "0", stdout=out
+        )
+        self.assertIn("Created 4 derivatives for 1 images.", out.getvalue())
+        self.assertFalse(PendingDerivative.objects.exists())
+
+        other = self.stored_image((50, 50))
+        with override_settings(IMAGE_DERIVATIVES_ASYNC=False):
+            images.schedule_derivatives(other)
+        self.assertEqual(ImageDerivative.objects.filter(source_name=other).count(), 2)
+        self.assertFalse(PendingDerivative.objects.exists())
+
+
+class DedupStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        cls.category, _ = Category.objects.get_or_create(name="General")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_DERIVATIVES_ASYNC=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def png(self, color="red"):
+        data = io.BytesIO()
+        Image.new("RGB", (4, 4), color).save(data, "PNG")
+        return data.getvalue()
+
+    def test_duplicates_share_one_counted_blob(self):
+        first = Book(owner=self.owner, category=self.category, title="One")
+        first.cover_image.save("cover.png", SimpleUploadedFile("cover.png", self.png()))
+        second = Book(owner=self.owner, category=self.category, title="Two")
+        second.cover_image.save("other.PNG", SimpleUploadedFile("other.PNG", self.png()))
+
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertRegex(first.cover_image.name, r"^books/covers/[0-9a-f]{64}\.png$")
+        self.assertEqual(StoredBlob.objects.get(name=first.cover_image.name).ref_count, 2)
+        self.assertEqual(os.listdir(default_storage.path("books/covers")), [
+            os.path.basename(first.cover_image.name)
+        ])
+
+        # Files go when the transaction that dropped the last reference commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            default_storage.delete(first.cover_image.name)
+        self.assertTrue(default_storage.exists(second.cover_image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            default_storage.delete(second.cover_image.name)
+        self.assertFalse(default_storage.exists(second.cover_image.name))
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_repeated_editor_upload_returns_the_same_url(self):
+        self.client.force_login(self.owner)
+        urls = [
+            self.client.post(
+                reverse("Book:leaf_image_upload"),
+                {"image": SimpleUploadedFile("paste.png", self.png(), content_type="image/png")},
+            ).json()["url"]
+            for _ in range(2)
+        ]
+        self.assertEqual(urls[0], urls[1])
+        self.assertEqual(EditorUpload.objects.count(), 1)
+
+    def test_dedupe_media_converts_legacy_files(self):
+        legacy = FileSystemStorage()
+        covers = [legacy.save(f"books/covers/{name}.png", io.BytesIO(self.png())) for name in "ab"]
+        books = [
+            Book.objects.create(owner=self.owner, category=self.category, title=name, cover_image=cover)
+            for name, cover in zip("ab", covers)
+        ]
+        for cover in covers:
+            ImageDerivative.objects.create(
+                source_name=cover,
+                width=4,
+                height=4,
+                format=ImageDerivative.FORMAT_WEBP,
+                file=legacy.save("books/derivatives/c.webp", io.BytesIO(b"webp")),
+            )
+        pasted = [legacy.save(f"books/leaf_editor/{name}.png", io.BytesIO(self.png("blue"))) for name in "xy"]
+        leaf = Leaf.objects.create(
+            book=books[0],
+            content_json={
+                "type": "doc",
+                "content": [
+                    {"type": "image", "attrs": {"src": f"http://testserver{legacy.url(pasted[1])}"}}
+                ],
+            },
+        )
+
+        out = io.StringIO()
+        call_command("dedupe_media", "--dry-run", stdout=out)
+        self.assertIn("6 files, 3 unique", out.getvalue())
+        self.assertTrue(all(legacy.exists(name) for name in covers + pasted))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("dedupe_media", stdout=out)
+        for book in books:
+            book.refresh_from_db()
+        self.assertEqual(books[0].cover_image.name, books[1].cover_image.name)
+        self.assertEqual(StoredBlob.objects.get(name=books[0].cover_image.name).ref_count, 2)
+        self.assertFalse(any(legacy.exists(name) for name in covers + pasted))
+        derivative = ImageDerivative.objects.get()
+        self.assertEqual(derivative.source_name, books[0].cover_image.name)
+        self.assertTrue(default_storage.exists(derivative.file.name))
+        leaf.refresh_from_db()
+        src = leaf.content_json["content"][0]["attrs"]["src"]
+        self.assertTrue(src.startswith("http://testserver/media/books/leaf_editor/"))
+        self.assertTrue(default_storage.exists(src.split("/media/", 1)[1]))
+        self.assertIn(src, leaf.content_html)
+
+
+class ChunkedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        cls.category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(owner=cls.owner, category=cls.category, title="Notebook")
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(media_root, "partial"),
+            CHUNKED_UPLOAD_CHUNK_SIZE=64,
+            IMAGE_DERIVATIVES_ASYNC=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.owner)
+        data = io.BytesIO()
+        Image.new("RGB", (8, 8), "orange").save(data, "PNG")
+        self.png = data.getvalue()
+
+    def start(self, purpose):
+        response = self.client.post(
+            reverse("Book:create_upload"),
+            {"purpose": purpose, "filename": "photo.png", "content_type": "image/png", "size": len(self.png)},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, session, start, data):
+        return self.client.put(
+            session["url"],
+            data,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(start)},
+        )
+
+    def send(self, session):
+        for start in range(0, len(self.png), session["chunk_size"]):
+            response = self.put(session, start, self.png[start:start + session["chunk_size"]])
+            self.assertEqual(response.status_code, 200)
+        return self.client.post(session["finalize_url"])
+
+    def test_editor_upload_resumes_from_the_server_offset(self):
+        session = self.start("editor")
+        self.assertEqual(self.put(session, 0, self.png[:64]).json()["offset"], 64)
+        # A retried chunk at a stale offset is refused with the offset to use.
+        response = self.put(session, 0, self.png[:64])
+        self.assertEqual((response.status_code, response.json()["offset"]), (409, 64))
+        self.assertEqual(self.client.get(session["url"]).json()["offset"], 64)
+        for start in range(64, len(self.png), 64):
+            self.assertEqual(self.put(session, start, self.png[start:start + 64]).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(session["finalize_url"])
+        url = response.json()["url"]
+        upload = EditorUpload.objects.get()
+        self.assertEqual(url, default_storage.url(upload.file.name))
+        with default_storage.open(upload.file.name) as stored:
+            self.assertEqual(stored.read(), self.png)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+
+    def test_rejects_other_types_and_oversized_chunks(self):
+        session = self.start("editor")
+        self.assertEqual(self.put(session, 0, b"GIF89a" + b"\0" * 20).status_code, 415)
+        self.assertEqual(self.put(session, 0, self.png[:65]).status_code, 413)
+        response = self.client.post(
+            reverse("Book:create_upload"),
+            {"purpose": "editor", "filename": "a.svg", "content_type": "image/svg+xml", "size": 10},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.client.post(session["finalize_url"]).status_code, 409)
+
+    def test_leaf_and_cover_forms_take_finalized_uploads(self):
+        leaf_session = self.start("leaf_image")
+        self.assertEqual(self.send(leaf_session).status_code, 200)
+        cover_session = self.start("cover")
+        self.assertEqual(self.send(cover_session).status_code, 200)
+
+        self.client.post(
+            reverse("Book:add_leaf", args=[self.book.pk]),
+            {"content_json": json.dumps(leaf_doc("Photo")), "upload_ids": [leaf_session["id"]]},
+        )
+        leaf_image = LeafImage.objects.get(leaf__book=self.book)
+        self.assertTrue(default_storage.exists(leaf_image.image.name))
+
+        self.client.post(
+            reverse("Book:edit", args=[self.book.pk]),
+            {
+                "title": "Notebook",
+                "category": self.category.pk,
+                "description": "With a cover",
+                "cover_upload": cover_session["id"],
+            },
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_image.name, leaf_image.image.name.replace("leaves", "covers"))
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_clear_upload_sessions_removes_stale_ones(self):
+        stale, fresh = self.start("editor"), self.start("editor")
+        self.put(stale, 0, self.png[:64])
+        UploadSession.objects.filter(pk=stale["id"]).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+        out = io.StringIO()
+        call_command("clear_upload_sessions", stdout=out)
+        self.assertIn("Deleted 1 stale uploads", out.getvalue())
+        self.assertEqual(
+            list(UploadSession.objects.values_list("pk", flat=True)), [uuid.UUID(fresh["id"])]
+        )
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+
+
+class SavedBooksTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.books = [
+            Book.objects.create(
+                owner=cls.owner, category=category, title=f"Book {number}", is_public=True
+            )
+            for number in range(3)
+        ]
+        cls.private = Book.objects.create(
+            owner=cls.owner, category=category, title="Private", is_public=False
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def post_saved(self, book_ids, state):
+        return self.client.post(
+            reverse("Book:saved_books"),
+            {"book_ids": book_ids, "saved": state},
+            content_type="application/json",
+        )
+
+    def test_bulk_save_is_idempotent_and_skips_hidden_books(self):
+        ids = [book.pk for book in self.books] + [self.private.pk]
+        for _ in range(2):
+            response = self.post_saved(ids, True)
+            self.assertEqual(response.json()["book_ids"], sorted(ids[:3]))
+        self.assertEqual(SavedBook.objects.filter(user=self.reader).count(), 3)
+
+        self.post_saved(ids[:2], False)
+        self.assertEqual(saved.saved_ids(self.reader, ids), {ids[2]})
+
+    def test_rejects_malformed_requests(self):
+        self.assertEqual(self.post_saved([], True).status_code, 400)
+        self.assertEqual(self.post_saved(["x"], True).status_code, 400)
+        self.assertEqual(self.post_saved([self.books[0].pk], None).status_code, 400)
+
+    def test_list_marks_saved_cards_outside_the_shared_html(self):
+        SavedBook.objects.create(user=self.reader, book=self.books[1])
+        response = self.client.get(reverse("Book:public_list"))
+        self.assertEqual(response.context["saved_book_ids"], [self.books[1].pk])
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("Book:public_list"))
+        self.assertEqual(response.context["saved_book_ids"], [])
+
+    def test_detail_form_sets_an_explicit_state(self):
+        url = reverse("Book:toggle_saved", args=[self.books[0].pk])
+        for _ in range(2):
+            self.client.post(url, {"saved": "1"})
+        self.assertTrue(SavedBook.objects.filter(user=self.reader).exists())
+        self.client.post(url)
+        self.assertFalse(SavedBook.objects.filter(user=self.reader).exists())
+
+
+class SavedBooksConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.reader = User.objects.create_user(username="reader@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        self.book = Book.objects.create(
+            owner=self.reader, category=category, title="Book", is_public=True
+        )
+
+    def run_concurrently(self, target, count=8):
+        barrier = threading.Barrier(count)
+        errors = []
+
+        def worker(number):
+            try:
+                barrier.wait()
+                target(number)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_simultaneous_saves_leave_one_row(self):
+        self.run_concurrently(lambda _: saved.set_saved(self.reader, [self.book.pk], True))
+        self.assertEqual(SavedBook.objects.filter(user=self.reader).count(), 1)
+
+    def test_simultaneous_save_and_unsave_end_in_a_consistent_state(self):
+        self.run_concurrently(
+            lambda number: saved.set_saved(self.reader, [self.book.pk], number % 2 == 0)
+        )
+        self.assertLessEqual(SavedBook.objects.filter(user=self.reader).count(), 1)
+        saved.set_saved(self.reader, [self.book.pk], True)
+        self.assertEqual(SavedBook.objects.filter(user=self.reader).count(), 1)
@@ -0,0 +1,206 @@
+"""Helpers for the TipTap documents stored in ``Leaf.content_json``."""
+import re
+
+from django.utils.html import escape
+
+BLOCK_TYPES = {
+    "paragraph",
+    "heading",
+    "blockquote",
+    "codeBlock",
+    "listItem",
+    "bulletList",
+    "orderedList",
+}
+
+
+def plain_text(doc) -> str:
+    """Return the text of a TipTap document, one line per block."""
+    if not isinstance(doc, dict):
+        return ""
+    lines = []
+    current = []
+
+    def walk(node):
+        if not isinstance(node, dict):
+            return
+        node_type = node.get("type")
+        if node_type == "text":
+            current.append(str(node.get("text", "")))
+            return
+        if node_type == "hardBreak":
+            current.append("\n")
+            return
+        for child in node.get("content") or ():
+            walk(child)
+        if node_type in BLOCK_TYPES and current:
+            lines.append("".join(current).strip())
+            current.clear()
+
+    walk(doc)
+    if current:
+        lines.append("".join(current).strip())
+    return "\n".join(line for line in lines if line)
+
+
+HEADING_LEVELS = range(1, 7)
+IMAGE_TYPES = {"image", "imageResize"}
+# Site-relative paths, but not "//host" or "/\host", which browsers treat
+# as protocol-relative URLs to another site.
+SAFE_URL_RE = re.compile(r"^(https?://|/(?![/\\]))[^\s\"'<>]*$", re.IGNORECASE)
+COLOR_RE = re.compile(
+    r"^(#[0-9a-f]{3,8}|rgba?\(\s*[\d.\s,%]+\)|hsla?\(\s*[\d.\s,%deg]+\)|[a-z]{3,20})$",
+    re.IGNORECASE,
+)
+STYLE_VALUE_RE = re.compile(r"^[\w\s.%#,-]+$")
+# Declarations the image resize extension writes into containerStyle and
+# wrapperStyle; anything else is dropped.
+IMAGE_STYLE_PROPERTIES = {
+    "width",
+    "height",
+    "display",
+    "float",
+    "margin",
+    "padding-left",
+    "padding-right",
+}
+SIMPLE_MARKS = {
+    "bold": "strong",
+    "italic": "em",
+    "strike": "s",
+    "code": "code",
+    "underline": "u",
+}
+
+
+def render_html(doc) -> str:
+    """Render a TipTap document to sanitized HTML.
+
+    Covers the node and mark types produced by the leaf editor (StarterKit,
+    TextStyle/Color and the image resize extension). Unknown nodes render
+    their children; every text and attribute value is escaped.
+    """
+    if not isinstance(doc, dict):
+        return ""
+    parts = []
+    _render_node(doc, parts)
+    return "".join(parts)
+
+
+def _render_children(node, parts) -> None:
+    for child in node.get("content") or ():
+        if isinstance(child, dict):
+            _render_node(child, parts)
+
+
+def _render_node(node, parts) -> None:
+    node_type = node.get("type")
+    attrs = node.get("attrs") or {}
+    if node_type == "text":
+        parts.append(_render_text(node))
+    elif node_type == "paragraph":
+        _wrap("p", node, parts, _text_align(attrs))
+    elif node_type == "heading":
+        level = attrs.get("level")
+        # type() rather than isinstance(): True and 2.0 compare equal to ints.
+        level = level if type(level) is int and level in HEADING_LEVELS else 1
+        _wrap(f"h{level}", node, parts, _text_align(attrs))
+    elif node_type == "bulletList":
+        _wrap("ul", node, parts)
+    elif node_type == "orderedList":
+        start = attrs.get("start")
+        extra = f' start="{start}"' if type(start) is int and start != 1 else ""
+        _wrap("ol", node, parts, extra)
+    elif node_type == "listItem":
+        _wrap("li", node, parts)
+    elif node_type == "blockquote":
+        _wrap("blockquote", node, parts)
+    elif node_type == "codeBlock":
+        parts.append("<pre><code>")
+        _render_children(node, parts)
+        parts.append("</code></pre>")
+    elif node_type == "hardBreak":
+        parts.append("<br>")
+    elif node_type == "horizontalRule":
+        parts.append("<hr>")
+    elif node_type in IMAGE_TYPES:
+        parts.append(_render_image(attrs))
+    else:
+        _render_children(node, parts)
+
+
+def _wrap(tag, node, parts, extra="") -> None:
+    parts.append(f"<{tag}{extra}>")
+    _render_children(node, parts)
+    parts.append(f"</{tag}>")
+
+
+def _text_align(attrs) -> str:
+    align = attrs.get("textAlign")
+    if align in {"center", "right", "justify"}:
+        return f' style="text-align: {align}"'
+    return ""
+
+
+def _render_text(node) -> str:
+    html = escape(str(node.get("text", "")))
+    for mark in reversed(node.get("marks") or ()):
+        if not isinstance(mark, dict):
+            continue
+        mark_type = mark.get("type")
+        attrs = mark.get("attrs") or {}
+        if mark_type in SIMPLE_MARKS:
+            tag = SIMPLE_MARKS[mark_type]
+            html = f"<{tag}>{html}</{tag}>"
+        elif mark_type == "textStyle":
+            color = str(attrs.get("color") or "").strip()
+            if color and COLOR_RE.match(color):
+                html = f'<span style="color: {escape(color)}">{html}</span>'
+        elif mark_type == "link":
+            href = str(attrs.get("href") or "")
+            if SAFE_URL_RE.match(href):
+                html = (
+                    f'<a href="{escape(href)}" rel="noopener noreferrer nofollow">'
+                    f"{html}</a>"
+                )
+    return html
+
+
+def _render_image(attrs) -> str:
+    src = str(attrs.get("src") or "")
+    if not SAFE_URL_RE.match(src):
+        return ""
+    img = [f'<img src="{escape(src)}"']
+    for name in ("alt", "title"):
+        if attrs.get(name):
+            img.append(f' {name}="{escape(str(attrs[name]))}"')
+    container_style = _image_style(attrs.get("containerStyle"))
+    width = attrs.get("width")
+    if "width" not in container_style and isinstance(width, (int, float)) and width > 0:
+        container_style["width"] = f"{width:g}px"
+    img.append(' style="max-width: 100%; height: auto;"')
+    img.append(' loading="lazy">')
+    wrapper_style = _image_style(attrs.get("wrapperStyle"))
+    return (
+        f'<span class="leaf-image"{_style_attr(wrapper_style)}>'
+        f'<span class="leaf-image-frame"{_style_attr(container_style)}>'
+        f'{"".join(img)}</span></span>'
+    )
+
+
+def _image_style(style) -> dict:
+    declarations = {}
+    for declaration in str(style or "").split(";"):
+        name, _, value = declaration.partition(":")
+        name = name.strip().lower()
+        value = value.strip()
+        if name in IMAGE_STYLE_PROPERTIES and value and STYLE_VALUE_RE.match(value):
+            declarations[name] = value
+    return declarations
+
+
+def _style_attr(declarations) -> str:
+    if not declarations:
+        return ""
+    style = "; ".join(f"{name}: {value}" for name, value in declarations.items())
+    return f' style="{escape(style)}"'
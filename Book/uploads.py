@@ -0,0 +1,140 @@
+"""Mark-and-sweep for leaf-editor uploads.
+
+Editor images are referenced only by URL inside Leaf.content_json, so no
+foreign key says when one is no longer used. ``find_orphans`` first lists
+uploads older than a grace period (tracked EditorUpload rows and untracked
+files left from before tracking), then streams every leaf's content and
+drops the ones still referenced. Listing first means a leaf saved while the
+sweep runs is still seen by the mark phase; the grace period covers images
+in editors that have not been saved yet. ``delete_uploads`` checks the age
+of each listed upload again, so one pasted again since the listing (which
+restarts its clock) is kept.
+"""
+from urllib.parse import unquote, urlsplit
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .images import storage_name_from_url
+from .models import EditorUpload, ImageDerivative, Leaf
+
+EDITOR_UPLOAD_DIR = "books/leaf_editor"
+
+
+def record_upload(owner, name, size) -> EditorUpload:
+    # A repeated upload gets the stored blob's name; restarting the clock
+    # keeps the sweep off an image that is about to be used again.
+    upload, _ = EditorUpload.objects.update_or_create(
+        file=name, defaults={"owner": owner, "size": size, "created_at": timezone.now()}
+    )
+    return upload
+
+
+def image_sources(node):
+    """Yield every ``attrs.src`` in a TipTap document."""
+    if isinstance(node, dict):
+        attrs = node.get("attrs")
+        if isinstance(attrs, dict) and isinstance(attrs.get("src"), str):
+            yield attrs["src"]
+        for child in node.get("content") or ():
+            yield from image_sources(child)
+    elif isinstance(node, list):
+        for child in node:
+            yield from image_sources(child)
+
+
+def upload_name(src) -> str:
+    """The editor upload a src points at, or "" for anything else."""
+    # Pasted HTML can carry absolute URLs to this site.
+    name = storage_name_from_url(unquote(urlsplit(src).path))
+    if not name:
+        name = storage_name_from_url(src)
+    return name if name.startswith(f"{EDITOR_UPLOAD_DIR}/") else ""
+
+
+def referenced_uploads(batch_size=500) -> set:
+    """Names of editor uploads used by any leaf, reading leaves in batches."""
+    names = set()
+    contents = Leaf.objects.values_list("content_json", flat=True).iterator(
+        chunk_size=batch_size
+    )
+    for content in contents:
+        for src in image_sources(content):
+            name = upload_name(src)
+            if name:
+                names.add(name)
+    return names
+
+
+def _untracked_files(cutoff, storage):
+    try:
+        _, files = storage.listdir(EDITOR_UPLOAD_DIR)
+    except FileNotFoundError:
+        return
+    tracked = set(EditorUpload.objects.values_list("file", flat=True))
+    for filename in files:
+        name = f"{EDITOR_UPLOAD_DIR}/{filename}"
+        if name in tracked:
+            continue
+        try:
+            if storage.get_modified_time(name) < cutoff:
+                yield name, storage.size(name)
+        except (FileNotFoundError, NotImplementedError):
+            continue
+
+
+def find_orphans(cutoff, batch_size=500, storage=default_storage) -> dict:
+    """Map unreferenced upload names from before ``cutoff`` to their size in bytes."""
+    candidates = dict(
+        EditorUpload.objects.filter(created_at__lt=cutoff).values_list("file", "size")
+    )
+    candidates.update(_untracked_files(cutoff, storage))
+    for name in referenced_uploads(batch_size):
+        candidates.pop(name, None)
+    return candidates
+
+
+def delete_uploads(names, cutoff, storage=default_storage) -> tuple:
+    """Delete those of ``names`` still from before ``cutoff``, with their
+    derivatives; return how many were deleted and the bytes freed."""
+    freed = 0
+    with transaction.atomic():
+        stale = EditorUpload.objects.filter(file__in=names, created_at__lt=cutoff)
+        removed = set(stale.values_list("file", flat=True))
+        tracked = set(EditorUpload.objects.filter(file__in=names).values_list("file", flat=True))
+        removed.update(
+            name
+            for name in set(names) - tracked
+            if _modified_before(name, cutoff, storage)
+        )
+        stale.filter(file__in=removed).delete()
+        derivatives = list(ImageDerivative.objects.filter(source_name__in=removed))
+        for derivative in derivatives:
+            freed += _delete_file(derivative.file.name, storage)
+        for name in removed:
+            # Every repeated upload of a blob counted a reference, but none of
+            # them is used any more.
+            freed += _delete_file(name, storage, purge=True)
+        ImageDerivative.objects.filter(pk__in=[item.pk for item in derivatives]).delete()
+    return len(removed), freed
+
+
+def _modified_before(name, cutoff, storage) -> bool:
+    try:
+        return storage.get_modified_time(name) < cutoff
+    except (FileNotFoundError, NotImplementedError):
+        return False
+
+
+def _delete_file(name, storage, purge=False) -> int:
+    try:
+        size = storage.size(name)
+    except (FileNotFoundError, OSError):
+        return 0
+    if purge and hasattr(storage, "purge"):
+        storage.purge(name)
+    else:
+        storage.delete(name)
+    return size
+
@@ -6,15 +6,28 @@ app_name = "Book"
 
 urlpatterns = [
     path("", views.PublicBookListView.as_view(), name="public_list"),
+    path("page/", views.PublicBookPageView.as_view(), name="public_list_page"),
     path("mine/", views.MyBookListView.as_view(), name="my_list"),
+    path("mine/page/", views.MyBookPageView.as_view(), name="my_list_page"),
+    path("mine/saved/", views.SavedBookListView.as_view(), name="saved_list"),
+    path("mine/saved/page/", views.SavedBookPageView.as_view(), name="saved_list_page"),
+    path("search/", views.BookSearchView.as_view(), name="search"),
+    path("saved/", views.update_saved_books, name="saved_books"),
     path("new/", views.BookCreateView.as_view(), name="create"),
+    path("import/", views.BookImportView.as_view(), name="import"),
     path("<int:pk>/", views.BookDetailView.as_view(), name="detail"),
     path("<int:pk>/save/", views.toggle_saved_book, name="toggle_saved"),
     path("<int:pk>/edit/", views.BookUpdateView.as_view(), name="edit"),
     path("<int:pk>/delete/", views.delete_book, name="delete"),
+    path("<int:pk>/export/", views.export_book, name="export"),
     path("<int:pk>/reader/", views.BookReaderView.as_view(), name="reader"),
+    path("<int:pk>/reader/leaves/", views.reader_leaves, name="reader_leaves"),
+    path("<int:pk>/leaves/reorder/", views.reorder_leaves, name="reorder_leaves"),
     path("<int:pk>/add-leaf/", views.LeafCreateView.as_view(), name="add_leaf"),
     path("leaf-editor/upload/", views.leaf_image_upload, name="leaf_image_upload"),
+    path("uploads/", views.create_upload, name="create_upload"),
+    path("uploads/<uuid:upload_id>/", views.upload_chunk, name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/finalize/", views.finalize_upload, name="finalize_upload"),
     path("leaves/<int:pk>/edit/", views.LeafUpdateView.as_view(), name="edit_leaf"),
     path("leaves/<int:pk>/delete/", views.delete_leaf, name="delete_leaf"),
     path("leaf-images/<int:pk>/delete/", views.LeafImageDeleteView.as_view(), name="delete_leaf_image"),
@@ -1,46 +1,174 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Avg, Q
+from django.db.models import Exists, OuterRef, Q, Subquery
+import hashlib
+import json
 import os
 import uuid
 
+from allauth.socialaccount.models import SocialAccount
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect, render
-from django.urls import reverse_lazy
-from django.views.decorators.http import require_POST
-from django.views.generic import CreateView, DetailView, ListView, UpdateView
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from django.views.generic import CreateView, DetailView, FormView, ListView, UpdateView
 from django.core.files.storage import default_storage
 
-from .forms import BookForm, LeafForm, LeafImageUploadForm
-from .models import Book, Leaf, LeafImage, SavedBook
+from . import archive, caching, chunked, ordering, saved, uploads
+from .forms import BookForm, BookImportForm, LeafForm, LeafImageUploadForm
+from .images import add_srcsets_to_html, attach_srcsets, schedule_derivatives
+from .models import READER_ORDERING, Book, Leaf, LeafImage, SavedBook, UploadSession
+from .pagination import akeyset_page, keyset_page
+from categories import registry as category_registry
 from reviews.models import Review
+from search import index as search_index
 
 
-class PublicBookListView(ListView):
+READER_PAGE_LIMIT = 20
+READER_IMAGE_SIZES = "(max-width: 900px) 100vw, 900px"
+SAVED_BOOKS_LIMIT = 100
+SAVED_SHELF_SIZE = 12
+REORDER_LIMIT = 500
+
+
+async def _auser(request):
+    """Load the user once through the async API and keep it for sync code too."""
+    request.user = await request.auser()
+    return request.user
+
+
+class KeysetPaginationMixin:
+    """Cursor pagination for book lists, on (updated_at, id).
+
+    The page is rendered to card HTML in ``get_cards`` so that views can
+    cache it as a whole; templates output ``cards_html``. Which of the
+    cards the user saved is looked up per request as ``saved_book_ids``
+    and marked by book_grid.js. Async views fetch both first with
+    ``aget_cards`` and ``saved.asaved_ids`` and pass them to
+    ``get_context_data``.
+    """
+
+    page_size = 24
+    list_url_name = None
+    page_url_name = None
+
+    def get_cards(self):
+        """Render one page of book cards; return ``(html, next_cursor, book_ids)``."""
+        books, next_cursor = keyset_page(
+            self.object_list, self.request.GET.get("cursor", ""), self.page_size
+        )
+        return self.render_cards(books), next_cursor, [book.pk for book in books]
+
+    async def aget_cards(self):
+        books, next_cursor = await akeyset_page(
+            self.object_list, self.request.GET.get("cursor", ""), self.page_size
+        )
+        html = await sync_to_async(self.render_cards)(books)
+        return html, next_cursor, [book.pk for book in books]
+
+    def render_cards(self, books) -> str:
+        attach_srcsets(books, "cover_image")
+        html = render_to_string(
+            "Book/book_cards.html", {"books": books}, request=self.request
+        )
+        return html.strip()
+
+    def get_context_data(self, cards=None, saved_book_ids=None, **kwargs):
+        cards_html, next_cursor, book_ids = cards or self.get_cards()
+        if saved_book_ids is None:
+            saved_book_ids = saved.saved_ids(self.request.user, book_ids)
+        context = super().get_context_data(object_list=[], **kwargs)
+        context["cards_html"] = mark_safe(cards_html)
+        context["saved_book_ids"] = sorted(saved_book_ids)
+        context["next_cursor"] = next_cursor
+        if next_cursor:
+            params = self.request.GET.copy()
+            params["cursor"] = next_cursor
+            query = params.urlencode()
+            context["next_url"] = f"{reverse(self.list_url_name)}?{query}"
+            context["next_page_url"] = f"{reverse(self.page_url_name)}?{query}"
+        return context
+
+
+class BookPageResponseMixin:
+    """Render a list page as JSON holding the card HTML, for infinite scroll."""
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(
+            {
+                "html": context["cards_html"],
+                "saved_ids": context["saved_book_ids"],
+                "next_cursor": context["next_cursor"],
+                "next_page_url": context.get("next_page_url", ""),
+            }
+        )
+
+
+class PublicBookListView(KeysetPaginationMixin, ListView):
+    """The public catalogue, served by an async handler.
+
+    Under ASGI, a request waiting on the cache or the database does not
+    hold a worker; the card page is only rendered, in a thread, on a
+    cache miss.
+    """
+
     model = Book
     template_name = "Book/public_list.html"
     context_object_name = "books"
+    list_url_name = "Book:public_list"
+    page_url_name = "Book:public_list_page"
 
     def get_queryset(self):
         query = self.request.GET.get("q", "").strip()
         category_id = self.request.GET.get("category", "").strip()
-        qs = Book.objects.filter(is_public=True).annotate(
-            avg_rating=Avg("reviews__rating")
-        )
+        qs = Book.objects.filter(is_public=True)
         if category_id:
             qs = qs.filter(category_id=category_id)
         if query:
-            qs = qs.filter(
-                Q(title__icontains=query)
-                | Q(description__icontains=query)
-            )
+            qs = search_index.filter_books(qs, query)
         return qs
 
+    async def get(self, request, *args, **kwargs):
+        user = await _auser(request)
+        self.object_list = self.get_queryset()
+        cards = await self.aget_cards()
+        saved_book_ids = await saved.asaved_ids(user, cards[2])
+        context = self.get_context_data(cards=cards, saved_book_ids=saved_book_ids)
+        return self.render_to_response(context)
 
-class MyBookListView(LoginRequiredMixin, ListView):
+    async def aget_cards(self):
+        # Search results follow leaf text, which the catalogue generation
+        # does not track, and rarely repeat; only browsing is cached.
+        if self.request.GET.get("q", "").strip():
+            return await super().aget_cards()
+        return tuple(
+            await caching.aget_or_build(
+                "public-cards",
+                caching.CATALOGUE,
+                super().aget_cards,
+                self.request.GET.get("category", "").strip(),
+                self.request.GET.get("cursor", ""),
+            )
+        )
+
+
+class PublicBookPageView(BookPageResponseMixin, PublicBookListView):
+    pass
+
+
+class MyBookListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Book
     template_name = "Book/my_list.html"
     context_object_name = "books"
+    list_url_name = "Book:my_list"
+    page_url_name = "Book:my_list_page"
+    include_saved_books = True
 
     def get_queryset(self):
         qs = Book.objects.filter(owner=self.request.user)
@@ -49,41 +177,187 @@ class MyBookListView(LoginRequiredMixin, ListView):
         if category_id:
             qs = qs.filter(category_id=category_id)
         if query:
-            qs = qs.filter(
-                Q(title__icontains=query)
-                | Q(description__icontains=query)
-            )
-        return qs.annotate(
-            avg_rating=Avg("reviews__rating")
-        )
+            qs = search_index.filter_books(qs, query)
+        return qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["saved_books"] = (
-            Book.objects.filter(saved_by__user=self.request.user)
-            .exclude(owner=self.request.user)
-            .annotate(avg_rating=Avg("reviews__rating"))
-            .distinct()
+        if not self.include_saved_books:
+            return context
+        # Only the most recently updated few; the rest are on the saved list.
+        saved_books = list(
+            saved_books_of(self.request.user).order_by("-updated_at", "-id")[
+                : SAVED_SHELF_SIZE + 1
+            ]
         )
+        context["saved_books"] = saved_books[:SAVED_SHELF_SIZE]
+        context["more_saved_books"] = len(saved_books) > SAVED_SHELF_SIZE
+        attach_srcsets(context["saved_books"], "cover_image")
+        return context
+
+
+class MyBookPageView(BookPageResponseMixin, MyBookListView):
+    include_saved_books = False
+
+
+def saved_books_of(user):
+    """Books from other creators that ``user`` saved."""
+    return Book.objects.filter(saved_by__user=user).exclude(owner=user)
+
+
+class SavedBookListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    model = Book
+    template_name = "Book/saved_list.html"
+    context_object_name = "books"
+    list_url_name = "Book:saved_list"
+    page_url_name = "Book:saved_list_page"
+
+    def get_queryset(self):
+        return saved_books_of(self.request.user)
+
+
+class SavedBookPageView(BookPageResponseMixin, SavedBookListView):
+    pass
+
+
+class BookSearchView(ListView):
+    model = Book
+    template_name = "Book/search.html"
+    context_object_name = "books"
+    result_limit = 50
+
+    def get_queryset(self):
+        query = self.request.GET.get("q", "").strip()
+        if not query:
+            return []
+        if self.request.user.is_authenticated:
+            qs = Book.objects.filter(Q(is_public=True) | Q(owner=self.request.user))
+        else:
+            qs = Book.objects.filter(is_public=True)
+        category_id = self.request.GET.get("category", "").strip()
+        if category_id:
+            qs = qs.filter(category_id=category_id)
+        books = search_index.search_books(qs, query, limit=self.result_limit)
+        attach_srcsets(books, "cover_image")
+        return books
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.request.GET.get("q", "").strip()
         return context
 
 
 class BookDetailView(DetailView):
+    """A book's page, answered with 304 while nothing on it has changed.
+
+    The ETag is computed before any of the page's own queries, from the
+    book's ``content_version`` plus what differs between visitors of the
+    same version: the query string, who is signed in and the name and
+    social account their top bar shows, whether they saved the book, the
+    categories (base.html's menu, should a page keep its toolbar block) and
+    the CSRF secret the page's forms take their tokens from.
+    Pages are private and revalidated on every visit. Last-Modified is only
+    informational: it cannot reflect the per-user parts, so 304s come from
+    the ETag alone. A rendered page carries the ETag of the row it was
+    rendered from, whose version also keys its fragments.
+
+    The handlers are async: the user, the version and the book come
+    through the async ORM, so under ASGI a 304 never takes a thread, and
+    only building the context and rendering run in one. Everything else
+    the page shows is either on the book row (rating, leaf count), folded
+    into the version query (saved flag) or in fragment caches (header,
+    reviews), so there are no further queries to overlap.
+    """
+
     model = Book
     template_name = "Book/detail.html"
     context_object_name = "book"
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
+        await _auser(request)
+        pk = kwargs.get("pk")
+        version = await self.aget_version(pk)
+        if version is None:
+            return await self.arender_page(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=self.etag(pk, version))
+        if response is None:
+            response = await self.arender_page(request, *args, **kwargs)
+            if response.status_code == 200:
+                # After rendering, which may issue the visitor's first CSRF
+                # secret. From the row the page was rendered from, which a
+                # concurrent edit may have moved past the version above.
+                book = self.object
+
+                def set_validators(rendered):
+                    rendered.headers["ETag"] = self.etag(pk, book.content_version)
+                    rendered.headers["Last-Modified"] = http_date(
+                        book.content_updated_at.timestamp()
+                    )
+
+                response.add_post_render_callback(set_validators)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Cookie"])
+        return response
+
+    async def aget_version(self, pk):
+        """The book's ``content_version``, or None if the book is not visible."""
+        books = self.get_queryset().filter(pk=pk)
+        user = self.request.user
+        self.profile = []
+        if user.is_authenticated:
+            # The top bar shows the viewer's avatar, from their first social account.
+            account = SocialAccount.objects.filter(user=user).order_by("pk")
+            books = books.annotate(
+                is_saved=Exists(SavedBook.objects.filter(user=user, book=OuterRef("pk"))),
+                account_id=Subquery(account.values("pk")[:1]),
+                account_data=Subquery(account.values("extra_data")[:1]),
+            )
+            row = await books.values_list(
+                "content_version", "is_saved", "account_id", "account_data"
+            ).afirst()
+        else:
+            row = await books.values_list("content_version").afirst()
+        if row is None:
+            return None
+        version, *viewer = row
+        # Reused by get_context_data, which would otherwise query it again.
+        self.is_saved = bool(viewer and viewer[0])
+        if viewer:
+            self.profile = [
+                user.username, user.first_name, user.last_name, *map(str, viewer[1:])
+            ]
+        # From the in-process registry; a cache read unless a category changed.
+        self.categories = await category_registry.afingerprint()
+        return version
+
+    def etag(self, pk, version) -> str:
+        user = self.request.user
+        parts = [
+            self.template_name,
+            str(pk),
+            str(version),
+            self.request.get_full_path(),
+            str(user.pk) if user.is_authenticated else "",
+            "saved" if self.is_saved else "",
+            *self.profile,
+            self.categories,
+            self.request.META.get("CSRF_COOKIE", ""),
+        ]
+        return quote_etag(hashlib.sha256("\0".join(parts).encode()).hexdigest()[:32])
+
+    async def arender_page(self, request, *args, **kwargs):
         try:
-            self.object = self.get_object()
-        except Http404:
+            self.object = await self.get_queryset().aget(pk=kwargs.get("pk"))
+        except Book.DoesNotExist:
             requested_id = kwargs.get("pk")
             context = {
                 "book_missing": True,
                 "requested_id": requested_id,
             }
-            return render(request, "Book/detail.html", context, status=404)
-        context = self.get_context_data(object=self.object)
+            return await sync_to_async(render)(
+                request, "Book/book_missing.html", context, status=404
+            )
+        context = await sync_to_async(self.get_context_data)(object=self.object)
         return self.render_to_response(context)
 
     def get_queryset(self):
@@ -95,29 +369,33 @@ class BookDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        attach_srcsets([self.object], "cover_image")
         order = self.request.GET.get("order", "newest")
-        ordering = "created_at" if order == "oldest" else "-created_at"
-        context["leaves"] = Leaf.objects.filter(book=self.object).order_by(ordering)
+        leaf_ordering = READER_ORDERING
+        if order != "oldest":
+            leaf_ordering = [f"-{field}" for field in READER_ORDERING]
+        context["leaves"] = (
+            Leaf.objects.filter(book=self.object).summaries().order_by(*leaf_ordering)
+        )
         context["leaf_order"] = order
         context["reviews"] = (
             Review.objects.filter(book=self.object)
             .select_related("user")
-            .prefetch_related("user__socialaccount_set")
             .order_by("-rating", "-created_at")[:3]
         )
-        rating_qs = Review.objects.filter(book=self.object)
-        rating_data = rating_qs.aggregate(avg_rating=Avg("rating"))
-        context["avg_rating"] = rating_data["avg_rating"]
-        context["review_count"] = rating_qs.count()
-        if self.request.user.is_authenticated:
-            context["is_saved"] = SavedBook.objects.filter(
-                user=self.request.user, book=self.object
-            ).exists()
-        else:
-            context["is_saved"] = False
+        context["avg_rating"] = self.object.rating_avg
+        context["review_count"] = self.object.rating_count
+        context["is_saved"] = getattr(self, "is_saved", None)
+        if context["is_saved"] is None:
+            context["is_saved"] = self.object.pk in saved.saved_ids(
+                self.request.user, [self.object.pk]
+            )
         return context
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.submit_review)(request, *args, **kwargs)
+
+    def submit_review(self, request, *args, **kwargs):
         self.object = self.get_object()
         if not request.user.is_authenticated:
             return redirect("account_login")
@@ -142,17 +420,61 @@ class BookDetailView(DetailView):
 
 
 class BookReaderView(BookDetailView):
+    """Reader that renders only a window of leaves around the current page.
+
+    Every other page is an empty placeholder that leaf_reader.js fills from
+    ``reader_leaves`` as the reader moves through the book.
+    """
+
     template_name = "Book/reader.html"
+    window = 2
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.pop("leaves", None)
+        leaf_ids = reader_leaf_ids(self.object)
+        index = self.get_initial_index(leaf_ids)
+        start = max(0, index - self.window)
+        rendered = dict(
+            reader_window(self.object, start, index + self.window + 1 - start)
+        )
         context["hide_topbar"] = True
-        context["leaves"] = Leaf.objects.filter(book=self.object).order_by("created_at")
+        context["reader_pages"] = [
+            {"index": position, "id": leaf_id, "html": rendered.get(leaf_id)}
+            for position, leaf_id in enumerate(leaf_ids)
+        ]
+        context["reader_index"] = index
+        context["leaf_count"] = len(leaf_ids)
         context["leaf_order"] = "oldest"
         return context
 
+    def get_initial_index(self, leaf_ids):
+        leaf_param = self.request.GET.get("leaf", "").strip()
+        if leaf_param.isdigit() and int(leaf_param) in leaf_ids:
+            return leaf_ids.index(int(leaf_param))
+        page_param = self.request.GET.get("page", "").strip()
+        if page_param.isdigit() and leaf_ids:
+            return min(max(int(page_param), 1), len(leaf_ids)) - 1
+        return 0
+
 
-class BookCreateView(LoginRequiredMixin, CreateView):
+class CoverUploadMixin:
+    """Take the cover from a finalized chunked upload named in ``cover_upload``."""
+
+    def form_valid(self, form):
+        upload_id = form.cleaned_data.get("cover_upload")
+        if upload_id:
+            sessions = chunked.completed_sessions(
+                self.request.user, [upload_id], UploadSession.PURPOSE_COVER
+            )
+            if not sessions:
+                form.add_error(None, "The cover upload has expired; choose the image again.")
+                return self.form_invalid(form)
+            chunked.save_to(sessions[0], form.instance.cover_image)
+        return super().form_valid(form)
+
+
+class BookCreateView(LoginRequiredMixin, CoverUploadMixin, CreateView):
     model = Book
     template_name = "Book/form.html"
     form_class = BookForm
@@ -160,10 +482,31 @@ class BookCreateView(LoginRequiredMixin, CreateView):
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
+        response = super().form_valid(form)
+        if self.object.cover_image:
+            schedule_derivatives(self.object.cover_image.name)
+        return response
+
+
+class BookImportView(LoginRequiredMixin, FormView):
+    template_name = "Book/import.html"
+    form_class = BookImportForm
+    success_url = reverse_lazy("Book:my_list")
+
+    def form_valid(self, form):
+        try:
+            archive.import_book(
+                form.cleaned_data["archive"],
+                owner=self.request.user,
+                category=form.cleaned_data["category"],
+            )
+        except archive.ArchiveError as error:
+            form.add_error("archive", str(error))
+            return self.form_invalid(form)
         return super().form_valid(form)
 
 
-class BookUpdateView(LoginRequiredMixin, UpdateView):
+class BookUpdateView(LoginRequiredMixin, CoverUploadMixin, UpdateView):
     model = Book
     template_name = "Book/form.html"
     form_class = BookForm
@@ -172,6 +515,13 @@ class BookUpdateView(LoginRequiredMixin, UpdateView):
     def get_queryset(self):
         return Book.objects.filter(owner=self.request.user)
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        cover_changed = "cover_image" in form.changed_data or form.cleaned_data.get("cover_upload")
+        if cover_changed and self.object.cover_image:
+            schedule_derivatives(self.object.cover_image.name)
+        return response
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["leaf_form"] = LeafForm()
@@ -179,6 +529,25 @@ class BookUpdateView(LoginRequiredMixin, UpdateView):
         return context
 
 
+def save_leaf_images(request, leaf) -> None:
+    """Attach images posted with a leaf form.
+
+    They come as ``images`` files or as ``upload_ids`` of finalized chunked
+    uploads.
+    """
+    for image in request.FILES.getlist("images"):
+        leaf_image = LeafImage.objects.create(leaf=leaf, image=image)
+        schedule_derivatives(leaf_image.image.name)
+    sessions = chunked.completed_sessions(
+        request.user, request.POST.getlist("upload_ids"), UploadSession.PURPOSE_LEAF_IMAGE
+    )
+    for session in sessions:
+        leaf_image = LeafImage(leaf=leaf)
+        chunked.save_to(session, leaf_image.image)
+        leaf_image.save()
+        schedule_derivatives(leaf_image.image.name)
+
+
 class LeafCreateView(LoginRequiredMixin, CreateView):
     model = Leaf
     form_class = LeafForm
@@ -206,9 +575,7 @@ class LeafCreateView(LoginRequiredMixin, CreateView):
     def form_valid(self, form):
         form.instance.book = self.book
         response = super().form_valid(form)
-        images = self.request.FILES.getlist("images")
-        for image in images:
-            LeafImage.objects.create(leaf=self.object, image=image)
+        save_leaf_images(self.request, self.object)
         return response
 
     def get_context_data(self, **kwargs):
@@ -249,9 +616,7 @@ class LeafUpdateView(LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        images = self.request.FILES.getlist("images")
-        for image in images:
-            LeafImage.objects.create(leaf=self.object, image=image)
+        save_leaf_images(self.request, self.object)
         return response
 
     def get_success_url(self):
@@ -275,22 +640,169 @@ class LeafImageDeleteView(LoginRequiredMixin, DetailView):
 @login_required
 @require_POST
 def toggle_saved_book(request, pk):
-    book = Book.objects.filter(pk=pk).filter(
-        Q(is_public=True) | Q(owner=request.user)
-    ).first()
-    if not book:
+    if not saved.visible_ids(request.user, [pk]):
         raise Http404
-    saved_entry, created = SavedBook.objects.get_or_create(
-        user=request.user, book=book
-    )
-    if created:
-        is_saved = True
+    requested = request.POST.get("saved", "")
+    if requested in ("0", "1"):
+        is_saved = requested == "1"
     else:
-        saved_entry.delete()
-        is_saved = False
+        is_saved = not saved.saved_ids(request.user, [pk])
+    saved.set_saved(request.user, [pk], is_saved)
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
         return JsonResponse({"saved": is_saved})
-    return redirect("Book:detail", pk=book.pk)
+    return redirect("Book:detail", pk=pk)
+
+
+@login_required
+@require_POST
+def update_saved_books(request):
+    """Set the saved state of many books at once.
+
+    Takes ``{"book_ids": [...], "saved": true|false}`` as JSON or form
+    fields and answers with the ids it applied to; books the user cannot
+    see are skipped. Repeating a call changes nothing.
+    """
+    if request.content_type == "application/json":
+        try:
+            payload = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        raw_ids = payload.get("book_ids")
+        raw_saved = payload.get("saved")
+    else:
+        raw_ids = request.POST.getlist("book_ids")
+        raw_saved = request.POST.get("saved")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return JsonResponse({"error": "Missing book_ids"}, status=400)
+    if len(raw_ids) > SAVED_BOOKS_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {SAVED_BOOKS_LIMIT} books per call"}, status=400
+        )
+    if raw_saved in (True, "1", "true"):
+        is_saved = True
+    elif raw_saved in (False, "0", "false"):
+        is_saved = False
+    else:
+        return JsonResponse({"error": "Missing saved"}, status=400)
+    try:
+        book_ids = {int(book_id) for book_id in raw_ids}
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid book id"}, status=400)
+    applied = saved.set_saved(request.user, book_ids, is_saved)
+    return JsonResponse({"saved": is_saved, "book_ids": sorted(applied)})
+
+
+@login_required
+@require_POST
+def reorder_leaves(request, pk):
+    """Move leaves of one of the user's books.
+
+    Takes ``{"leaf_ids": [...], "after": leaf_id|null}`` as JSON and places
+    the leaves, in the given order, right after ``after`` (at the start of
+    the book for null). Only the moved leaves are rewritten unless the book
+    has to be renumbered.
+    """
+    book = Book.objects.filter(pk=pk, owner=request.user).first()
+    if not book:
+        raise Http404
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    raw_ids = payload.get("leaf_ids")
+    after = payload.get("after")
+    if not isinstance(raw_ids, list) or not raw_ids:
+        return JsonResponse({"error": "Missing leaf_ids"}, status=400)
+    if len(raw_ids) > REORDER_LIMIT:
+        return JsonResponse(
+            {"error": f"At most {REORDER_LIMIT} leaves per call"}, status=400
+        )
+    if not all(type(leaf_id) is int for leaf_id in raw_ids) or not (
+        after is None or type(after) is int
+    ):
+        return JsonResponse({"error": "Invalid leaf id"}, status=400)
+    try:
+        renumbered = ordering.move_leaves(book, raw_ids, after)
+    except ordering.ReorderError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse({"leaf_ids": reader_leaf_ids(book), "renumbered": renumbered})
+
+
+@require_GET
+def reader_leaves(request, pk):
+    books = Book.objects.filter(pk=pk)
+    if request.user.is_authenticated:
+        books = books.filter(Q(is_public=True) | Q(owner=request.user))
+    else:
+        books = books.filter(is_public=True)
+    book = books.first()
+    if not book:
+        raise Http404
+    offset_raw = request.GET.get("offset", "0").strip()
+    limit_raw = request.GET.get("limit", "").strip()
+    offset = int(offset_raw) if offset_raw.isdigit() else 0
+    limit = READER_PAGE_LIMIT
+    if limit_raw.isdigit():
+        limit = min(max(int(limit_raw), 1), READER_PAGE_LIMIT)
+    return JsonResponse(
+        {
+            "offset": offset,
+            "leaves": [
+                {"id": leaf_id, "index": offset + position, "html": html}
+                for position, (leaf_id, html) in enumerate(
+                    reader_window(book, offset, limit)
+                )
+            ],
+        }
+    )
+
+
+def reader_leaf_ids(book) -> list:
+    """Ids of the book's leaves in reading order."""
+    return caching.get_or_build(
+        "reader-leaf-ids",
+        caching.book_scope(book),
+        lambda: list(
+            Leaf.objects.filter(book=book)
+            .order_by(*READER_ORDERING)
+            .values_list("pk", flat=True)
+        ),
+    )
+
+
+def reader_window(book, offset, limit) -> list:
+    """``(id, html)`` for ``limit`` leaves from ``offset`` in reading order."""
+
+    def build():
+        leaves = list(
+            Leaf.objects.filter(book=book)
+            .order_by(*READER_ORDERING)
+            .only("pk", "text", "content_html")[offset:offset + limit]
+        )
+        # Leaves without stored HTML (empty ones, or saved before it was
+        # stored) need their content: one query for all of them.
+        missing = [leaf.pk for leaf in leaves if not leaf.content_html]
+        if missing:
+            content = dict(
+                Leaf.objects.filter(pk__in=missing)
+                .order_by()
+                .values_list("pk", "content_json")
+            )
+            for leaf in leaves:
+                if leaf.pk in content:
+                    leaf.content_json = content[leaf.pk]
+        rendered = add_srcsets_to_html(
+            [leaf.html for leaf in leaves], READER_IMAGE_SIZES
+        )
+        return [(leaf.pk, html) for leaf, html in zip(leaves, rendered)]
+
+    return caching.get_or_build(
+        "reader-window", caching.book_scope(book), build, offset, limit
+    )
 
 
 @login_required
@@ -303,6 +815,19 @@ def delete_book(request, pk):
     return redirect("Book:my_list")
 
 
+@login_required
+@require_GET
+def export_book(request, pk):
+    book = Book.objects.select_related("category").filter(pk=pk, owner=request.user).first()
+    if not book:
+        raise Http404
+    response = StreamingHttpResponse(archive.export_book(book), content_type="application/zip")
+    response["Content-Disposition"] = (
+        f'attachment; filename="{archive.export_filename(book)}"'
+    )
+    return response
+
+
 @login_required
 @require_POST
 def delete_leaf(request, pk):
@@ -321,6 +846,99 @@ def leaf_image_upload(request):
     if not file:
         return JsonResponse({"error": "Missing image"}, status=400)
     _, ext = os.path.splitext(file.name)
-    name = f"books/leaf_editor/{uuid.uuid4().hex}{ext.lower()}"
+    name = f"{uploads.EDITOR_UPLOAD_DIR}/{uuid.uuid4().hex}{ext.lower()}"
     path = default_storage.save(name, file)
+    uploads.record_upload(request.user, path, file.size)
+    schedule_derivatives(path)
     return JsonResponse({"url": default_storage.url(path)})
+
+
+def _upload_state(session, offset) -> dict:
+    return {
+        "id": str(session.pk),
+        "url": reverse("Book:upload_chunk", args=[session.pk]),
+        "finalize_url": reverse("Book:finalize_upload", args=[session.pk]),
+        "offset": offset,
+        "size": session.size,
+        "chunk_size": settings.CHUNKED_UPLOAD_CHUNK_SIZE,
+        "completed": session.completed,
+    }
+
+
+@login_required
+@require_POST
+def create_upload(request):
+    """Start a chunked upload.
+
+    Takes ``{"purpose": "editor"|"leaf_image"|"cover", "filename": ...,
+    "content_type": ..., "size": bytes}`` as JSON and answers with the
+    session, where to PUT its chunks and the largest chunk accepted.
+    """
+    try:
+        payload = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    try:
+        session = chunked.create_session(
+            request.user,
+            payload.get("purpose"),
+            payload.get("filename", ""),
+            payload.get("content_type"),
+            payload.get("size"),
+        )
+    except chunked.UploadError as error:
+        return JsonResponse({"error": str(error)}, status=error.status)
+    return JsonResponse(_upload_state(session, 0), status=201)
+
+
+@login_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def upload_chunk(request, upload_id):
+    """GET the offset to resume from, PUT the next chunk, or DELETE the upload.
+
+    A PUT sends the chunk as the raw body and its position in the file in
+    an ``Upload-Offset`` header. A 409 answer carries the offset to
+    continue from.
+    """
+    session = UploadSession.objects.filter(pk=upload_id, owner=request.user).first()
+    if not session:
+        raise Http404
+    if request.method == "DELETE":
+        chunked.discard(session)
+        return HttpResponse(status=204)
+    if request.method == "PUT":
+        content_length = request.META.get("CONTENT_LENGTH")
+        try:
+            start = int(request.headers.get("Upload-Offset", ""))
+            length = int(content_length) if content_length else None
+        except ValueError:
+            return JsonResponse({"error": "Invalid Upload-Offset or Content-Length"}, status=400)
+        try:
+            chunked.append_chunk(session, request, start, length)
+        except chunked.UploadError as error:
+            return JsonResponse(
+                {"error": str(error), "offset": chunked.offset(session)}, status=error.status
+            )
+    return JsonResponse(_upload_state(session, chunked.offset(session)))
+
+
+@login_required
+@require_POST
+def finalize_upload(request, upload_id):
+    """Check a fully sent upload. Editor images are stored and get a URL;
+    covers and leaf images are then named by id in their form."""
+    session = UploadSession.objects.filter(pk=upload_id, owner=request.user).first()
+    if not session:
+        raise Http404
+    try:
+        chunked.finalize(session)
+    except chunked.UploadError as error:
+        return JsonResponse({"error": str(error)}, status=error.status)
+    if session.purpose == UploadSession.PURPOSE_EDITOR:
+        path = chunked.store(session, default_storage, uploads.EDITOR_UPLOAD_DIR)
+        uploads.record_upload(request.user, path, session.size)
+        schedule_derivatives(path)
+        return JsonResponse({"url": default_storage.url(path)})
+    return JsonResponse(_upload_state(session, session.size))
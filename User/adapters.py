@@ -4,8 +4,20 @@ from django.utils.text import slugify
 
 from allauth.socialaccount.adapter import DefaultSocialAccountAdapter
 
+from . import social
+
 
 class SocialAccountAdapter(DefaultSocialAccountAdapter):
+    def list_apps(self, request, provider=None, client_id=None):
+        return social.cached_apps(
+            request,
+            provider,
+            client_id,
+            lambda: super(SocialAccountAdapter, self).list_apps(
+                request, provider=provider, client_id=client_id
+            ),
+        )
+
     def populate_user(self, request, sociallogin, data):
         user = super().populate_user(request, sociallogin, data)
         full_name = (data.get("name") or "").strip()
@@ -0,0 +1,88 @@
+"""A local stand-in for the reCAPTCHA siteverify endpoint.
+
+Used by the tests and ``benchmark_signup``; point RECAPTCHA_VERIFY_URL at
+``server.url`` to use it. Every token is accepted with ``score`` unless it
+is listed in ``rejected``, and each answer can be delayed to mimic a slow
+upstream.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeRecaptchaServer:
+    def __init__(self, host="127.0.0.1", port=0, score=0.9, delay=0.0, rejected=()):
+        self.score = score
+        self.delay = delay
+        self.rejected = set(rejected)
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/recaptcha/api/siteverify"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-recaptcha", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def answer(self, form) -> dict:
+        token = form.get("response", [""])[0]
+        if not form.get("secret", [""])[0] or token in self.rejected:
+            return {"success": False, "error-codes": ["invalid-input-response"]}
+        return {"success": True, "score": self.score, "action": "signup"}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_qs(self.rfile.read(length).decode("utf-8"))
+                with fake._lock:
+                    fake.requests += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                body = json.dumps(fake.answer(form)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,138 @@
+import asyncio
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from User import recaptcha
+from User.fake_recaptcha import FakeRecaptchaServer
+from User.models import OutgoingEmail
+
+EMAIL_DOMAIN = "benchmark.invalid"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent signups through the WSGI and ASGI handlers against a "
+        "local fake reCAPTCHA server. Benchmark users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signups", type=int, default=60, help="Signups per handler.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=30,
+            help="Clients signing up at the same time.",
+        )
+        parser.add_argument(
+            "--wsgi-workers",
+            type=int,
+            default=3,
+            help="Sync workers available to the WSGI run (gunicorn --workers).",
+        )
+        parser.add_argument(
+            "--delay",
+            type=float,
+            default=0.3,
+            help="Seconds the fake verify server waits before answering.",
+        )
+
+    def handle(self, *args, **options):
+        signups = options["signups"]
+        concurrency = options["concurrency"]
+        workers = options["wsgi_workers"]
+        if min(signups, concurrency, workers) < 1:
+            raise CommandError("--signups, --concurrency and --wsgi-workers must be positive.")
+
+        self.url = reverse("User:signup")
+        with FakeRecaptchaServer(delay=options["delay"]) as fake, override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            RECAPTCHA_SECRET_KEY="benchmark",
+            RECAPTCHA_VERIFY_URL=fake.url,
+            RECAPTCHA_MAX_CONNECTIONS=concurrency,
+            # Hashing is CPU work in either handler; keep it out of the comparison.
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        ):
+            try:
+                for label, run in (
+                    (f"WSGI ({workers} workers)", lambda: self._run_wsgi(signups, workers)),
+                    (
+                        f"ASGI ({concurrency} in flight)",
+                        lambda: asyncio.run(self._run_asgi(signups, concurrency)),
+                    ),
+                ):
+                    recaptcha.close_clients()
+                    fake.connections = fake.requests = 0
+                    started = time.perf_counter()
+                    latencies, failures = run()
+                    elapsed = time.perf_counter() - started
+                    self._report(label, elapsed, latencies, failures, fake)
+            finally:
+                recaptcha.close_clients()
+                self._cleanup()
+
+    def _form(self) -> dict:
+        return {
+            "name": "Benchmark",
+            "email": f"bench-{uuid.uuid4().hex}@{EMAIL_DOMAIN}",
+            "password": "benchmark-password",
+            "recaptcha_token": "token",
+        }
+
+    def _run_wsgi(self, signups, workers):
+        def signup():
+            try:
+                started = time.perf_counter()
+                response = Client().post(self.url, self._form())
+                return time.perf_counter() - started, response.status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda _: signup(), range(signups)))
+        return self._split(results)
+
+    async def _run_asgi(self, signups, concurrency):
+        gate = asyncio.Semaphore(concurrency)
+
+        async def signup():
+            async with gate:
+                started = time.perf_counter()
+                response = await AsyncClient().post(self.url, self._form())
+                return time.perf_counter() - started, response.status_code
+
+        results = await asyncio.gather(*(signup() for _ in range(signups)))
+        return self._split(results)
+
+    def _split(self, results):
+        latencies = [elapsed for elapsed, status in results if status == 302]
+        return latencies, len(results) - len(latencies)
+
+    def _report(self, label, elapsed, latencies, failures, fake) -> None:
+        total = len(latencies) + failures
+        line = f"{label}: {total} signups in {elapsed:.2f}s ({total / elapsed:.1f}/s)"
+        if latencies:
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            line += (
+                f", latency p50 {statistics.median(latencies) * 1000:.0f}ms"
+                f" p95 {p95 * 1000:.0f}ms"
+            )
+        line += f", {fake.connections} verify connection(s) for {fake.requests} request(s)"
+        if failures:
+            line += f", {failures} failed"
+        self.stdout.write(line)
+
+    def _cleanup(self) -> None:
+        suffix = f"@{EMAIL_DOMAIN}"
+        get_user_model().objects.filter(username__endswith=suffix).delete()
+        OutgoingEmail.objects.filter(to__icontains=suffix).delete()
@@ -0,0 +1,81 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from User import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outgoing email, reusing one mail connection across messages."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help="Number of messages claimed per batch.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--idle-close",
+            type=float,
+            default=30.0,
+            help="Close the mail connection after this many idle seconds.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Deliver everything currently due and exit.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        interval = options["interval"]
+        idle_close = options["idle_close"]
+
+        connection = None
+        idle_since = time.monotonic()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                close_old_connections()
+                messages = outbox.claim_batch(batch_size)
+                if messages:
+                    if connection is None:
+                        connection = get_connection()
+                    try:
+                        connection.open()
+                    except OSError as exc:
+                        # Every message in the batch will fail and back off.
+                        self.stderr.write(f"Could not connect to the mail server: {exc}")
+                    sent, failed = outbox.deliver(messages, connection)
+                    total_sent += sent
+                    total_failed += failed
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"Batch: {sent} sent, {failed} failed.")
+                    idle_since = time.monotonic()
+                    continue
+                if options["once"]:
+                    break
+                # Relays drop idle sessions; release ours before they do.
+                if connection is not None and time.monotonic() - idle_since > idle_close:
+                    connection.close()
+                    connection = None
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if connection is not None:
+                connection.close()
+        self.stdout.write(
+            self.style.SUCCESS(f"Sent {total_sent} message(s), {total_failed} failed.")
+        )
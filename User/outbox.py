@@ -0,0 +1,139 @@
+"""Durable outbox for outgoing mail.
+
+Requests only insert an ``OutgoingEmail`` row, inside their own
+transaction, so nothing is sent for a signup that rolled back and no
+request waits on the mail relay. The ``send_outbox`` worker claims due
+rows in batches, sends them over one reused connection and records the
+outcome of every message.
+"""
+import logging
+import smtplib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+# A claimed batch becomes due again after this long, so messages held by a
+# worker that died mid-batch are picked up by the next one.
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue_email(subject, body, to, from_email=None) -> OutgoingEmail:
+    """Queue a plain-text message; it is sent once the caller's transaction commits."""
+    if isinstance(to, str):
+        to = [to]
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def backoff_delay(attempts) -> timedelta:
+    """Exponential delay before retry number ``attempts``, capped at an hour."""
+    seconds = BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1)
+    return timedelta(seconds=min(seconds, BACKOFF_MAX_SECONDS))
+
+
+def claim_batch(batch_size=BATCH_SIZE, now=None) -> list:
+    """Lease up to ``batch_size`` due messages to this worker.
+
+    The claim is a single conditional UPDATE, so concurrent workers never
+    receive the same row even on databases without SELECT ... FOR UPDATE.
+    """
+    now = now or timezone.now()
+    due = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now
+    )
+    ids = list(due.order_by("next_attempt_at", "pk").values_list("pk", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4()
+    due.filter(pk__in=ids).update(claim_token=token, next_attempt_at=now + CLAIM_LEASE)
+    return list(OutgoingEmail.objects.filter(claim_token=token).order_by("pk"))
+
+
+def deliver(messages, connection) -> tuple[int, int]:
+    """Send claimed messages over an open connection; return ``(sent, failed)``.
+
+    Each message is sent on its own so one bad recipient does not fail the
+    batch. A dropped SMTP session is reopened once and the message retried
+    straight away; any other error schedules a retry with backoff until
+    ``MAX_ATTEMPTS`` is reached.
+    """
+    sent = failed = 0
+    for outgoing in messages:
+        email = EmailMessage(
+            outgoing.subject,
+            outgoing.body,
+            outgoing.from_email or settings.DEFAULT_FROM_EMAIL,
+            outgoing.to,
+            connection=connection,
+        )
+        try:
+            try:
+                email.send()
+            except smtplib.SMTPServerDisconnected:
+                connection.close()
+                connection.open()
+                email.send()
+        except Exception as exc:
+            _record_failure(outgoing, exc)
+            failed += 1
+        else:
+            _record_success(outgoing)
+            sent += 1
+    return sent, failed
+
+
+def send_pending(batch_size=BATCH_SIZE, connection=None) -> tuple[int, int]:
+    """Claim and deliver one batch; return ``(sent, failed)``."""
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0
+    if connection is not None:
+        return deliver(messages, connection)
+    with get_connection() as connection:
+        return deliver(messages, connection)
+
+
+def _record_success(outgoing) -> None:
+    outgoing.status = OutgoingEmail.STATUS_SENT
+    outgoing.attempts += 1
+    outgoing.sent_at = timezone.now()
+    outgoing.claim_token = None
+    outgoing.last_error = ""
+    outgoing.save(
+        update_fields=["status", "attempts", "sent_at", "claim_token", "last_error"]
+    )
+
+
+def _record_failure(outgoing, exc) -> None:
+    outgoing.attempts += 1
+    outgoing.claim_token = None
+    outgoing.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+    if outgoing.attempts >= MAX_ATTEMPTS:
+        outgoing.status = OutgoingEmail.STATUS_FAILED
+        logger.error("Giving up on outgoing email %s: %s", outgoing.pk, outgoing.last_error)
+    else:
+        outgoing.next_attempt_at = timezone.now() + backoff_delay(outgoing.attempts)
+        logger.warning(
+            "Outgoing email %s failed (attempt %s): %s",
+            outgoing.pk,
+            outgoing.attempts,
+            outgoing.last_error,
+        )
+    outgoing.save(
+        update_fields=["status", "attempts", "next_attempt_at", "claim_token", "last_error"]
+    )
@@ -0,0 +1,118 @@
+"""reCAPTCHA v3 verification over shared, pooled HTTP clients.
+
+Both clients keep connections to the verify endpoint alive between
+signups. ``RECAPTCHA_MAX_CONNECTIONS`` caps how many verifications run at
+once; callers beyond the cap wait for a free connection until
+``RECAPTCHA_TIMEOUT`` expires. The async client is used by the signup view
+under ASGI, the sync one under WSGI.
+"""
+import asyncio
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+
+_sync_client = None
+_sync_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _client_options() -> dict:
+    limit = settings.RECAPTCHA_MAX_CONNECTIONS
+    return {
+        "timeout": httpx.Timeout(settings.RECAPTCHA_TIMEOUT),
+        "limits": httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+    }
+
+
+def get_client() -> httpx.Client:
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is None:
+            _sync_client = httpx.Client(**_client_options())
+        return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the client bound to the running event loop, creating it once."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(**_client_options())
+    return client
+
+
+def close_clients() -> None:
+    """Drop the shared clients, e.g. after changing settings in tests."""
+    global _sync_client
+    with _sync_lock:
+        if _sync_client is not None:
+            _sync_client.close()
+            _sync_client = None
+    _async_clients.clear()
+
+
+def _payload(token, remote_ip) -> dict:
+    payload = {"secret": settings.RECAPTCHA_SECRET_KEY, "response": token}
+    if remote_ip:
+        payload["remoteip"] = remote_ip
+    return payload
+
+
+def _precheck(token) -> tuple[bool, str]:
+    if not token:
+        return False, "Missing reCAPTCHA token."
+    if not settings.RECAPTCHA_SECRET_KEY:
+        return False, "Missing reCAPTCHA secret key."
+    return True, ""
+
+
+def evaluate(result: dict) -> tuple[bool, str]:
+    """Judge a siteverify response for the signup action."""
+    method_name = "evaluate"
+    if not result.get("success"):
+        return False, "reCAPTCHA rejected."
+
+    if result.get("action") and result.get("action") != "signup":
+        return False, "Invalid reCAPTCHA action."
+
+    score = float(result.get("score", 0))
+    if settings.DEBUG:
+        print(
+            f"{method_name} reCAPTCHA score={score} threshold={settings.RECAPTCHA_THRESHOLD}"
+        )
+    if score < settings.RECAPTCHA_THRESHOLD:
+        return False, "reCAPTCHA score too low."
+
+    return True, ""
+
+
+def verify(token: str, remote_ip: str | None) -> tuple[bool, str]:
+    ok, error = _precheck(token)
+    if not ok:
+        return ok, error
+    try:
+        response = get_client().post(
+            settings.RECAPTCHA_VERIFY_URL, data=_payload(token, remote_ip)
+        )
+        response.raise_for_status()
+        result = response.json()
+    except (httpx.HTTPError, ValueError):
+        return False, "reCAPTCHA verification failed."
+    return evaluate(result)
+
+
+async def averify(token: str, remote_ip: str | None) -> tuple[bool, str]:
+    ok, error = _precheck(token)
+    if not ok:
+        return ok, error
+    try:
+        response = await get_async_client().post(
+            settings.RECAPTCHA_VERIFY_URL, data=_payload(token, remote_ip)
+        )
+        response.raise_for_status()
+        result = response.json()
+    except (httpx.HTTPError, ValueError):
+        return False, "reCAPTCHA verification failed."
+    return evaluate(result)
@@ -0,0 +1,12 @@
+from allauth.socialaccount.models import SocialApp
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import social
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+@receiver(m2m_changed, sender=SocialApp.sites.through)
+def refresh_social_apps(sender, **kwargs):
+    social.invalidate_apps()
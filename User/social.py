@@ -0,0 +1,96 @@
+"""Cached social-login lookups.
+
+SocialApp rows are cached per process, keyed by site, and dropped when a
+version stamp in the shared cache changes; admin edits replace the stamp,
+and it expires after APPS_VERSION_TIMEOUT seconds in case one was lost.
+Avatars are resolved for a whole list of users with one SocialAccount
+query and memoized on the request, so a page costs the same number of
+queries however many reviewers it shows.
+"""
+import threading
+import uuid
+
+from allauth.socialaccount.models import SocialAccount, SocialApp
+from django.contrib.sites.shortcuts import get_current_site
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+APPS_VERSION_KEY = "socialapps:version"
+APPS_VERSION_TIMEOUT = 60
+
+_lock = threading.Lock()
+_apps_version = None
+_apps = {}
+
+
+def _shared_version() -> str:
+    version = cache.get(APPS_VERSION_KEY)
+    if version is None:
+        cache.add(APPS_VERSION_KEY, uuid.uuid4().hex, timeout=APPS_VERSION_TIMEOUT)
+        version = cache.get(APPS_VERSION_KEY)
+    return version
+
+
+def cached_apps(request, provider, client_id, load) -> list:
+    """Return ``load()`` for this site and filter, computing it once per version."""
+    global _apps_version
+    site_id = get_current_site(request).pk if request is not None else None
+    key = (site_id, provider, client_id)
+    version = _shared_version()
+    with _lock:
+        if version != _apps_version:
+            _apps.clear()
+            _apps_version = version
+        apps = _apps.get(key)
+    if apps is None:
+        apps = tuple(load())
+        with _lock:
+            if version == _apps_version:
+                _apps[key] = apps
+    return list(apps)
+
+
+def invalidate_apps() -> None:
+    transaction.on_commit(
+        lambda: cache.set(APPS_VERSION_KEY, uuid.uuid4().hex, timeout=APPS_VERSION_TIMEOUT)
+    )
+
+
+def _first_accounts(request, users) -> dict:
+    """Map user ids to their first social account (or None), memoized on the request."""
+    memo = getattr(request, "_social_accounts", None)
+    if memo is None:
+        memo = request._social_accounts = {}
+    wanted = {user.pk for user in users if user is not None and user.pk is not None}
+    current = getattr(request, "user", None)
+    if current is not None and current.is_authenticated:
+        wanted.add(current.pk)
+    missing = wanted - memo.keys()
+    if missing:
+        for user_id in missing:
+            memo[user_id] = None
+        for account in SocialAccount.objects.filter(user_id__in=missing).order_by("pk"):
+            if memo[account.user_id] is None:
+                memo[account.user_id] = account
+    return memo
+
+
+def avatar_urls(request, users) -> dict:
+    """Map user ids to avatar URLs ("" when there is none)."""
+    accounts = _first_accounts(request, users)
+    urls = getattr(request, "_avatar_urls", None)
+    if urls is None:
+        urls = request._avatar_urls = {}
+    for user_id, account in accounts.items():
+        if user_id in urls:
+            continue
+        try:
+            urls[user_id] = (account.get_avatar_url() or "") if account else ""
+        except (SocialApp.DoesNotExist, ImproperlyConfigured):
+            urls[user_id] = ""
+    return urls
+
+
+def has_social_account(request, user) -> bool:
+    return _first_accounts(request, [user]).get(user.pk) is not None
@@ -1,7 +1,6 @@
 from django import template
-from django.contrib.sites.shortcuts import get_current_site
 
-from allauth.socialaccount.models import SocialApp
+from allauth.socialaccount.adapter import get_adapter
 
 register = template.Library()
 
@@ -11,5 +10,6 @@ def social_app_configured(context, provider: str) -> bool:
     request = context.get("request")
     if not request:
         return False
-    site = get_current_site(request)
-    return SocialApp.objects.filter(provider=provider, sites=site).exists()
+    # Apps from settings have no primary key; only database apps count here.
+    apps = get_adapter().list_apps(request, provider=provider)
+    return any(app.pk is not None and app.provider == provider for app in apps)
@@ -1,6 +1,6 @@
 from django import template
 
-from allauth.socialaccount.models import SocialAccount
+from User import social
 
 register = template.Library()
 
@@ -10,18 +10,27 @@ def has_social_connections(context) -> bool:
     request = context.get("request")
     if not request or not request.user.is_authenticated:
         return False
-    return SocialAccount.objects.filter(user=request.user).exists()
+    return social.has_social_account(request, request.user)
 
 
-@register.simple_tag
-def user_avatar_url(user) -> str:
+@register.simple_tag(takes_context=True)
+def resolve_avatars(context, items, attr="") -> str:
+    """Look up avatars for a whole list before a loop asks for them one by one.
+
+        {% resolve_avatars reviews "user" %}
+    """
+    request = context.get("request")
+    if request:
+        users = [getattr(item, attr) for item in items] if attr else items
+        social.avatar_urls(request, users)
+    return ""
+
+
+@register.simple_tag(takes_context=True)
+def user_avatar_url(context, user) -> str:
     if not user or not getattr(user, "is_authenticated", False):
         return ""
-    if hasattr(user, "socialaccount_set"):
-        accounts = user.socialaccount_set.all()
-    else:
-        accounts = SocialAccount.objects.filter(user=user)
-    account = accounts.first()
-    if not account:
+    request = context.get("request")
+    if not request:
         return ""
-    return account.get_avatar_url() or ""
+    return social.avatar_urls(request, [user]).get(user.pk, "")
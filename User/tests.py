@@ -1,3 +1,234 @@
-from django.test import TestCase
+import smtplib
+import time
+from unittest import mock
 
-# Create your tests here.
+from allauth.socialaccount.models import SocialAccount, SocialApp
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import outbox, recaptcha, social
+from .fake_recaptcha import FakeRecaptchaServer
+from .models import OutgoingEmail, UserOTP
+
+from Book.models import Book
+from categories.models import Category
+from reviews.models import Review
+
+
+class FlakyBackend:
+    """Mail connection that fails for one recipient and counts opens."""
+
+    def __init__(self, fail_for=()):
+        self.fail_for = set(fail_for)
+        self.opened = 0
+        self.sent = []
+
+    def open(self):
+        self.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.fail_for & set(message.to):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b"no")})
+            self.sent.append(message)
+        return len(messages)
+
+
+class FakeRecaptchaMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fake = FakeRecaptchaServer(rejected={"bad-token"}).start()
+        cls.addClassCleanup(cls.fake.stop)
+        cls.enterClassContext(
+            override_settings(
+                RECAPTCHA_SECRET_KEY="test-secret",
+                RECAPTCHA_VERIFY_URL=cls.fake.url,
+            )
+        )
+
+    def setUp(self):
+        super().setUp()
+        recaptcha.close_clients()
+        self.addCleanup(recaptcha.close_clients)
+        self.fake.requests = self.fake.connections = 0
+
+    def signup_form(self, email, token="good-token"):
+        return {
+            "name": "Ada",
+            "email": email,
+            "password": "secret-pass",
+            "recaptcha_token": token,
+        }
+
+
+class SignupTests(FakeRecaptchaMixin, TestCase):
+    def test_wsgi_signup_reuses_verify_connection(self):
+        for number in range(3):
+            response = self.client.post(
+                reverse("User:signup"), self.signup_form(f"user{number}@example.com")
+            )
+            self.assertRedirects(response, reverse("User:verify_otp"))
+        self.assertEqual(self.fake.requests, 3)
+        self.assertEqual(self.fake.connections, 1)
+
+    async def test_asgi_signup_creates_pending_user(self):
+        response = await self.async_client.post(
+            reverse("User:signup"), self.signup_form("async@example.com")
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], reverse("User:verify_otp"))
+        user = await get_user_model().objects.aget(username="async@example.com")
+        self.assertFalse(user.is_active)
+        self.assertTrue(await UserOTP.objects.filter(user=user).aexists())
+
+    async def test_rejected_token_creates_nothing(self):
+        response = await self.async_client.post(
+            reverse("User:signup"), self.signup_form("bot@example.com", token="bad-token")
+        )
+        self.assertEqual(response["Location"], reverse("User:signup"))
+        self.assertFalse(
+            await get_user_model().objects.filter(username="bot@example.com").aexists()
+        )
+
+    def test_low_score_is_rejected(self):
+        with mock.patch.object(self.fake, "score", 0.1):
+            self.assertEqual(
+                recaptcha.verify("good-token", None), (False, "reCAPTCHA score too low.")
+            )
+
+    def test_unreachable_verify_server_fails_closed(self):
+        with override_settings(RECAPTCHA_VERIFY_URL="http://127.0.0.1:9/", RECAPTCHA_TIMEOUT=1):
+            recaptcha.close_clients()
+            self.assertEqual(
+                recaptcha.verify("good-token", None), (False, "reCAPTCHA verification failed.")
+            )
+
+
+class OutboxTests(FakeRecaptchaMixin, TestCase):
+    def test_signup_queues_otp_instead_of_sending(self):
+        response = self.client.post(reverse("User:signup"), self.signup_form("ada@example.com"))
+        self.assertRedirects(response, reverse("User:verify_otp"))
+        self.assertEqual(mail.outbox, [])
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.to, ["ada@example.com"])
+        otp = get_user_model().objects.get(username="ada@example.com").otps.get()
+        self.assertIn(otp.code, queued.body)
+
+        # The worker recycles connections between batches, which would close
+        # the one holding this test's transaction.
+        with mock.patch("User.management.commands.send_outbox.close_old_connections"):
+            call_command("send_outbox", "--once", stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutgoingEmail.STATUS_SENT)
+        self.assertIsNotNone(queued.sent_at)
+
+    def test_batch_shares_connection_and_retries_failures(self):
+        for address in ("a@example.com", "b@example.com", "c@example.com"):
+            outbox.enqueue_email("Hello", "Body", address)
+        connection = FlakyBackend(fail_for={"b@example.com"})
+
+        with self.assertLogs("User.outbox", "WARNING"):
+            sent, failed = outbox.send_pending(connection=connection)
+
+        self.assertEqual((sent, failed), (2, 1))
+        self.assertEqual([m.to for m in connection.sent], [["a@example.com"], ["c@example.com"]])
+        retry = OutgoingEmail.objects.get(to=["b@example.com"])
+        self.assertEqual(retry.status, OutgoingEmail.STATUS_PENDING)
+        self.assertEqual(retry.attempts, 1)
+        self.assertGreater(retry.next_attempt_at, timezone.now())
+        self.assertIn("SMTPRecipientsRefused", retry.last_error)
+        # Not due yet, so nothing is claimed on the next pass.
+        self.assertEqual(outbox.send_pending(connection=connection), (0, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        queued = outbox.enqueue_email("Hello", "Body", "b@example.com")
+        OutgoingEmail.objects.filter(pk=queued.pk).update(attempts=outbox.MAX_ATTEMPTS - 1)
+        with self.assertLogs("User.outbox", "ERROR"):
+            outbox.send_pending(connection=FlakyBackend(fail_for={"b@example.com"}))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutgoingEmail.STATUS_FAILED)
+
+    def test_claimed_rows_are_not_claimed_twice(self):
+        outbox.enqueue_email("Hello", "Body", "a@example.com")
+        self.assertEqual(len(outbox.claim_batch()), 1)
+        self.assertEqual(outbox.claim_batch(), [])
+
+
+class SocialLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        app = SocialApp.objects.create(provider="google", name="Google", client_id="id")
+        app.sites.add(Site.objects.get_current())
+        owner = User.objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=owner, category=category, title="Notebook", is_public=True
+        )
+        cls.reviewers = []
+        for number in range(3):
+            reviewer = User.objects.create_user(username=f"reviewer{number}@example.com")
+            SocialAccount.objects.create(
+                user=reviewer,
+                provider="google",
+                uid=str(number),
+                extra_data={"picture": f"https://example.com/avatar{number}.png"},
+            )
+            cls.reviewers.append(reviewer)
+
+    def detail_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("Book:detail", args=[self.book.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_review_avatars_take_a_fixed_number_of_queries(self):
+        self.client.force_login(self.book.owner)
+        Review.objects.create(book=self.book, user=self.reviewers[0], rating=5, comment="A")
+        self.detail_queries()
+        _, one_review = self.detail_queries()
+
+        for reviewer in self.reviewers[1:]:
+            Review.objects.create(book=self.book, user=reviewer, rating=4, comment="B")
+        response, three_reviews = self.detail_queries()
+
+        self.assertEqual(three_reviews, one_review)
+        for number in range(3):
+            self.assertContains(response, f"https://example.com/avatar{number}.png")
+
+    def test_social_apps_reload_after_admin_changes(self):
+        from allauth.socialaccount.adapter import get_adapter
+
+        request = self.client.get("/").wsgi_request
+        self.assertEqual(len(get_adapter().list_apps(request, provider="google")), 1)
+        with self.assertNumQueries(0):
+            get_adapter().list_apps(request, provider="google")
+        with self.captureOnCommitCallbacks(execute=True):
+            SocialApp.objects.filter(provider="google").delete()
+        self.assertEqual(get_adapter().list_apps(request, provider="google"), [])
+
+    def test_social_apps_stamp_expires(self):
+        from allauth.socialaccount.adapter import get_adapter
+
+        request = self.client.get("/").wsgi_request
+        get_adapter().list_apps(request, provider="google")
+        # A change made where no signal fires, e.g. by another tool.
+        SocialApp.objects.filter(provider="google").update(name="Renamed")
+        later = time.time() + social.APPS_VERSION_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later):
+            apps = get_adapter().list_apps(request, provider="google")
+        self.assertEqual([app.name for app in apps], ["Renamed"])
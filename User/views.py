@@ -1,20 +1,21 @@
-import json
 import random
 from datetime import timedelta
-from urllib import parse, request
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import get_user_model, login
-from django.core.mail import send_mail
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
+from . import recaptcha
 from .models import UserOTP
+from .outbox import enqueue_email
 
-RECAPTCHA_VERIFY_URL = "https://www.google.com/recaptcha/api/siteverify"
 OTP_TTL_MINUTES = 10
 
 
@@ -22,46 +23,16 @@ def _generate_otp() -> str:
     return f"{random.randint(0, 999999):06d}"
 
 
-def _verify_recaptcha(token: str, remote_ip: str | None) -> tuple[bool, str]:
-    method_name = "_verify_recaptcha"
-    if not token:
-        return False, "Missing reCAPTCHA token."
-    if not settings.RECAPTCHA_SECRET_KEY:
-        return False, "Missing reCAPTCHA secret key."
-
-    payload = {
-        "secret": settings.RECAPTCHA_SECRET_KEY,
-        "response": token,
-    }
-    if remote_ip:
-        payload["remoteip"] = remote_ip
-
-    data = parse.urlencode(payload).encode("utf-8")
-    req = request.Request(RECAPTCHA_VERIFY_URL, data=data)
-    try:
-        with request.urlopen(req, timeout=6) as resp:
-            result = json.loads(resp.read().decode("utf-8"))
-    except Exception:
-        return False, "reCAPTCHA verification failed."
-
-    if not result.get("success"):
-        return False, "reCAPTCHA rejected."
-
-    if result.get("action") and result.get("action") != "signup":
-        return False, "Invalid reCAPTCHA action."
-
-    score = float(result.get("score", 0))
-    if settings.DEBUG:
-        print(
-            f"{method_name} reCAPTCHA score={score} threshold={settings.RECAPTCHA_THRESHOLD}"
-        )
-    if score < settings.RECAPTCHA_THRESHOLD:
-        return False, "reCAPTCHA score too low."
-
-    return True, ""
+async def _verify_recaptcha(request, token: str) -> tuple[bool, str]:
+    remote_ip = request.META.get("REMOTE_ADDR")
+    if isinstance(request, ASGIRequest):
+        return await recaptcha.averify(token, remote_ip)
+    # Under WSGI each request runs in a short-lived event loop, so use the
+    # process-wide sync client from a worker thread instead.
+    return await sync_to_async(recaptcha.verify, thread_sensitive=False)(token, remote_ip)
 
 
-def _send_otp_email(email: str, code: str, verify_link: str) -> None:
+def _queue_otp_email(email: str, code: str, verify_link: str) -> None:
     subject = "Your Book verification code"
     message = (
         "Use this code to verify your account:\n\n"
@@ -69,17 +40,16 @@ def _send_otp_email(email: str, code: str, verify_link: str) -> None:
         f"It expires in {OTP_TTL_MINUTES} minutes.\n\n"
         f"Verify directly with this link:\n{verify_link}"
     )
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-        fail_silently=False,
-    )
+    enqueue_email(subject, message, [email])
 
 
 @require_http_methods(["GET", "POST"])
-def signup(request):
+async def signup(request):
+    """Sign up with an emailed OTP.
+
+    Only the reCAPTCHA round trip is awaited; database work, sessions and
+    rendering run in sync_to_async blocks.
+    """
     if request.method == "POST":
         name = request.POST.get("name", "").strip()
         email = request.POST.get("email", "").strip().lower()
@@ -92,13 +62,20 @@ def signup(request):
             messages.error(request, "Please fill in all fields.")
             return redirect("User:signup")
 
-        ok, error = _verify_recaptcha(token, request.META.get("REMOTE_ADDR"))
+        ok, error = await _verify_recaptcha(request, token)
         if not ok:
             messages.error(request, error)
             return redirect("User:signup")
 
-        User = get_user_model()
-        user = User.objects.filter(username=email).first()
+        return await sync_to_async(_create_pending_user)(request, name, email, password)
+
+    return await sync_to_async(_render_signup)(request)
+
+
+def _create_pending_user(request, name, email, password):
+    User = get_user_model()
+    with transaction.atomic():
+        user = User.objects.select_for_update().filter(username=email).first()
         if user and user.is_active:
             messages.error(request, "An account with this email already exists.")
             return redirect("User:signup")
@@ -128,10 +105,12 @@ def signup(request):
         verify_url = request.build_absolute_uri(
             reverse("User:verify_otp") + f"?uid={user.id}&code={otp}"
         )
-        _send_otp_email(email, otp, verify_url)
-        request.session["pending_user_id"] = user.id
-        return redirect("User:verify_otp")
+        _queue_otp_email(email, otp, verify_url)
+    request.session["pending_user_id"] = user.id
+    return redirect("User:verify_otp")
+
 
+def _render_signup(request):
     filtered_messages = []
     for message in messages.get_messages(request):
         if "Successfully signed in as" in str(message):
@@ -1,5 +1,5 @@
-from .models import Category
+from . import registry
 
 
 def categories(request):
-    return {"categories": Category.objects.all()}
+    return {"categories": registry.all_categories()}
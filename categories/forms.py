@@ -0,0 +1,38 @@
+from django import forms
+from django.forms.models import ModelChoiceIterator
+
+from . import registry
+
+
+class CategoryChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for category in registry.all_categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(registry.all_categories()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(registry.all_categories())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    """Category select whose choices and validation come from the registry."""
+
+    iterator = CategoryChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            return value
+        category = registry.get(value)
+        if category is None:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return category
@@ -0,0 +1,90 @@
+"""In-process registry of categories.
+
+Each worker loads the categories once and keeps them as an ordered tuple.
+A version stamp in the shared cache tells workers when another process
+changed a category, so admin edits show up on the next request without a
+query per template render. The stamp expires after VERSION_TIMEOUT
+seconds, so changes no signal saw, or a stamp evicted from the cache,
+reach every worker within that time too.
+
+``fingerprint`` digests the loaded categories for validators of pages that
+list them; unlike the stamp, it only changes when a category does.
+"""
+import hashlib
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+VERSION_KEY = "categories:version"
+VERSION_TIMEOUT = 60
+
+_lock = threading.Lock()
+_loaded_version = None
+_categories = ()
+_fingerprint = ""
+
+
+def _shared_version() -> str:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=VERSION_TIMEOUT)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def _ashared_version() -> str:
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, uuid.uuid4().hex, timeout=VERSION_TIMEOUT)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def all_categories() -> tuple:
+    """All categories ordered by name, reloaded only when the version moves."""
+    global _loaded_version, _categories, _fingerprint
+    version = _shared_version()
+    if version == _loaded_version:
+        return _categories
+    with _lock:
+        if version != _loaded_version:
+            _categories = tuple(Category.objects.order_by("name"))
+            _fingerprint = hashlib.md5(
+                "\x1f".join(f"{item.pk}:{item.name}" for item in _categories).encode(),
+                usedforsecurity=False,
+            ).hexdigest()
+            _loaded_version = version
+        return _categories
+
+
+def fingerprint() -> str:
+    """A digest of every category's id and name."""
+    all_categories()
+    return _fingerprint
+
+
+async def afingerprint() -> str:
+    """``fingerprint`` for async code; only a reload takes a thread."""
+    if await _ashared_version() != _loaded_version:
+        await sync_to_async(all_categories)()
+    return _fingerprint
+
+
+def get(pk):
+    """Return the category with this primary key, or None."""
+    for category in all_categories():
+        if str(category.pk) == str(pk):
+            return category
+    return None
+
+
+def invalidate() -> None:
+    """Make every worker reload once the current transaction commits."""
+    transaction.on_commit(
+        lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=VERSION_TIMEOUT)
+    )
@@ -0,0 +1,47 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from Book.forms import BookForm
+
+from . import registry
+from .models import Category
+
+
+class CategoryRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_loads_once_and_reloads_after_a_change(self):
+        registry.all_categories()
+        with self.assertNumQueries(0):
+            names = [category.name for category in registry.all_categories()]
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Aardvarks")
+        with self.assertNumQueries(1):
+            reloaded = [category.name for category in registry.all_categories()]
+        self.assertEqual(reloaded, sorted(names + ["Aardvarks"]))
+
+    def test_stamp_expires_so_unsignalled_changes_are_seen(self):
+        category = Category.objects.create(name="Travel")
+        registry.all_categories()
+        Category.objects.filter(pk=category.pk).update(name="Voyages")
+        self.assertEqual(registry.get(category.pk).name, "Travel")
+        later = time.time() + registry.VERSION_TIMEOUT + 1
+        with mock.patch("time.time", return_value=later), self.assertNumQueries(1):
+            self.assertEqual(registry.get(category.pk).name, "Voyages")
+
+    def test_book_form_uses_the_registry(self):
+        category = Category.objects.create(name="Travel")
+        registry.all_categories()
+        with self.assertNumQueries(0):
+            html = str(BookForm()["category"])
+        self.assertIn("Travel", html)
+        form = BookForm(
+            data={"title": "Trip", "description": "Notes", "category": category.pk}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["category"], category)
+        self.assertFalse(BookForm(data={"category": "999999"}).is_valid())
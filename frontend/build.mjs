@@ -0,0 +1,33 @@
+// Bundle, tree-shake and minify the reader and editor scripts into
+// static/Book/dist/. collectstatic then hashes and precompresses them.
+import { build } from "esbuild";
+
+// static/Book/image_resize.js imports the Image extension from esm.sh; the
+// bundle takes the pinned npm copy instead of fetching it at runtime.
+const pinnedTiptapImage = {
+  name: "pinned-tiptap-image",
+  setup(build) {
+    build.onResolve({ filter: /^https:\/\/esm\.sh\/@tiptap\/extension-image@/ }, () =>
+      build.resolve("@tiptap/extension-image", {
+        kind: "import-statement",
+        resolveDir: process.cwd(),
+      }),
+    );
+  },
+};
+
+await build({
+  entryPoints: { reader: "src/reader.js", editor: "src/editor.js" },
+  outdir: "../static/Book/dist",
+  bundle: true,
+  minify: true,
+  treeShaking: true,
+  format: "esm",
+  target: "es2019",
+  sourcemap: "linked",
+  legalComments: "linked",
+  // Only reached by leaf_editor.js's fallback, which the bundle never takes.
+  external: ["https://*", "./image_resize.js"],
+  plugins: [pinnedTiptapImage],
+  logLevel: "info",
+});
@@ -0,0 +1,3 @@
+import "./tiptap.js";
+import "../../static/Book/chunked_upload.js";
+import "../../static/Book/leaf_editor.js";
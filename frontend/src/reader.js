@@ -0,0 +1 @@
+import "../../static/Book/leaf_reader.js";
@@ -0,0 +1,10 @@
+// The TipTap modules leaf_editor.js would otherwise load from esm.sh.
+// Imported before it, so they are in place when the editor starts.
+import { Editor } from "@tiptap/core";
+import { Color } from "@tiptap/extension-color";
+import { TextStyle } from "@tiptap/extension-text-style";
+import { StarterKit } from "@tiptap/starter-kit";
+// The vendored copy, whose resize handles clamp images to the editor width.
+import ImageResize from "../../static/Book/image_resize.js";
+
+window.NotebookTiptap = { Editor, StarterKit, ImageResize, TextStyle, Color };
@@ -0,0 +1,258 @@
+"""Opt-in per-request profiling.
+
+With PROFILING_ENABLED the middleware measures, for every request, SQL
+(count and time, through a connection execute wrapper), the view, template
+rendering, and outbound reCAPTCHA (httpx) and SMTP calls. The numbers go
+out as a ``Server-Timing`` header and one JSON log line on the
+``notebook.profiling`` logger. A PROFILING_SAMPLE_RATE share of requests,
+and requests carrying PROFILING_HEADER from PROFILING_TRUSTED_IPS, are also
+run under cProfile and dumped to PROFILING_DIR for ``python -m pstats``.
+
+When profiling is disabled the middleware removes itself from the chain
+and nothing is patched, so it costs nothing.
+"""
+import contextvars
+import cProfile
+import ipaddress
+import json
+import logging
+import random
+import re
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing metric names and their descriptions.
+METRICS = {
+    "db": "SQL",
+    "view": "View",
+    "tpl": "Templates",
+    "http": "Outbound HTTP",
+    "smtp": "SMTP",
+    "total": "Total",
+}
+
+_current = contextvars.ContextVar("profiling_timings", default=None)
+_installed = False
+
+
+class Timings:
+    """Milliseconds per metric for one request, plus the SQL query count."""
+
+    def __init__(self):
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.queries = 0
+        self.template_depth = 0
+
+    def add(self, metric, started) -> None:
+        self.durations[metric] += (time.perf_counter() - started) * 1000
+
+    def server_timing(self) -> str:
+        parts = []
+        for metric, description in METRICS.items():
+            if metric == "db":
+                description = f"{self.queries} queries"
+            parts.append(f'{metric};dur={self.durations[metric]:.1f};desc="{description}"')
+        return ", ".join(parts)
+
+
+def _timed(metric, function):
+    """Wrap a sync function so its time is added to the current request."""
+
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.add(metric, started)
+
+    return wrapper
+
+
+def _timed_async(metric, function):
+    async def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return await function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        finally:
+            timings.add(metric, started)
+
+    return wrapper
+
+
+def _timed_template(function):
+    """Count only the outermost render; included templates render inside it."""
+
+    def wrapper(self, *args, **kwargs):
+        timings = _current.get()
+        if timings is None or timings.template_depth:
+            return function(self, *args, **kwargs)
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return function(self, *args, **kwargs)
+        finally:
+            timings.template_depth -= 1
+            timings.add("tpl", started)
+
+    return wrapper
+
+
+def install() -> None:
+    """Patch template rendering and the outbound clients, once per process."""
+    global _installed
+    if _installed:
+        return
+    import httpx
+    from django.core.mail.backends.smtp import EmailBackend
+    from django.template.base import Template
+
+    connection_created.connect(_wrap_connection)
+    Template.render = _timed_template(Template.render)
+    httpx.Client.send = _timed("http", httpx.Client.send)
+    httpx.AsyncClient.send = _timed_async("http", httpx.AsyncClient.send)
+    EmailBackend.send_messages = _timed("smtp", EmailBackend.send_messages)
+    _installed = True
+
+
+def _record_sql(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.add("db", started)
+
+
+def _wrap_connection(connection, **kwargs) -> None:
+    # Connections belong to threads; async views query from sync_to_async
+    # threads, so every connection gets the wrapper and it finds the
+    # request through the context variable.
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+def client_ip(request) -> str:
+    """The client address, taken from X-Forwarded-For only behind a trusted proxy."""
+    remote = request.META.get("REMOTE_ADDR", "")
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if forwarded and remote in settings.PROFILING_TRUSTED_PROXIES:
+        return forwarded.split(",")[-1].strip()
+    return remote
+
+
+def _trusted(ip) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.PROFILING_TRUSTED_IPS
+    )
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings, profiler, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        return self._finish(request, response, timings, profiler, started)
+
+    async def __acall__(self, request):
+        timings, profiler, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        return self._finish(request, response, timings, profiler, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profiling_view_started = time.perf_counter()
+
+    def _start(self, request):
+        timings = Timings()
+        _current.set(timings)
+        for connection in connections.all(initialized_only=True):
+            _wrap_connection(connection)
+        profiler = None
+        if self._should_profile(request):
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return timings, profiler, time.perf_counter()
+
+    def _should_profile(self, request) -> bool:
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate and random.random() < rate:
+            return True
+        return bool(request.headers.get(settings.PROFILING_HEADER)) and _trusted(
+            client_ip(request)
+        )
+
+    def _finish(self, request, response, timings, profiler, started):
+        view_started = getattr(request, "_profiling_view_started", None)
+        if view_started is not None:
+            timings.add("view", view_started)
+        timings.add("total", started)
+        _current.set(None)
+
+        dump = self._dump(request, profiler, timings) if profiler is not None else ""
+        response["Server-Timing"] = timings.server_timing()
+        if dump and request.headers.get(settings.PROFILING_HEADER):
+            response["X-Profile-Dump"] = dump
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": timings.queries,
+            **{f"{metric}_ms": round(value, 1) for metric, value in timings.durations.items()},
+        }
+        if dump:
+            record["profile"] = dump
+        logger.info(json.dumps(record))
+        return response
+
+    def _dump(self, request, profiler, timings) -> str:
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", request.path).strip("-") or "root"
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug[:60]}"
+            f"-{timings.durations['total']:.0f}ms-{random.getrandbits(24):06x}.prof"
+        )
+        profiler.dump_stats(directory / name)
+        return name
@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
     'Book',
     'User',
     'reviews',
+    'search',
     'allauth',
     'allauth.account',
     'allauth.socialaccount',
@@ -55,6 +58,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its totals cover every other middleware. Removes itself
+    # unless PROFILING_ENABLED.
+    'notebook.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,13 +95,122 @@ WSGI_APPLICATION = 'notebook.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite unless DATABASE_BACKEND=postgres, which needs psycopg 3 (in
+# requirements.txt) and a database created as in deploy/postgres.txt.
+# Each worker process keeps a psycopg pool of POSTGRES_POOL_MIN_SIZE to
+# POSTGRES_POOL_MAX_SIZE connections; with POSTGRES_POOL=False it keeps one
+# persistent connection per thread for CONN_MAX_AGE seconds instead (use
+# that behind pgbouncer).
+DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "sqlite")
+# Run on every new SQLite connection. WAL lets pages be read while a write
+# is in progress; with it, synchronous=NORMAL only risks the last commits
+# on an OS crash or power loss, never corruption. busy_timeout (ms) is how
+# long a writer waits for the lock before "database is locked".
+# benchmark_sqlite_concurrency measures the effect; sqlite_maintenance
+# runs PRAGMA optimize and truncates the WAL.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "20000")),
+    'mmap_size': int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    # Negative: in KiB rather than pages.
+    'cache_size': -int(os.environ.get("SQLITE_CACHE_KIB", "32768")),
+    'temp_store': 'MEMORY',
+}
+if DATABASE_BACKEND == "postgres":
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get("POSTGRES_DB", "notebook"),
+        'USER': os.environ.get("POSTGRES_USER", "notebook"),
+        'PASSWORD': os.environ.get("POSTGRES_PASSWORD", ""),
+        'HOST': os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+        'PORT': os.environ.get("POSTGRES_PORT", "5432"),
+        'OPTIONS': {},
+    }
+    if os.environ.get("POSTGRES_POOL", "True") == "True":
+        _postgres['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get("POSTGRES_POOL_MIN_SIZE", "2")),
+            'max_size': int(os.environ.get("POSTGRES_POOL_MAX_SIZE", "10")),
+            # Seconds a request waits for a free connection before failing.
+            'timeout': float(os.environ.get("POSTGRES_POOL_TIMEOUT", "10")),
+        }
+    else:
+        _postgres['CONN_MAX_AGE'] = int(os.environ.get("CONN_MAX_AGE", "600"))
+        _postgres['CONN_HEALTH_CHECKS'] = True
+    DATABASES = {'default': _postgres}
+elif DATABASE_BACKEND == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Take the write lock when a transaction begins so concurrent
+                # read-then-write atomic blocks wait instead of failing "locked".
+                # Django 5.1+ (see requirements.txt).
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(
+                    f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()
+                ),
+            },
+            # A file rather than shared-cache memory, so tests that write from
+            # several threads see the same locking as production.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown DATABASE_BACKEND {DATABASE_BACKEND!r}.")
+
+# Rendered book fragments, the catalogue generation and the category and
+# SocialApp version stamps live in the cache (see Book/caching.py), so every
+# worker must share it: "file", or "redis" (needs `pip install redis`).
+# locmem is per process and only allowed with DEBUG or under `manage.py test`.
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "notebook"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", str(BASE_DIR / "cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://127.0.0.1:6379/1"),
+}
+TESTING = sys.argv[1:2] == ["test"]
+CACHE_BACKEND = os.environ.get(
+    "CACHE_BACKEND", "locmem" if DEBUG or TESTING else "file"
+)
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}.")
+if CACHE_BACKEND == "locmem" and not (DEBUG or TESTING):
+    raise ImproperlyConfigured(
+        "CACHE_BACKEND=locmem is per process; use file or redis unless DEBUG is True."
+    )
+_cache_backend, _cache_location = CACHE_BACKENDS[CACHE_BACKEND]
+CACHES = {
+    "default": {
+        "BACKEND": _cache_backend,
+        "LOCATION": os.environ.get("CACHE_LOCATION", _cache_location),
+    }
+}
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", "600"))
+
+# Per-request Server-Timing headers, JSON log lines and sampled cProfile
+# dumps (see notebook/profiling.py). PROFILING_HEADER only triggers a dump
+# from PROFILING_TRUSTED_IPS; behind a proxy listed in
+# PROFILING_TRUSTED_PROXIES the client address comes from X-Forwarded-For.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "False") == "True"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_HEADER = os.environ.get("PROFILING_HEADER", "X-Profile")
+PROFILING_TRUSTED_IPS = [
+    ip for ip in os.environ.get("PROFILING_TRUSTED_IPS", "").split(",") if ip
+]
+PROFILING_TRUSTED_PROXIES = [
+    ip for ip in os.environ.get("PROFILING_TRUSTED_PROXIES", "127.0.0.1").split(",") if ip
+]
+PROFILING_DIR = os.environ.get("PROFILING_DIR", str(BASE_DIR / "profiles"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "notebook.profiling": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
 }
-
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -169,6 +284,23 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Uploads are stored once per unique content; see Book/storage.py.
+STORAGES = {
+    "default": {"BACKEND": "Book.storage.DedupStorage"},
+    # Hashed names plus .gz/.br copies; see notebook/staticfiles.py.
+    "staticfiles": {"BACKEND": "notebook.staticfiles.PrecompressedManifestStaticFilesStorage"},
+}
+
+# Resized copies of uploaded images are generated in a background thread pool.
+IMAGE_DERIVATIVES_ASYNC = os.environ.get("IMAGE_DERIVATIVES_ASYNC", "True") == "True"
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get("IMAGE_DERIVATIVE_WORKERS", "2"))
+
+# Chunked uploads (Book/chunked.py) are written here until finalized; the
+# directory must not be served. clear_upload_sessions removes stale ones.
+CHUNKED_UPLOAD_DIR = os.environ.get("CHUNKED_UPLOAD_DIR", str(BASE_DIR / "chunked-uploads"))
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get("CHUNKED_UPLOAD_MAX_SIZE", str(25 * 1024 * 1024)))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.environ.get("CHUNKED_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
@@ -183,3 +315,8 @@ DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
 RECAPTCHA_SITE_KEY = os.environ.get("RECAPTCHA_SITE_KEY", "")
 RECAPTCHA_SECRET_KEY = os.environ.get("RECAPTCHA_SECRET_KEY", "")
 RECAPTCHA_THRESHOLD = float(os.environ.get("RECAPTCHA_THRESHOLD", "0.5"))
+RECAPTCHA_VERIFY_URL = os.environ.get(
+    "RECAPTCHA_VERIFY_URL", "https://www.google.com/recaptcha/api/siteverify"
+)
+RECAPTCHA_TIMEOUT = float(os.environ.get("RECAPTCHA_TIMEOUT", "6"))
+RECAPTCHA_MAX_CONNECTIONS = int(os.environ.get("RECAPTCHA_MAX_CONNECTIONS", "20"))
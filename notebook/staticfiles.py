@@ -0,0 +1,61 @@
+"""Static files with content hashes and precompressed copies.
+
+collectstatic names every file after its content hash (through
+ManifestStaticFilesStorage) and then writes ``.gz`` and, when the Brotli
+package is installed, ``.br`` copies of the hashed text files next to them.
+nginx serves those with gzip_static/brotli_static and far-future cache
+headers (deploy/proxy-rev.txt); a changed file gets a new name, so browsers
+never have to revalidate.
+
+Until collectstatic has run (development, tests) there is no manifest and
+``{% static %}`` points at the unhashed source files.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (".js", ".mjs", ".css", ".svg", ".map", ".json", ".txt", ".html")
+# Smaller files gain nothing from compression once headers are counted.
+MIN_SIZE = 512
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            for compressed in self._compress(name):
+                yield name, compressed, True
+
+    def _compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        if len(data) < MIN_SIZE:
+            return
+        encoders = [(".gz", lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            encoders.append((".br", lambda raw: brotli.compress(raw, quality=11)))
+        for suffix, encode in encoders:
+            encoded = encode(data)
+            # Only keep copies that save something worth a lookup.
+            if len(encoded) >= len(data) * 0.95:
+                continue
+            compressed = name + suffix
+            if self.exists(compressed):
+                self.delete(compressed)
+            self._save(compressed, ContentFile(encoded))
+            yield compressed
@@ -0,0 +1,122 @@
+import gzip
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from Book.models import Book
+from categories.models import Category
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_TRUSTED_IPS=["127.0.0.1/32"])
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(
+            owner=owner, category=category, title="Notebook", is_public=True
+        )
+
+    def setUp(self):
+        self.dump_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dump_dir, ignore_errors=True)
+
+    def metrics(self, response) -> dict:
+        metrics = {}
+        for part in response["Server-Timing"].split(", "):
+            name, duration, description = part.split(";")
+            metrics[name] = (float(duration.split("=")[1]), description)
+        return metrics
+
+    def test_reports_sql_templates_and_view_time(self):
+        with self.settings(PROFILING_DIR=self.dump_dir), self.assertLogs(
+            "notebook.profiling", "INFO"
+        ) as logs:
+            response = self.client.get(reverse("Book:detail", args=[self.book.pk]))
+        metrics = self.metrics(response)
+        self.assertEqual(set(metrics), {"db", "view", "tpl", "http", "smtp", "total"})
+        self.assertRegex(metrics["db"][1], r'desc="[1-9]\d* queries"')
+        self.assertGreater(metrics["tpl"][0], 0)
+        self.assertGreaterEqual(metrics["total"][0], metrics["view"][0])
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record["path"], record["status"]), (response.wsgi_request.path, 200))
+        self.assertNotIn("X-Profile-Dump", response)
+        self.assertEqual(list(Path(self.dump_dir).iterdir()), [])
+
+    def test_header_from_a_trusted_ip_writes_a_profile(self):
+        url = reverse("Book:detail", args=[self.book.pk])
+        with self.settings(PROFILING_DIR=self.dump_dir), self.assertLogs("notebook.profiling"):
+            response = self.client.get(url, headers={"X-Profile": "1"})
+            self.assertTrue((Path(self.dump_dir) / response["X-Profile-Dump"]).exists())
+            with self.settings(PROFILING_TRUSTED_IPS=["10.0.0.0/8"]):
+                response = self.client.get(url, headers={"X-Profile": "1"})
+        self.assertNotIn("X-Profile-Dump", response)
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        settings_override = override_settings(STATIC_ROOT=static_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = Path(static_root)
+
+    def test_uncollected_files_keep_their_names(self):
+        self.assertEqual(static("Book/leaf_reader.js"), "/static/Book/leaf_reader.js")
+        html = Template('{% load bundles %}{% bundle "reader" %}').render(Context())
+        self.assertEqual(html, '<script type="module" src="/static/Book/leaf_reader.js"></script>')
+
+    def test_collectstatic_hashes_and_precompresses(self):
+        call_command("collectstatic", "--noinput", verbosity=0)
+        url = static("Book/base.css")
+        self.assertRegex(url, r"^/static/Book/base\.[0-9a-f]{12}\.css$")
+        hashed = self.root / url.removeprefix("/static/")
+        original = hashed.read_bytes()
+        self.assertEqual(gzip.decompress((hashed.parent / f"{hashed.name}.gz").read_bytes()), original)
+        self.assertTrue((hashed.parent / f"{hashed.name}.br").exists())
+        image = self.root / staticfiles_storage.stored_name("back.png")
+        self.assertFalse((image.parent / f"{image.name}.gz").exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite only")
+class SQLiteProfileTests(TransactionTestCase):
+    # Outside a transaction: the WAL cannot be checkpointed inside one.
+    def test_connections_use_the_tuned_pragmas(self):
+        # SQLite reports synchronous=NORMAL as 1 and temp_store=MEMORY as 2.
+        expected = {**settings.SQLITE_PRAGMAS, "synchronous": 1, "temp_store": 2}
+        with connection.cursor() as cursor:
+            for name, value in expected.items():
+                cursor.execute(f"PRAGMA {name}")
+                self.assertEqual(str(cursor.fetchone()[0]).lower(), str(value).lower())
+
+    def test_maintenance_optimizes_and_checkpoints(self):
+        out = StringIO()
+        call_command("sqlite_maintenance", stdout=out)
+        self.assertIn("Optimized", out.getvalue())
+
+    def test_concurrency_benchmark_reports_both_profiles(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = Path(directory) / "sqlite.json"
+        call_command(
+            "benchmark_sqlite_concurrency", "--writers", "2", "--readers", "1",
+            "--seconds", "0.2", "--books", "2", "--output", str(output), stdout=StringIO(),
+        )
+        results = json.loads(output.read_text())["results"]
+        self.assertEqual(set(results), {"default", "tuned"})
+        self.assertEqual(results["tuned"]["write"]["lock_errors"], 0)
+        self.assertGreater(results["tuned"]["read"]["ops"], 0)
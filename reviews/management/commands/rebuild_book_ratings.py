@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Book.models import Book, touch_books
+from reviews.ratings import RATING_FIELDS, compute_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized rating aggregates stored on Book from Review rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of books processed per transaction.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report books whose stored aggregates drifted; do not write.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        check_only = options["check"]
+
+        drifted = 0
+        scanned = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                books = list(
+                    Book.objects.filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .only("pk", *RATING_FIELDS)[:chunk_size]
+                )
+                if not books:
+                    break
+                last_id = books[-1].pk
+                scanned += len(books)
+                expected = compute_ratings([book.pk for book in books])
+                stale = []
+                for book in books:
+                    values = expected[book.pk]
+                    if all(_same(getattr(book, f), values[f]) for f in RATING_FIELDS):
+                        continue
+                    stale.append(book)
+                    if check_only:
+                        self.stdout.write(f"Book {book.pk} drifted: {_describe(book, values)}")
+                    for field in RATING_FIELDS:
+                        setattr(book, field, values[field])
+                drifted += len(stale)
+                if stale and not check_only:
+                    Book.objects.bulk_update(stale, RATING_FIELDS)
+                    touch_books(book.pk for book in stale)
+
+        if check_only:
+            if drifted:
+                raise CommandError(f"{drifted} of {scanned} books have drifted ratings.")
+            self.stdout.write(self.style.SUCCESS(f"Checked {scanned} books, no drift."))
+            return
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt ratings for {scanned} books, {drifted} corrected.")
+        )
+
+
+def _same(stored, expected) -> bool:
+    if stored is None or expected is None:
+        return stored is expected
+    return abs(stored - expected) < 1e-9
+
+
+def _describe(book, values) -> str:
+    return ", ".join(
+        f"{field}={getattr(book, field)!r}->{values[field]!r}"
+        for field in RATING_FIELDS
+        if not _same(getattr(book, field), values[field])
+    )
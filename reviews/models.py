@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 
 from Book.models import Book
 
@@ -24,3 +24,16 @@ class Review(models.Model):
 
     def __str__(self) -> str:
         return f"Review {self.rating}/5 for {self.book.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "book_id" in field_names and "rating" in field_names:
+            instance._loaded_rating = (instance.book_id, instance.rating)
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The Book rating aggregates are updated by the post_save receiver;
+        # keep both writes in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
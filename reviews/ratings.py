@@ -0,0 +1,73 @@
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from Book.models import Book
+
+STARS = range(1, 6)
+RATING_FIELDS = (
+    "rating_sum",
+    "rating_count",
+    "rating_avg",
+    *(f"rating_{stars}_count" for stars in STARS),
+)
+
+
+def apply_rating_change(book_id, added=None, removed=None) -> None:
+    """Shift the stored aggregates of a book by one added and/or removed rating.
+
+    Every value is computed from the columns as they were before the UPDATE,
+    so concurrent reviews on the same book cannot lose increments.
+    """
+    sum_delta = (added or 0) - (removed or 0)
+    count_delta = (added is not None) - (removed is not None)
+    updates = {}
+    if sum_delta:
+        updates["rating_sum"] = F("rating_sum") + sum_delta
+    if count_delta:
+        updates["rating_count"] = F("rating_count") + count_delta
+    for stars in STARS:
+        star_delta = (added == stars) - (removed == stars)
+        if star_delta:
+            field = f"rating_{stars}_count"
+            updates[field] = F(field) + star_delta
+    if not updates:
+        return
+    new_sum = F("rating_sum") + sum_delta
+    new_count = F("rating_count") + count_delta
+    updates["rating_avg"] = Case(
+        When(Q(rating_count__lte=-count_delta), then=Value(None)),
+        default=Cast(new_sum, FloatField()) / new_count,
+        output_field=FloatField(),
+    )
+    Book.objects.filter(pk=book_id).update(**updates)
+
+
+def compute_ratings(book_ids) -> dict[int, dict]:
+    """Aggregate the reviews of the given books into Book rating field values."""
+    from .models import Review
+
+    rows = (
+        Review.objects.filter(book_id__in=book_ids)
+        .order_by()
+        .values("book_id")
+        .annotate(
+            rating_sum=Sum("rating"),
+            rating_count=Count("id"),
+            **{
+                f"rating_{stars}_count": Count("id", filter=Q(rating=stars))
+                for stars in STARS
+            },
+        )
+    )
+    values = {book_id: empty_ratings() for book_id in book_ids}
+    for row in rows:
+        book_id = row.pop("book_id")
+        row["rating_avg"] = row["rating_sum"] / row["rating_count"]
+        values[book_id] = row
+    return values
+
+
+def empty_ratings() -> dict:
+    values = {field: 0 for field in RATING_FIELDS}
+    values["rating_avg"] = None
+    return values
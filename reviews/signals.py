@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from Book import caching
+from Book.models import deleted_with_book, touch_books
+
+from .models import Review
+from .ratings import apply_rating_change
+
+
+@receiver(pre_save, sender=Review)
+def remember_stored_rating(sender, instance, **kwargs):
+    if not instance._state.adding and not hasattr(instance, "_loaded_rating"):
+        instance._loaded_rating = (
+            Review.objects.filter(pk=instance.pk).values_list("book_id", "rating").first()
+        )
+    # update_book_rating_on_save replaces _loaded_rating before
+    # invalidate_reviewed_book runs, which needs the book a moved review left.
+    loaded = getattr(instance, "_loaded_rating", None)
+    instance._previous_book_id = loaded[0] if loaded else None
+
+
+@receiver(post_save, sender=Review)
+def update_book_rating_on_save(sender, instance, created, **kwargs):
+    loaded = getattr(instance, "_loaded_rating", None)
+    if created or loaded is None:
+        apply_rating_change(instance.book_id, added=instance.rating)
+    elif loaded != (instance.book_id, instance.rating):
+        loaded_book_id, loaded_rating = loaded
+        if loaded_book_id == instance.book_id:
+            apply_rating_change(
+                instance.book_id, added=instance.rating, removed=loaded_rating
+            )
+        else:
+            apply_rating_change(loaded_book_id, removed=loaded_rating)
+            apply_rating_change(instance.book_id, added=instance.rating)
+    instance._loaded_rating = (instance.book_id, instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_book_rating_on_delete(sender, instance, origin=None, **kwargs):
+    if deleted_with_book(origin):
+        return
+    loaded_book_id, loaded_rating = getattr(
+        instance, "_loaded_rating", (instance.book_id, instance.rating)
+    )
+    apply_rating_change(loaded_book_id, removed=loaded_rating)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviewed_book(sender, instance, origin=None, **kwargs):
+    if deleted_with_book(origin):
+        return
+    # Cards show the average rating, so the catalogue changes too.
+    touch_books({instance.book_id, getattr(instance, "_previous_book_id", None)} - {None})
+    caching.bump_on_commit(caching.CATALOGUE)
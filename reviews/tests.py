@@ -0,0 +1,96 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from Book.models import Book
+from categories.models import Category
+
+from .models import Review
+from .ratings import RATING_FIELDS, compute_ratings
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username="owner@example.com")
+        cls.alice = User.objects.create_user(username="alice@example.com")
+        cls.bob = User.objects.create_user(username="bob@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.book = Book.objects.create(owner=cls.owner, category=category, title="One")
+        cls.other = Book.objects.create(owner=cls.owner, category=category, title="Two")
+
+    def assertRatings(self, book, expected_ratings):
+        book.refresh_from_db()
+        expected = compute_ratings([book.pk])[book.pk]
+        self.assertEqual({field: getattr(book, field) for field in RATING_FIELDS}, expected)
+        self.assertEqual(book.rating_count, len(expected_ratings))
+        self.assertEqual(book.rating_sum, sum(expected_ratings))
+        for stars in range(1, 6):
+            self.assertEqual(
+                book.rating_histogram[stars], expected_ratings.count(stars), stars
+            )
+
+    def test_create_and_rating_change(self):
+        review = Review.objects.create(book=self.book, user=self.alice, rating=4)
+        Review.objects.create(book=self.book, user=self.bob, rating=1)
+        self.assertRatings(self.book, [4, 1])
+        self.assertEqual(self.book.rating_avg, 2.5)
+
+        review.rating = 5
+        review.save()
+        self.assertRatings(self.book, [5, 1])
+        self.assertEqual(self.book.rating_avg, 3.0)
+
+        review.comment = "Still good."
+        review.save()
+        self.assertRatings(self.book, [5, 1])
+
+    def test_moving_a_review_to_another_book(self):
+        review = Review.objects.create(book=self.book, user=self.alice, rating=3)
+        review = Review.objects.get(pk=review.pk)
+        versions = dict(Book.objects.values_list("pk", "content_version"))
+        review.book = self.other
+        review.rating = 2
+        review.save()
+        for book in (self.book, self.other):
+            book.refresh_from_db()
+            self.assertEqual(book.content_version, versions[book.pk] + 1)
+        self.assertRatings(self.book, [])
+        self.assertIsNone(self.book.rating_avg)
+        self.assertRatings(self.other, [2])
+
+    def test_delete_and_user_cascade(self):
+        kept = Review.objects.create(book=self.book, user=self.alice, rating=5)
+        Review.objects.create(book=self.book, user=self.bob, rating=2)
+        Review.objects.create(book=self.other, user=self.bob, rating=4)
+
+        kept.delete()
+        self.assertRatings(self.book, [2])
+
+        self.bob.delete()
+        self.assertRatings(self.book, [])
+        self.assertIsNone(self.book.rating_avg)
+        self.assertRatings(self.other, [])
+
+    def test_rebuild_reports_and_repairs_drift(self):
+        Review.objects.create(book=self.book, user=self.alice, rating=4)
+        Book.objects.filter(pk=self.book.pk).update(rating_sum=40, rating_4_count=0)
+        Review.objects.create(book=self.other, user=self.alice, rating=3)
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, "1 of 2 books have drifted ratings."):
+            call_command("rebuild_book_ratings", "--check", stdout=out)
+        self.assertIn(f"Book {self.book.pk} drifted: rating_sum=40->4", out.getvalue())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_sum, 40)
+
+        out = StringIO()
+        call_command("rebuild_book_ratings", "--chunk-size", "1", stdout=out)
+        self.assertIn("Rebuilt ratings for 2 books, 1 corrected.", out.getvalue())
+        self.assertRatings(self.book, [4])
+        self.assertRatings(self.other, [3])
+        call_command("rebuild_book_ratings", "--check", stdout=StringIO())
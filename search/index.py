@@ -0,0 +1,189 @@
+"""SQLite FTS5 index over book metadata and leaf text.
+
+Each book has one row (title + description) and each leaf one row (its
+plain text). Row ids are derived from the primary keys so a single row can
+be replaced without scanning the table. On databases other than SQLite the
+index is not maintained and searches fall back to ``icontains``; on
+PostgreSQL the pg_trgm indexes from migration 0002 serve those lookups and
+results are ranked by trigram similarity to the title.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from Book.models import Leaf
+
+TABLE = "search_index"
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+# Title matches weigh more than description/leaf text in bm25().
+RANK_SQL = f"bm25({TABLE}, 10.0, 1.0)"
+SNIPPET_SQL = f"snippet({TABLE}, -1, char(2), char(3), '…', {SNIPPET_TOKENS})"
+
+
+def is_available() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def book_rowid(book_id: int) -> int:
+    return book_id * 2 + 1
+
+
+def leaf_rowid(leaf_id: int) -> int:
+    return leaf_id * 2
+
+
+def match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query: every term required, last one as prefix."""
+    terms = re.findall(r"\w+", query.lower())[:MAX_TERMS]
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def index_books(books) -> None:
+    rows = [
+        (book_rowid(book.pk), book.title, book.description, book.pk, None)
+        for book in books
+    ]
+    _replace(rows)
+
+
+def index_leaves(leaves) -> None:
+    rows = [
+        (leaf_rowid(leaf.pk), "", leaf.plain_text, leaf.book_id, leaf.pk)
+        for leaf in leaves
+    ]
+    _replace(rows)
+
+
+def remove_book(book_id: int) -> None:
+    """Drop the rows of a book and of all its leaves."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE book_id = %s", [book_id])
+
+
+def remove_leaf(leaf_id: int) -> None:
+    _delete([leaf_rowid(leaf_id)])
+
+
+def clear() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+
+def optimize() -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def filter_books(queryset, query: str):
+    """Restrict a Book queryset to books whose metadata or leaves match."""
+    if not is_available():
+        # A subquery rather than a join, so each condition can use its own
+        # index and no DISTINCT is needed.
+        matching_leaves = Leaf.objects.filter(plain_text__icontains=query).values("book_id")
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(description__icontains=query)
+            | Q(pk__in=matching_leaves)
+        )
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT book_id FROM {TABLE} WHERE {TABLE} MATCH %s", [match])
+    )
+
+
+def search_books(queryset, query: str, limit: int = 50) -> list:
+    """Return up to ``limit`` books from ``queryset`` ranked by relevance.
+
+    Each book gets ``search_snippet`` (safe HTML with ``<mark>`` around hits)
+    and ``search_leaf_id`` (the best matching leaf, or None for metadata).
+    """
+    if not is_available():
+        books = filter_books(queryset, query)
+        if connection.vendor == "postgresql":
+            # Imported here: it needs psycopg, which SQLite installs lack.
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            books = books.order_by(TrigramWordSimilarity(query, "title").desc(), "-updated_at")
+        books = list(books[:limit])
+        for book in books:
+            book.search_snippet = ""
+            book.search_leaf_id = None
+        return books
+    match = match_expression(query)
+    if not match:
+        return []
+
+    hits = {}
+    batch_size = limit * 4
+    offset = 0
+    while len(hits) < limit:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT book_id, leaf_id, {SNIPPET_SQL} FROM {TABLE} "
+                f"WHERE {TABLE} MATCH %s ORDER BY {RANK_SQL} LIMIT %s OFFSET %s",
+                [match, batch_size, offset],
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        offset += batch_size
+        candidates = {}
+        for book_id, leaf_id, snippet in rows:
+            if book_id not in hits and book_id not in candidates:
+                candidates[book_id] = (leaf_id, snippet)
+        visible = set(
+            queryset.filter(pk__in=candidates).values_list("pk", flat=True)
+        )
+        for book_id, hit in candidates.items():
+            if book_id in visible and len(hits) < limit:
+                hits[book_id] = hit
+        if len(rows) < batch_size:
+            break
+
+    books = queryset.model.objects.in_bulk(list(hits))
+    results = []
+    for book_id, (leaf_id, snippet) in hits.items():
+        book = books.get(book_id)
+        if book is None:
+            continue
+        book.search_snippet = _highlight(snippet)
+        book.search_leaf_id = leaf_id
+        results.append(book)
+    return results
+
+
+def _highlight(snippet: str):
+    return mark_safe(
+        escape(snippet or "").replace("\x02", "<mark>").replace("\x03", "</mark>")
+    )
+
+
+def _replace(rows) -> None:
+    if not rows:
+        return
+    _delete([row[0] for row in rows])
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, body, book_id, leaf_id) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def _delete(rowids) -> None:
+    if not rowids:
+        return
+    placeholders = ", ".join(["%s"] * len(rowids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({placeholders})", rowids)
@@ -0,0 +1,115 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from Book.models import Book, Leaf
+from categories.models import Category
+from search import index
+
+SYLLABLES = "ka lo mi ne ru sa te vi do pe la mo ri su ta".split()
+VOCABULARY_SIZE = 20_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full-text index with the old icontains search on synthetic "
+        "data. Everything is created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--leaves-per-book", type=int, default=2)
+        parser.add_argument("--queries", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not index.is_available():
+            raise CommandError("The full-text index is only maintained on SQLite.")
+        rng = random.Random(options["seed"])
+        vocabulary = sorted(
+            {
+                "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                for _ in range(VOCABULARY_SIZE)
+            }
+        )
+        rng.shuffle(vocabulary)
+        # Zipf-like word frequencies, as in natural text.
+        weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1))
+        )
+        with transaction.atomic():
+            self._populate(
+                rng, vocabulary, weights, options["books"], options["leaves_per_book"]
+            )
+            queries = [
+                " ".join(rng.choices(vocabulary[:2000], k=rng.randint(1, 2)))
+                for _ in range(options["queries"])
+            ]
+            public = Book.objects.filter(is_public=True)
+
+            def icontains(query):
+                # The list views used to render every match.
+                return list(
+                    public.filter(
+                        Q(title__icontains=query) | Q(description__icontains=query)
+                    ).order_by("-updated_at")
+                )
+
+            def fts(query):
+                return index.search_books(public, query, limit=50)
+
+            for label, run in (("icontains", icontains), ("fts5", fts)):
+                timings = []
+                for query in queries:
+                    started = time.perf_counter()
+                    run(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{label:>10}: median {statistics.median(timings):8.2f} ms  "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:8.2f} ms  "
+                    f"max {timings[-1]:8.2f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def _populate(self, rng, vocabulary, weights, book_count, leaves_per_book):
+        started = time.perf_counter()
+        owner = get_user_model().objects.create_user(username="search-benchmark")
+        category = Category.objects.create(name="Search benchmark")
+
+        def sentence(words):
+            return " ".join(rng.choices(vocabulary, cum_weights=weights, k=words))
+
+        batch_size = 2000
+        for start in range(0, book_count, batch_size):
+            books = Book.objects.bulk_create(
+                [
+                    Book(
+                        owner=owner,
+                        category=category,
+                        title=sentence(3)[:50],
+                        description=sentence(20)[:200],
+                        is_public=rng.random() < 0.8,
+                    )
+                    for _ in range(min(batch_size, book_count - start))
+                ]
+            )
+            index.index_books(books)
+            leaves = Leaf.objects.bulk_create(
+                [
+                    Leaf(book=book, plain_text=sentence(120))
+                    for book in books
+                    for _ in range(leaves_per_book)
+                ]
+            )
+            index.index_leaves(leaves)
+        self.stdout.write(
+            f"Created {book_count} books and {book_count * leaves_per_book} leaves "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
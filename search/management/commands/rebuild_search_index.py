@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Book.models import Book, Leaf
+from Book.tiptap import plain_text
+from search import index
+
+
+class Command(BaseCommand):
+    help = "Re-extract leaf text and rebuild the full-text search index in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of rows indexed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive.")
+        if not index.is_available():
+            raise CommandError("The full-text index is only maintained on SQLite.")
+
+        index.clear()
+        books = 0
+        for chunk in _chunks(Book.objects.only("pk", "title", "description"), chunk_size):
+            with transaction.atomic():
+                index.index_books(chunk)
+            books += len(chunk)
+
+        leaves = 0
+        extracted = 0
+        queryset = Leaf.objects.only("pk", "book_id", "text", "content_json", "plain_text")
+        for chunk in _chunks(queryset, chunk_size):
+            changed = []
+            for leaf in chunk:
+                text = plain_text(leaf.content_json) or leaf.text
+                if text != leaf.plain_text:
+                    leaf.plain_text = text
+                    changed.append(leaf)
+            with transaction.atomic():
+                if changed:
+                    Leaf.objects.bulk_update(changed, ["plain_text"])
+                index.index_leaves(chunk)
+            leaves += len(chunk)
+            extracted += len(changed)
+
+        index.optimize()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {books} books and {leaves} leaves "
+                f"({extracted} leaf texts re-extracted)."
+            )
+        )
+
+
+def _chunks(queryset, size):
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_id).order_by("pk")[:size])
+        if not chunk:
+            return
+        last_id = chunk[-1].pk
+        yield chunk
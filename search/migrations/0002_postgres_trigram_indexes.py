@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# On PostgreSQL search runs as icontains lookups, which Django writes as
+# UPPER(column::text) LIKE UPPER(pattern). pg_trgm GIN indexes on that
+# expression serve them without scanning every book and leaf.
+INDEXES = {
+    "book_title_trgm_idx": ("Book_book", "title"),
+    "book_description_trgm_idx": ("Book_book", "description"),
+    "leaf_plain_text_trgm_idx": ("Book_leaf", "plain_text"),
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, (table, column) in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" '
+            f'USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("Book", "0021_book_content_version"),
+        ("search", "0001_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
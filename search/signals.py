@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Book.models import Book, Leaf, deleted_with_book
+
+from . import index
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    if raw or not index.is_available():
+        return
+    index.index_books([instance])
+
+
+@receiver(post_delete, sender=Book)
+def remove_deleted_book(sender, instance, **kwargs):
+    if index.is_available():
+        index.remove_book(instance.pk)
+
+
+@receiver(post_save, sender=Leaf)
+def index_saved_leaf(sender, instance, raw=False, **kwargs):
+    if raw or not index.is_available():
+        return
+    index.index_leaves([instance])
+
+
+@receiver(post_delete, sender=Leaf)
+def remove_deleted_leaf(sender, instance, origin=None, **kwargs):
+    # Deleting a book removes the rows of all its leaves at once.
+    if index.is_available() and not deleted_with_book(origin):
+        index.remove_leaf(instance.pk)
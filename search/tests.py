@@ -0,0 +1,141 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from Book.models import Book, Leaf
+from categories.models import Category
+
+from . import index
+
+
+def leaf_doc(text):
+    return {
+        "type": "doc",
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}],
+    }
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user(username="owner@example.com")
+        category, _ = Category.objects.get_or_create(name="General")
+        cls.titled = Book.objects.create(
+            owner=owner, category=category, title="Garden notes", is_public=True
+        )
+        cls.leafy = Book.objects.create(
+            owner=owner, category=category, title="Journal", is_public=True
+        )
+        for text in ("A walk in the garden", "Back to the GARDEN"):
+            Leaf.objects.create(book=cls.leafy, content_json=leaf_doc(text))
+        Book.objects.create(owner=owner, category=category, title="Recipes", is_public=True)
+
+    def test_icontains_fallback_lists_each_matching_book_once(self):
+        with mock.patch.object(index, "is_available", return_value=False):
+            books = list(index.filter_books(Book.objects.all(), "garden"))
+            results = index.search_books(Book.objects.all(), "garden")
+        self.assertCountEqual(books, [self.titled, self.leafy])
+        self.assertCountEqual(results, [self.titled, self.leafy])
+
+    @skipUnless(connection.vendor == "postgresql", "PostgreSQL only")
+    def test_trigram_and_partial_indexes_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE %s", ["%_idx"])
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertLessEqual(
+            {
+                "book_title_trgm_idx",
+                "book_description_trgm_idx",
+                "leaf_plain_text_trgm_idx",
+                "book_public_updated_partial_idx",
+            },
+            names,
+        )
+        results = index.search_books(Book.objects.all(), "garden")
+        self.assertEqual(results[0], self.titled)
+
+
+@skipUnless(index.is_available(), "The FTS5 index is only maintained on SQLite")
+class FullTextIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username="owner@example.com")
+        cls.category, _ = Category.objects.get_or_create(name="General")
+        cls.titled = Book.objects.create(
+            owner=cls.owner, category=cls.category, title="Garden notes", is_public=True
+        )
+        cls.leafy = Book.objects.create(
+            owner=cls.owner, category=cls.category, title="Journal", is_public=True
+        )
+        cls.leaf = Leaf.objects.create(
+            book=cls.leafy, content_json=leaf_doc("Planted <b>garden</b> beans & peas")
+        )
+        cls.hidden = Book.objects.create(
+            owner=cls.owner, category=cls.category, title="Garden secrets", is_public=False
+        )
+
+    def rows(self, book):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT leaf_id FROM {index.TABLE} WHERE book_id = %s",
+                [book.pk],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, query, queryset=None):
+        return index.search_books(queryset or Book.objects.filter(is_public=True), query)
+
+    def test_signals_follow_book_and_leaf_changes(self):
+        self.assertCountEqual(self.rows(self.leafy), [self.leaf.pk, None])
+
+        self.leafy.title = "Harvest diary"
+        self.leafy.save()
+        self.assertEqual(self.search("harvest"), [self.leafy])
+        self.assertEqual(self.search("journal"), [])
+
+        second = Leaf.objects.create(book=self.leafy, content_json=leaf_doc("Tomatoes"))
+        self.assertEqual(self.search("tomatoes"), [self.leafy])
+        self.assertEqual(self.search("tomatoes")[0].search_leaf_id, second.pk)
+        second.delete()
+        self.assertEqual(self.search("tomatoes"), [])
+
+        self.leafy.delete()
+        self.assertEqual(self.rows(self.leafy), [])
+        self.assertEqual(self.search("beans"), [])
+
+    def test_user_input_is_quoted_terms(self):
+        self.assertEqual(
+            index.match_expression('Garden OR "beans" NEAR(x y) -peas*'),
+            '"garden" "or" "beans" "near" "x" "y" "peas"*',
+        )
+        self.assertEqual(index.match_expression('"*()-:^'), "")
+        for query in ('"*()-:^', "AND", "NOT garden", "garden:", "title:garden"):
+            self.search(query)
+        self.assertEqual(self.search("gard"), [self.titled, self.leafy])
+
+    def test_title_hits_rank_first_and_snippets_are_escaped(self):
+        results = self.search("garden")
+        self.assertEqual(results, [self.titled, self.leafy])
+        self.assertEqual(results[0].search_leaf_id, None)
+        self.assertEqual(results[1].search_leaf_id, self.leaf.pk)
+        self.assertIn(
+            "Planted &lt;b&gt;<mark>garden</mark>&lt;/b&gt; beans &amp; peas",
+            results[1].search_snippet,
+        )
+        self.assertNotIn(self.hidden, results)
+        self.assertIn(self.hidden, self.search("garden", Book.objects.all()))
+
+    def test_rebuild_restores_the_index_and_leaf_text(self):
+        index.clear()
+        Leaf.objects.filter(pk=self.leaf.pk).update(plain_text="")
+        self.assertEqual(self.search("garden"), [])
+
+        out = StringIO()
+        call_command("rebuild_search_index", "--chunk-size", "1", stdout=out)
+        self.assertIn("Indexed 3 books and 1 leaves (1 leaf texts re-extracted).", out.getvalue())
+        self.assertEqual(self.search("beans"), [self.leafy])
+        self.assertEqual(self.search("garden"), [self.titled, self.leafy])
@@ -0,0 +1,68 @@
+(function () {
+  var grid = document.querySelector("[data-book-grid]");
+  if (!grid) return;
+  var more = document.querySelector("[data-load-more]");
+  var nextUrl = grid.getAttribute("data-next-page-url");
+  var loading = false;
+
+  // Card HTML is shared between users; the saved marks are per user and
+  // arrive separately as a list of book ids.
+  function markSaved(ids) {
+    (ids || []).forEach(function (id) {
+      var mark = grid.querySelector(
+        '.book-card[data-book-id="' + id + '"] .book-saved-mark'
+      );
+      if (mark) mark.hidden = false;
+    });
+  }
+
+  var initial = grid.getAttribute("data-saved-ids");
+  if (initial) markSaved(initial.split(","));
+  if (!more) return;
+
+  function loadNext() {
+    if (loading || !nextUrl) return;
+    loading = true;
+    fetch(nextUrl, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error("Page failed");
+        }
+        return response.json();
+      })
+      .then(function (payload) {
+        grid.insertAdjacentHTML("beforeend", payload.html || "");
+        markSaved(payload.saved_ids);
+        nextUrl = payload.next_page_url || "";
+        if (!nextUrl) {
+          more.remove();
+          if (observer) observer.disconnect();
+        }
+        loading = false;
+      })
+      .catch(function () {
+        loading = false;
+      });
+  }
+
+  var observer = null;
+  if ("IntersectionObserver" in window) {
+    observer = new IntersectionObserver(
+      function (entries) {
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            loadNext();
+          }
+        });
+      },
+      { rootMargin: "400px 0px" }
+    );
+    observer.observe(more);
+  }
+
+  more.addEventListener("click", function (event) {
+    if (!nextUrl) return;
+    event.preventDefault();
+    loadNext();
+  });
+})();
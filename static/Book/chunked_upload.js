@@ -0,0 +1,100 @@
+/* global fetch */
+/*
+ * Chunked, resumable uploads (see Book/chunked.py).
+ *
+ * window.uploadInChunks(file, { url, purpose, onProgress }) creates an
+ * upload session at `url`, PUTs the file in chunks and finalizes it. A
+ * failed chunk is retried after asking the server for the offset to resume
+ * from, so a dropped connection only costs the chunk in flight.
+ */
+(function () {
+  var MAX_RETRIES = 5;
+
+  function getCookie(name) {
+    var value = document.cookie.split("; ").find(function (row) {
+      return row.startsWith(name + "=");
+    });
+    return value ? decodeURIComponent(value.split("=")[1]) : "";
+  }
+
+  function send(url, options) {
+    options.headers = Object.assign({ "X-CSRFToken": getCookie("csrftoken") }, options.headers || {});
+    options.credentials = "same-origin";
+    return fetch(url, options);
+  }
+
+  function sleep(ms) {
+    return new Promise(function (resolve) {
+      setTimeout(resolve, ms);
+    });
+  }
+
+  function fail(response, payload) {
+    var error = new Error((payload && payload.error) || "Upload failed");
+    error.fatal = response.status < 500 && response.status !== 409;
+    throw error;
+  }
+
+  async function readJson(response) {
+    try {
+      return await response.json();
+    } catch (error) {
+      return {};
+    }
+  }
+
+  async function uploadInChunks(file, options) {
+    var response = await send(options.url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        purpose: options.purpose,
+        filename: file.name,
+        content_type: file.type,
+        size: file.size,
+      }),
+    });
+    var session = await readJson(response);
+    if (!response.ok) fail(response, session);
+
+    var offset = 0;
+    var failures = 0;
+    while (offset < file.size) {
+      try {
+        response = await send(session.url, {
+          method: "PUT",
+          headers: {
+            "Content-Type": "application/octet-stream",
+            "Upload-Offset": String(offset),
+          },
+          body: file.slice(offset, offset + session.chunk_size),
+        });
+        var state = await readJson(response);
+        if (response.ok) {
+          offset = state.offset;
+          failures = 0;
+          if (options.onProgress) options.onProgress(offset, file.size);
+          continue;
+        }
+        fail(response, state);
+      } catch (error) {
+        if (error.fatal || failures >= MAX_RETRIES) throw error;
+      }
+      failures += 1;
+      await sleep(500 * Math.pow(2, failures));
+      try {
+        response = await send(session.url, { method: "GET" });
+        if (response.ok) offset = (await readJson(response)).offset;
+      } catch (error) {
+        // Still offline; the next PUT attempt decides.
+      }
+    }
+
+    response = await send(session.finalize_url, { method: "POST" });
+    var result = await readJson(response);
+    if (!response.ok) fail(response, result);
+    return result;
+  }
+
+  window.uploadInChunks = uploadInChunks;
+})();
@@ -26,6 +26,7 @@
 
   var editor = null;
   var uploadUrl = form.getAttribute("data-upload-url");
+  var chunkedUploadUrl = form.getAttribute("data-chunked-upload-url");
 
   function getCookie(name) {
     var value = document.cookie.split("; ").find(function (row) {
@@ -35,6 +36,9 @@
   }
 
   function uploadImage(file) {
+    if (chunkedUploadUrl && window.uploadInChunks) {
+      return window.uploadInChunks(file, { url: chunkedUploadUrl, purpose: "editor" });
+    }
     if (!uploadUrl) return Promise.reject(new Error("Missing upload URL"));
     var data = new FormData();
     data.append("image", file);
@@ -52,7 +56,10 @@
     });
   }
 
-  try {
+  // The editor bundle (frontend/) ships TipTap with this file; without it
+  // the modules come from esm.sh.
+  async function loadTiptap() {
+    if (window.NotebookTiptap) return window.NotebookTiptap;
     var modules = await Promise.all([
       import("https://esm.sh/@tiptap/core@2.6.6"),
       import("https://esm.sh/@tiptap/starter-kit@2.6.6"),
@@ -60,11 +67,22 @@
       import("https://esm.sh/@tiptap/extension-text-style@2.6.6"),
       import("https://esm.sh/@tiptap/extension-color@2.6.6"),
     ]);
-    var Editor = modules[0].Editor;
-    var StarterKit = modules[1].StarterKit || modules[1].default;
-    var ImageResize = modules[2].default || modules[2];
-    var TextStyle = modules[3].TextStyle || modules[3].default;
-    var Color = modules[4].Color || modules[4].default;
+    return {
+      Editor: modules[0].Editor,
+      StarterKit: modules[1].StarterKit || modules[1].default,
+      ImageResize: modules[2].default || modules[2],
+      TextStyle: modules[3].TextStyle || modules[3].default,
+      Color: modules[4].Color || modules[4].default,
+    };
+  }
+
+  try {
+    var tiptap = await loadTiptap();
+    var Editor = tiptap.Editor;
+    var StarterKit = tiptap.StarterKit;
+    var ImageResize = tiptap.ImageResize;
+    var TextStyle = tiptap.TextStyle;
+    var Color = tiptap.Color;
     var initialContent = fallbackDoc("");
     if (input.value) {
       try {
@@ -1,125 +1,102 @@
-(async function () {
-  var nodes = document.querySelectorAll("[data-leaf-id]");
-  if (!nodes.length) return;
+(function () {
   var stage = document.querySelector("[data-reader]");
-  var pages = stage ? stage.querySelectorAll(".reader-page") : null;
+  if (!stage) return;
+  var pages = stage.querySelectorAll(".reader-page");
+  if (!pages.length) return;
+  var leavesUrl = stage.getAttribute("data-leaves-url");
 
-  function fallbackDoc(text) {
-    if (!text) {
-      return { type: "doc", content: [{ type: "paragraph" }] };
-    }
-    return {
-      type: "doc",
-      content: [
-        {
-          type: "paragraph",
-          content: [{ type: "text", text: text }],
-        },
-      ],
-    };
-  }
+  // Leaves are rendered to HTML on the server. Content is fetched a few
+  // pages ahead of the reader and dropped again beyond KEEP_RADIUS, so the
+  // document only ever holds a bounded number of leaves.
+  var FETCH_RADIUS = 3;
+  var KEEP_RADIUS = 6;
+  var FETCH_LIMIT = 10;
 
-  function getContent(node) {
-    var page = node.closest(".reader-page");
-    var script = page ? page.querySelector('script[type="application/json"]') : null;
-    var raw = script ? script.textContent : "";
-    var content = null;
-    if (raw) {
-      try {
-        content = JSON.parse(raw);
-        if (typeof content === "string") {
-          content = JSON.parse(content);
-        }
-      } catch (error) {
-        content = null;
-      }
-    }
-    if (!content || !content.type || !content.content) {
-      var textFallback = node.getAttribute("data-leaf-text") || "";
-      content = fallbackDoc(textFallback);
-    }
-    return content;
+  var loaded = {};
+  var pending = {};
+  var current = Number(stage.getAttribute("data-index") || 0);
+
+  function leafNode(index) {
+    var page = pages[index];
+    return page ? page.querySelector(".reader-leaf") : null;
   }
 
-  nodes.forEach(function (node) {
-    if (!node.textContent) {
-      node.textContent = node.getAttribute("data-leaf-text") || "";
+  Array.prototype.forEach.call(pages, function (page, index) {
+    var node = leafNode(index);
+    if (node && node.hasAttribute("data-loaded")) {
+      loaded[index] = true;
     }
   });
 
-  try {
-    var modules = await Promise.all([
-      import("https://esm.sh/@tiptap/core@2.6.6"),
-      import("https://esm.sh/@tiptap/starter-kit@2.6.6"),
-      import("./image_resize.js"),
-      import("https://esm.sh/@tiptap/extension-text-style@2.6.6"),
-      import("https://esm.sh/@tiptap/extension-color@2.6.6"),
-    ]);
-    var Editor = modules[0].Editor;
-    var StarterKit = modules[1].StarterKit || modules[1].default;
-    var ImageResize = modules[2].default || modules[2];
-    var TextStyle = modules[3].TextStyle || modules[3].default;
-    var Color = modules[4].Color || modules[4].default;
+  function fill(index, html) {
+    var node = leafNode(index);
+    if (!node) return;
+    node.innerHTML = html || "";
+    node.setAttribute("data-loaded", "");
+    loaded[index] = true;
+  }
 
-    function mountEditor(node) {
-      if (!node || node.dataset.editorReady === "true") return;
-      node.dataset.editorReady = "true";
-      var content = getContent(node);
-      new Editor({
-        element: node,
-        editable: false,
-        extensions: [StarterKit, TextStyle, Color, ImageResize.configure({ inline: true })],
-        content: content,
-      });
+  function fetchAround(index) {
+    if (!leavesUrl) return;
+    var start = Math.max(0, index - FETCH_RADIUS);
+    var end = Math.min(pages.length - 1, index + FETCH_RADIUS);
+    var first = -1;
+    for (var i = start; i <= end; i += 1) {
+      if (!loaded[i] && !pending[i]) {
+        first = i;
+        break;
+      }
     }
-
-    function mountAdjacent(index) {
-      if (!pages || !pages.length) {
-        mountEditor(nodes[index]);
-        return;
+    if (first < 0) return;
+    var limit = Math.min(FETCH_LIMIT, end - first + 1);
+    for (var j = first; j < first + limit; j += 1) {
+      pending[j] = true;
+    }
+    function release() {
+      for (var k = first; k < first + limit; k += 1) {
+        delete pending[k];
       }
-      var targets = [index - 1, index, index + 1];
-      targets.forEach(function (targetIndex) {
-        if (targetIndex < 0 || targetIndex >= pages.length) return;
-        var node = pages[targetIndex].querySelector("[data-leaf-id]");
-        mountEditor(node);
-      });
     }
-
-    if (stage && pages && pages.length) {
-      stage.addEventListener("reader:page", function (event) {
-        if (!event || !event.detail) return;
-        var index = Number(event.detail.index || 0);
-        mountAdjacent(index);
-      });
-      mountAdjacent(0);
-    } else if ("IntersectionObserver" in window) {
-      var observer = new IntersectionObserver(
-        function (entries) {
-          entries.forEach(function (entry) {
-            if (entry.isIntersecting) {
-              mountEditor(entry.target);
-            }
-          });
-        },
-        {
-          root: stage || null,
-          rootMargin: "50% 0px",
-          threshold: 0.01,
+    fetch(leavesUrl + "?offset=" + first + "&limit=" + limit)
+      .then(function (response) {
+        if (!response.ok) {
+          throw new Error("Leaves failed");
         }
-      );
-      nodes.forEach(function (node, index) {
-        observer.observe(node);
-        if (index === 0) mountEditor(node);
-      });
-    } else {
-      nodes.forEach(function (node) {
-        mountEditor(node);
-      });
-    }
-  } catch (error) {
-    nodes.forEach(function (node) {
-      node.textContent = node.getAttribute("data-leaf-text") || "";
+        return response.json();
+      })
+      .then(function (payload) {
+        (payload.leaves || []).forEach(function (leaf) {
+          if (Math.abs(leaf.index - current) > KEEP_RADIUS) return;
+          fill(leaf.index, leaf.html);
+        });
+        release();
+        show(current);
+      })
+      .catch(release);
+  }
+
+  function evict(index) {
+    Object.keys(loaded).forEach(function (key) {
+      var position = Number(key);
+      if (Math.abs(position - index) <= KEEP_RADIUS) return;
+      var node = leafNode(position);
+      if (node) {
+        node.innerHTML = "";
+        node.removeAttribute("data-loaded");
+      }
+      delete loaded[position];
     });
   }
+
+  function show(index) {
+    current = index;
+    evict(index);
+    fetchAround(index);
+  }
+
+  stage.addEventListener("reader:page", function (event) {
+    if (!event || !event.detail) return;
+    show(Number(event.detail.index || 0));
+  });
+  show(current);
 })();